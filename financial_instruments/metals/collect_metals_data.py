@@ -25,6 +25,9 @@ import requests # used to web scrape HTTP content for gold, silver, commodities
 from selenium import webdriver # used to web parse dynamic content
 from selenium.common.exceptions import WebDriverException # used incase webdriver fails to connect
 
+# used to find the window of days to request
+from helper_functions.fetch_from_apis import find_fetch_window
+
 ##### data modeling libraries #####
 
 import matplotlib.pyplot as plt # used for client graph visualization
@@ -58,6 +61,9 @@ def find_volatile_metals_commodities(quandlKey, startDate, endDate):
 
     quandl.ApiConfig.api_key = quandlKey # use quandl api key to collect commodities data
 
+    # find the first day to request (quandl's end date is inclusive, so endDate is used as is)
+    windowStart = find_fetch_window(startDate, endDate)[0]
+
     print("Collecting data for each commodity...\n") # print finding volatile commodities progress statement
 
     for CMEClearingTicker in CMEClearingTickers: # loop through every commodity
@@ -73,7 +79,8 @@ def find_volatile_metals_commodities(quandlKey, startDate, endDate):
 
             #print(CMECommodityFile)
 
-            CMECommodityData = quandl.get(('CHRIS/CME_' + CMEClearingTicker))
+            # only request the window plus its warm-up days instead of the contract's full history
+            CMECommodityData = quandl.get(('CHRIS/CME_' + CMEClearingTicker), start_date=windowStart, end_date=endDate)
 
             CMECommodityData.to_csv(CMECommodityFile)
 
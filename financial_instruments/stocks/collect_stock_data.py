@@ -19,8 +19,33 @@
 
 ##### data collection libraries #####
 
-import yfinance as yf # used to track stock values
-import requests # used to web scrape HTTP content for gold, silver, commodities prices
+# used to make rate-limited requests through a pooled session
+from helper_functions.fetch_from_apis import fetch_url
+from helper_functions.fetch_from_apis import FETCH_WORKERS
+from helper_functions.fetch_from_apis import WARMUP_DAYS
+from helper_functions.fetch_from_apis import find_fetch_window
+
+# used to split tickers into batches for yfinance or a local fixture
+from financial_instruments.stocks.source_stock_prices import chunk_tickers
+from financial_instruments.stocks.source_stock_prices import STOCK_BATCH_SIZE
+
+# used to download only missing days into the local price store and read them back as panels
+from financial_instruments.stocks.store_stock_prices import update_price_store
+from financial_instruments.stocks.store_stock_prices import read_price_panel
+
+# used to keep failed downloads with their reason, attempts and next retry time
+from financial_instruments.stocks.track_failed_stocks import record_failed_tickers
+from financial_instruments.stocks.track_failed_stocks import clear_failed_tickers
+from financial_instruments.stocks.track_failed_stocks import find_failed_tickers
+from financial_instruments.stocks.track_failed_stocks import find_due_tickers
+
+# used to run every screening rule over a whole price panel at once
+from financial_instruments.stocks.screen_stock_data import screen_price_panels
+from financial_instruments.stocks.screen_stock_data import screeningRules
+
+# used to split the active stocks into shards that run as independent processes
+from financial_instruments.stocks.shard_stock_data import select_shard_tickers
+from financial_instruments.stocks.shard_stock_data import find_shard_path
 
 ##### data modeling libraries #####
 
@@ -29,6 +54,35 @@ import pandas as pd # used to read the downloaded csv
 ##### miscellaneous libraries #####
 
 from tqdm import tqdm # used to track progress via progress bar
+from email.utils import formatdate # used to format the listing's age for a conditional request
+import time # used to find the age of the stored listing
+import os # used to check when the listing was last stored
+import signal # used to flush the screen checkpoint when the process is asked to stop
+import threading # used to only install signal handlers from the main thread
+
+
+########## CREATE DEPENDENCIES ##########
+
+##### listing variables #####
+
+LISTING_MAX_AGE_HOURS = 24 # number of hours a stored listing is reused before asking alpha vantage again
+
+listingStatusPath = './financialInstrument_data/stock_data/listing_status.csv' # path of stored listing
+
+##### checkpoint variables #####
+
+# path of each screen's ticker list (the volatile screen keeps stock_data-volatile_tickers.txt)
+screenedTickersPath = './financialInstrument_data/stock_data/stock_data-{}_tickers.txt'
+
+# path of the screen checkpoint, one per screening window so an old window is never resumed by mistake
+screenCheckpointPath = './financialInstrument_data/stock_data/stock_data-screen_checkpoint-{}-{}.csv'
+
+checkpointResults = ['screened', 'download_error', 'no_data'] # results a checkpoint row can record
+
+##### shard variables #####
+
+# path of each shard's failed downloads (ticker,reason rows), recorded into the failure store when shards are merged
+shardFailedPath = './financialInstrument_data/stock_data/stock_data-failed_tickers.csv'
 
 
 
@@ -41,79 +95,108 @@ from tqdm import tqdm # used to track progress via progress bar
 
 ########## RETRY FAILED DOWNLOADS ##########
 
-def retry_failed_downloads(): # function to retry any failed ticker downloads
+def retry_failed_downloads(): # function to retry failed ticker downloads whose retry time has come
 
-    ##### get failed downloads list #####
+    ##### get due failed downloads #####
 
-    with open( # open and read the txt file storing failed downloads
+    prevFailedStockDownloads = find_due_tickers() # read only the failed downloads that are due for a retry
 
-        './financialInstrument_data/stock_data/stock_data-failed_tickers.txt',
-        'r'
-    ) as failedStockDownloadsFile:
+    print(f"Retrying {len(prevFailedStockDownloads)} due failed downloads...\n") # print due retries statement
 
-        # store failed downloads list into array
-        prevFailedStockDownloads = [str(line.strip()) for line in failedStockDownloadsFile]
+    ##### retire delisted tickers #####
 
-    ##### retry failed downloads #####
+    if os.path.exists(listingStatusPath): # if the stock listing has been downloaded...
+
+        activeStocks = set(read_active_stocks()) # find every ticker still listed as an active stock
 
-    successfulDownloads = [] # create a list of successful downloads to store successful downloads to
+    else: # if there is no listing to check tickers against yet...
 
-    for prevFailedStockDownload in tqdm(prevFailedStockDownloads): # loop through all failed downloads to retry download
+        print("No stored stock listing, retrying every due failed download.\n") # print missing listing statement
 
-        # download data with failed download ticker
-        successfulDownload = yf.download(prevFailedStockDownload, progress=False)['Close']
+        activeStocks = set(prevFailedStockDownloads) # treat every due ticker as listed
 
-        if not successfulDownload.empty: # if data returned by yfinance is not empty...
+    # find due tickers that are no longer listed so they are never requested again
+    delistedStockDownloads = [x for x in prevFailedStockDownloads if x not in activeStocks]
 
-            print(f"\n{prevFailedStockDownload} successfully downloaded.") # print successful download statement
+    record_failed_tickers(delistedStockDownloads, 'delisted') # stop retrying delisted tickers
 
-            successfulDownloads.append(prevFailedStockDownload) # update successful downloads list
+    prevFailedStockDownloads = [x for x in prevFailedStockDownloads if x in activeStocks] # keep listed tickers
+
+    ##### retry failed downloads #####
+
+    # download due tickers into the price store in batches, getting back the tickers that still have no data
+    stillFailedDownloads = update_price_store(prevFailedStockDownloads)
+
+    # find tickers that now have stored data
+    successfulDownloads = [x for x in prevFailedStockDownloads if x not in stillFailedDownloads]
 
     ##### update failed downloads #####
 
-    # create a new array containing elements from the larger array not present in common set
-    prevFailedStockDownloads = [x for x in prevFailedStockDownloads if x not in successfulDownloads]
+    clear_failed_tickers(successfulDownloads) # remove recovered tickers from the failure store
+
+    for reason in set(stillFailedDownloads.values()): # loop through every kind of failure
+
+        # record another attempt, pushing the ticker's next retry further out
+        record_failed_tickers([x for x, y in stillFailedDownloads.items() if y == reason], reason)
 
     # print removed failed downloads success statement
     print(f"{len(successfulDownloads)} previously failed downloads now responsive.")
 
     print(successfulDownloads, "\n") # print successful downloads
 
-    print("Updating failed downloads list...\n") # print volatile stocks list update statement
+    # print retired failed downloads statement
+    print(f"Stopped retrying {len(delistedStockDownloads)} delisted failed downloads.\n")
 
-    # save volatile stocks list to volatile stocks file
-    with open('./financialInstrument_data/stock_data/stock_data-failed_tickers.txt',
-              'w') as failedStockDownloadsFile:
+    print("Successfully updated failed downloads store.\n") # print update success statement
 
-        for prevFailedDownload in prevFailedStockDownloads: # loop through every item in volatile stocks list
 
-            if (prevFailedDownload != None): # if failed download is not NULL type...
+########## UPDATE API LISTING DATA ##########
 
-                # save the name of the volatile stock to volatile stocks file
-                failedStockDownloadsFile.write(f"{prevFailedDownload}\n")
+# function to take new csv data from alpha vantage, unless the stored listing is younger than maxAgeHours
+def update_stocks_listing_status(alphaVantageKey, maxAgeHours=LISTING_MAX_AGE_HOURS):
 
-    print("Successfully updated failed downloads list.\n") # print update success statement
+    ##### check cached listing #####
 
+    listingHeaders = {} # create an empty dictionary of request headers
 
-########## UPDATE API LISTING DATA ##########
+    if os.path.exists(listingStatusPath): # if a listing has been stored before...
 
-def update_stocks_listing_status(alphaVantageKey): # function to take new csv data from alpha vantage
+        listingModified = os.path.getmtime(listingStatusPath) # get time listing was last stored
+        listingAgeHours = (time.time() - listingModified) / 3600 # find how old the stored listing is
+
+        if listingAgeHours < maxAgeHours: # if stored listing is still fresh...
+
+            # print cached listing statement
+            print(f"Using stored stock listings from {listingAgeHours:.1f} hours ago.\n")
+
+            return # return without contacting the API
+
+        # only ask for the listing if it changed since it was stored
+        listingHeaders['If-Modified-Since'] = formatdate(listingModified, usegmt=True)
 
     ##### get file from API #####
 
     # print progress statement to connect to Alpha Vantage API
     print(f"Finding data via API page connection with web link and Alpha Vantage API key...\n")
 
-    stockPage = requests.get( # connect to alpha vantage api with key to retrieve page of useful data
+    stockPage = fetch_url( # connect to alpha vantage api with key to retrieve page of useful data
 
-        f'https://www.alphavantage.co/query?function=LISTING_STATUS&apikey={alphaVantageKey}&datatype=csv',
-        timeout=10
+        'alpha_vantage',
+        params={'function': 'LISTING_STATUS', 'apikey': alphaVantageKey, 'datatype': 'csv'},
+        headers=listingHeaders
     )
 
-    if stockPage.status_code == 200: # if page successfully loaded...
+    if stockPage.status_code == 304: # if listing has not changed since it was stored...
+
+        os.utime(listingStatusPath) # mark stored listing as fresh
+
+        print("Stock listings unchanged since last update.\n") # print unchanged listing statement
+
+    # if page successfully loaded with a csv (alpha vantage answers rate limits with a json note)...
+    elif stockPage.status_code == 200 and stockPage.content.startswith(b'symbol'):
 
         # open csv of listing statuses of financial instruments
-        with open('./financialInstrument_data/stock_data/listing_status.csv', 'wb') as listingStatusFile:
+        with open(listingStatusPath, 'wb') as listingStatusFile:
 
             listingStatusFile.write(stockPage.content) # store API data into file
 
@@ -125,45 +208,64 @@ def update_stocks_listing_status(alphaVantageKey): # function to take new csv da
         print(f'Failed to retrieve stockPage. Returned with status code: "{stockPage.status_code}"\n')
 
 
-########## FIND ACTIVE STOCKS ##########
+########## READ ACTIVE STOCKS ##########
 
-def find_active_stocks(alphaVantageKey): # function to find all stocks that are active within alpha vantage csv
+def read_active_stocks(): # function to read every active stock from the stored alpha vantage csv
 
-    ##### find all active stocks #####
+    stockData = pd.read_csv( # set stockData as a pandas dataframe of only the columns needed
 
-    update_stocks_listing_status(alphaVantageKey) # call updateStocksListingStatus to update listing information
+        listingStatusPath,
+        usecols=['symbol', 'assetType', 'status'],
+        dtype={'symbol': str, 'assetType': 'category', 'status': 'category'},
+        keep_default_na=False # keep tickers such as 'NA' as text
+    )
 
-    try: # attempt to loop through data for active stocks...
+    # find every ticker within the data set that is active and is a stock in one boolean mask
+    activeMask = (stockData['status'] == 'Active') & (stockData['assetType'] == 'Stock')
 
-        # set stockData as a pandas dataframe
-        stockData = pd.read_csv('./financialInstrument_data/stock_data/listing_status.csv')
+    return stockData.loc[activeMask, 'symbol'].tolist() # return the active stocks
 
-        print("Attempting to find active stocks...\n") # print finding active stocks statement
 
-        activeStocks = [] # empty array to hold all active stocks
+########## READ LISTING DETAILS ##########
 
-        for i, stock in stockData.iterrows(): # loop through all items in stockData to find active stocks
+def read_listing_details(): # function to read the listing date and exchange of every stock for screening rules
 
-            # if a ticker within the data set is active and is a stock...
-            if stock['status'] == 'Active' and stock['assetType'] == 'Stock':
+    listingDetails = pd.read_csv( # set listingDetails as a pandas dataframe indexed by ticker
 
-                activeStocks.append(stock['symbol']) # put the active stock into the activeStocks array
+        listingStatusPath,
+        usecols=['symbol', 'exchange', 'ipoDate'],
+        dtype={'symbol': str, 'exchange': 'category'},
+        keep_default_na=False, # keep tickers such as 'NA' as text
+        index_col='symbol'
+    )
 
-        ##### remove failed stock downloads #####
+    listingDetails['ipoDate'] = pd.to_datetime(listingDetails['ipoDate'], errors='coerce') # 'null' becomes empty
 
-        prevFailedStockDownloads = [] # create empty list of previous failed downloads
+    return listingDetails[~listingDetails.index.duplicated()] # return one row per ticker
 
-        try: # attempt to get list of failed downloads...
 
-            # open and read the txt file storing failed downloads
-            with open('./financialInstrument_data/stock_data/stock_data-failed_tickers.txt',
-                      'r') as failedStockDownloadsFile:
+########## FIND ACTIVE STOCKS ##########
 
-                # store failed downloads list into array
-                prevFailedStockDownloads = [str(line.strip()) for line in failedStockDownloadsFile]
+def find_active_stocks(alphaVantageKey): # function to find all stocks that are active within alpha vantage csv
 
-            # convert arrays to sets for efficient intersection
-            prevFailedStockDownloads = set(activeStocks) & set(prevFailedStockDownloads)
+    ##### find all active stocks #####
+
+    update_stocks_listing_status(alphaVantageKey) # call updateStocksListingStatus to update listing information
+
+    try: # attempt to filter data for active stocks...
+
+        print("Attempting to find active stocks...\n") # print finding active stocks statement
+
+        activeStocks = read_active_stocks() # put the active stocks into the activeStocks array
+
+        ##### remove failed stock downloads #####
+
+        prevFailedStockDownloads = set() # create empty set of previous failed downloads
+
+        try: # attempt to get failed downloads from the failure store...
+
+            # keep only failed downloads that are still active (retry_failed_downloads handles them)
+            prevFailedStockDownloads = set(activeStocks) & find_failed_tickers()
 
             # create a new array containing elements from the larger array not present in common set
             activeStocks = [x for x in activeStocks if x not in prevFailedStockDownloads]
@@ -173,7 +275,7 @@ def find_active_stocks(alphaVantageKey): # function to find all stocks that are
 
         except Exception as e: # if unable to get failed downloads from list....
 
-            print(f'Error reading failed downloads list: "{e}"\n') # print failure error with exception
+            print(f'Error reading failed downloads store: "{e}"\n') # print failure error with exception
 
         print(f"Successfully retrieved {len(activeStocks)} active stocks.\n") # print active stock success statement
 
@@ -185,10 +287,148 @@ def find_active_stocks(alphaVantageKey): # function to find all stocks that are
         print(f'Error parsing data: "{e}"\n') # print failure error with exception
 
 
+########## LOAD SCREEN CHECKPOINT ##########
+
+def load_screen_checkpoint(checkpointPath): # function to load tickers already screened by an unfinished run
+
+    completedStocks = {} # dictionary to map screened ticker with its result
+
+    try: # attempt to read the checkpoint...
+
+        with open(checkpointPath, 'r') as checkpointFile: # open checkpoint file
+
+            for line in checkpointFile: # loop through every checkpointed ticker
+
+                checkpointRow = line.rstrip('\n').split(',') # split row into ticker, result and passed screens
+
+                if line.endswith('\n') and len(checkpointRow) == 3: # if row was fully written before the run stopped...
+
+                    passedScreens = [x for x in checkpointRow[2].split(';') if x] # find the screens the ticker passed
+
+                    # if row was written by an older screen as ticker, result and volatility...
+                    if checkpointRow[1] not in checkpointResults or not set(passedScreens) <= set(screeningRules):
+
+                        break # stop reading, since its results cannot be trusted
+
+                    completedStocks[checkpointRow[0]] = (checkpointRow[1], passedScreens) # store result and screens
+
+            else: # if every row was read...
+
+                return completedStocks # return screened tickers
+
+        # print discarded checkpoint statement
+        print(f"Discarding checkpoint {checkpointPath} written in an older format, screening from the start.\n")
+
+        os.remove(checkpointPath) # remove the old checkpoint so its rows are not read again
+
+    except FileNotFoundError: # if there is no unfinished run...
+
+        pass # start from the first ticker
+
+    return {} # return no screened tickers
+
+
+########## STOP SCREEN ##########
+
+def stop_screen(signalNumber, frame): # function to stop the screen cleanly when the process is asked to stop
+
+    raise SystemExit(128 + signalNumber) # unwind so the checkpoint is flushed and closed
+
+
+########## TRIM SCREEN CHECKPOINT ##########
+
+def trim_screen_checkpoint(checkpointPath): # function to remove a row a crash left half written from the checkpoint
+
+    try: # attempt to open the checkpoint...
+
+        with open(checkpointPath, 'r+b') as checkpointFile: # open checkpoint file as bytes to find exact offsets
+
+            blockEnd = checkpointFile.seek(0, os.SEEK_END) # start reading from the end of the file
+            rowEnd = blockEnd # offset right after the last whole row
+
+            while blockEnd > 0: # loop until the start of the file is reached
+
+                blockStart = max(0, blockEnd - 65536) # read the file in 64 KB blocks from the end
+
+                checkpointFile.seek(blockStart) # move to the block
+                lastNewline = checkpointFile.read(blockEnd - blockStart).rfind(b'\n') # find the block's last newline
+
+                if lastNewline != -1: # if the block ends a whole row...
+
+                    rowEnd = blockStart + lastNewline + 1 # find the offset right after it
+
+                    break # stop reading since every row before it is whole
+
+                rowEnd = blockEnd = blockStart # move the next block in front of this one
+
+            if rowEnd < checkpointFile.seek(0, os.SEEK_END): # if the last row was cut off...
+
+                checkpointFile.truncate(rowEnd) # remove it so the next row is never glued onto it
+
+    except FileNotFoundError: # if there is no unfinished run...
+
+        pass # there is nothing to trim
+
+
+########## SCREEN TICKER BATCH ##########
+
+# function to bring a batch's stored prices up to date and run every screen over it, returning its screen results and
+# the tickers whose download failed with why
+def screen_ticker_batch(
+
+    tickerBatch,
+    startDate,
+    endDate,
+    windowStart,
+    windowEnd,
+    priceSource,
+    batchSize,
+    screens,
+    listingDetails
+):
+
+    # bring the batch's stored window up to date, downloading only the days each ticker is missing
+    failedTickers = update_price_store(tickerBatch, windowStart, windowEnd, priceSource, batchSize)
+
+    # read the batch's closing prices and volumes in the window as wide panels with a column per ticker
+    closePanel = read_price_panel(tickerBatch, windowStart, endDate)
+    volumePanel = read_price_panel(tickerBatch, windowStart, endDate, field='Volume')
+
+    screenResults = screen_price_panels( # run every screen over every ticker in one vectorized pass
+
+        closePanel, startDate, endDate, screens, volumePanel, listingDetails
+    )
+
+    return screenResults, failedTickers # return screen results and failed downloads
+
+
 ########## FIND VOLATILE STOCKS ##########
 
-# function to find volatile stocks (or any behavior you want) from the active stocks
-def find_volatile_stocks(alphaVantageKey, startDate, endDate):
+# function to find volatile stocks (or any behavior you want) from the active stocks, running every screen in screens
+# over the same price data in one pass
+def find_volatile_stocks(
+
+    alphaVantageKey,
+    startDate,
+    endDate,
+    batchSize=STOCK_BATCH_SIZE,
+    priceSource='yfinance',
+    screens=('volatile',),
+    warmupDays=WARMUP_DAYS,
+    shardIndex=None,
+    shardCount=1
+):
+
+    ##### check screens #####
+
+    unknownScreens = [x for x in screens if x not in screeningRules] # find screens without rules
+
+    if unknownScreens: # if a screen is not defined...
+
+        # refuse to run, since every ticker would otherwise be recorded as a failed download
+        raise ValueError(f'Invalid screens {unknownScreens}, expected any of {list(screeningRules)}.')
+
+    screens = list(screens) # take screens as a list so results can be selected by them
 
     ##### find active stocks #####
 
@@ -201,55 +441,171 @@ def find_volatile_stocks(alphaVantageKey, startDate, endDate):
 
         return 0 # return with 0 for failure
 
+    if shardIndex is not None: # if running as one shard of the active stocks...
+
+        activeStocks = select_shard_tickers(activeStocks, shardIndex, shardCount) # only screen the shard's stocks
+
+        # print shard statement
+        print(f"Screening shard {shardIndex + 1} of {shardCount} with {len(activeStocks)} active stocks.\n")
+
     ##### set variables #####
 
-    volatileStocks = [] # create an empty array to store volatile stocks and their volumes
-    failedStockDownloads = [] # create an empty array to store active stocks who've failed to download
+    screenedStocks = {screen: [] for screen in screens} # create an empty array per screen to store passing stocks
+    failedStockDownloads = {} # create an empty dictionary to map active stocks who've failed to download with why
+    # find this window's checkpoint (each shard keeps its own)
+    checkpointPath = find_shard_path(screenCheckpointPath.format(startDate, endDate), shardIndex, shardCount)
+    listingDetails = read_listing_details() # read listing date and exchange of every stock once
+
+    # only request the screening window plus its warm-up days instead of every stock's full history
+    windowStart, windowEnd = find_fetch_window(startDate, endDate, warmupDays)
+
+    ##### resume from checkpoint #####
+
+    completedStocks = load_screen_checkpoint(checkpointPath) # load tickers screened by an unfinished run
+
+    for ticker, (result, passedScreens) in completedStocks.items(): # loop through every checkpointed ticker
+
+        for screen in passedScreens: # loop through every screen the ticker passed
+
+            if screen in screenedStocks: # if screen is still requested...
+
+                screenedStocks[screen].append(ticker) # put the stock into the screen's list
+
+        if result != 'screened': # if ticker failed to download...
+
+            failedStockDownloads[ticker] = result # add ticker to failed downloads
+
+    if completedStocks: # if an unfinished run was found...
+
+        print(f"Resuming screen after {len(completedStocks)} checkpointed stocks.\n") # print resume statement
+
+    activeStocks = [x for x in activeStocks if x not in completedStocks] # only screen the remaining stocks
 
     ##### find volatile stocks #####
 
     print("Attempting to find the most volatile active stocks...\n") # print find volatile stocks statement
 
-    for i in tqdm(range(len(activeStocks))): # loop through activeStocks to find the most volatile stocks
+    if threading.current_thread() is threading.main_thread(): # if signal handlers can be installed...
+
+        previousHandler = signal.signal(signal.SIGTERM, stop_screen) # flush the checkpoint when asked to stop
+
+    # gather what every call to screenTickerBatch needs besides its tickers
+    screenArguments = (startDate, endDate, windowStart, windowEnd, priceSource, batchSize, screens, listingDetails)
+
+    trim_screen_checkpoint(checkpointPath) # remove a row an earlier crash left half written
+
+    checkpointFile = open(checkpointPath, 'a') # open the checkpoint to stream results into
+
+    try: # attempt to screen every remaining stock...
+
+        # loop through activeStocks in groups of batches so every fetch worker has a batch to download at once
+        for tickerBatch in tqdm(chunk_tickers(activeStocks, batchSize * FETCH_WORKERS)):
+
+            checkpointRows = {} # dictionary to map every ticker in the batch with its result and passed screens
+
+            try: # attempt to screen the batch of active stock tickers at once...
+
+                batchResults = [screen_ticker_batch(tickerBatch, *screenArguments)] # screen every ticker at once
+
+            except Exception as e: # if unable to screen the batch...
+
+                # print batch failure statement
+                print(f'\nError screening batch: "{e}", screening its stocks one by one...\n')
+
+                batchResults = [] # create an empty list of every ticker's results
+
+                for ticker in tickerBatch: # loop through every ticker in the batch
+
+                    try: # attempt to screen the ticker on its own...
+
+                        batchResults.append(screen_ticker_batch([ticker], *screenArguments)) # screen the ticker
+
+                    except Exception: # if unable to get the ticker's data...
+
+                        checkpointRows[ticker] = ('download_error', []) # add only this ticker to failed downloads
+
+            for screenResults, failedTickers in batchResults: # loop through every screened group of the batch
+
+                passedScreens = screenResults[screens].to_numpy() # take a ticker-by-screen pass/fail array
+
+                # loop through every ticker's screen results
+                for ticker, hasData, passed in zip(screenResults.index, screenResults['hasData'], passedScreens):
+
+                    if not hasData: # if ticker returned no usable data...
+
+                        # add ticker to failed downloads with why its download failed
+                        checkpointRows[ticker] = (failedTickers.get(ticker, 'no_data'), [])
+
+                        continue # move on to the next ticker
+
+                    # record ticker as screened along with every screen it passed
+                    checkpointRows[ticker] = ('screened', [x for x, y in zip(screens, passed) if y])
+
+                    if 'volatile' in checkpointRows[ticker][1]: # if active stock is considered volatile...
+
+                        # print volatility and name of volatile stock and keep newline
+                        print(f"\r{ticker} added: volatility = {screenResults.at[ticker, 'volatility']:.4f}%.")
+
+            for ticker, (result, passed) in checkpointRows.items(): # loop through every result in the batch
+
+                for screen in passed: # loop through every screen the ticker passed
+
+                    screenedStocks[screen].append(ticker) # put the stock into the screen's list
+
+                if result != 'screened': # if ticker failed to download...
+
+                    failedStockDownloads[ticker] = result # add ticker to failed downloads
+
+                # stream result into the checkpoint
+                checkpointFile.write(f"{ticker},{result},{';'.join(passed)}\n")
+
+            checkpointFile.flush() # push the batch's results out of python's buffer
+            os.fsync(checkpointFile.fileno()) # make sure the batch's results reach the disk
+
+    except (SystemExit, KeyboardInterrupt): # if the process was asked to stop...
+
+        # print interrupted screen statement
+        print(f"\nScreen stopped. Resume by running again; results so far are in {checkpointPath}.\n")
+
+        raise # keep stopping
+
+    finally: # whether the screen finished or not...
+
+        checkpointFile.close() # flush and close the checkpoint
+
+        if threading.current_thread() is threading.main_thread(): # if a signal handler was installed...
+
+            signal.signal(signal.SIGTERM, previousHandler) # put back the previous handler
 
-        try: # attempt to download data with given active stock ticker...
+    ##### save shard results #####
 
-            # download active stock's historical data from startDate to endDate
-            activeStock = yf.download(activeStocks[i], progress=False)['Close']
-            # start=startDate, end=endDate,
+    if shardIndex is not None: # if running as one shard of the active stocks...
 
-            # collect the earliest listing to see if stock is younger than startDate
-            earliestListing = activeStock.index.min().strftime('%Y-%m-%d')
+        save_shard_results(screenedStocks, failedStockDownloads, shardIndex, shardCount) # leave merging to merge step
 
-            if (earliestListing < startDate): # if maximum time active stock has been listed shorter than startDate...
+        os.remove(checkpointPath) # remove the checkpoint now that every result has been saved
 
-                # restrict data to desired time frame
-                activeStock = activeStock[(activeStock.index >= startDate) & (activeStock.index <= endDate)]
+        print(f"Completed screening shard {shardIndex + 1} of {shardCount}.\n") # print shard completion statement
 
-            else: # if maximum time active stock has been listed falls short of startDate...
+        return # return without touching the merged lists or the failure store
 
-                activeStock = activeStock[activeStock.index <= endDate] # restrict data to desired time frame
+    ##### add other screens to lists #####
 
-            if (activeStocks != None): # if data was successfully downloaded...
+    for screen in screens: # loop through every screen besides the volatile screen
 
-                # calculate volatility of active stock (standard deviation of daily returns)
-                volatility = activeStock.pct_change().std() * (252 ** .05) * 100
+        if screen == 'volatile': # if screen is the volatile screen...
 
-                # if active stock is considered volatile and is at least 90 dollars...
-                if (volatility > 5.5 and activeStock.iloc[-1] > 90):
+            continue # save it below with its usual statements
 
-                    volatileStocks.append(activeStocks[i]) # put the volatile stock into list of volatile stocks
+        print(f"Screen {screen} found {len(screenedStocks[screen])} stocks.\n") # print screen success statement
 
-                    # print volatility and name of volatile stock and keep newline
-                    print(f"\r{activeStocks[i]} added: volatility = {volatility:.4f}%.")
+        with open(screenedTickersPath.format(screen), 'w') as screenedStocksList: # save screen's list to its file
 
-            # print progress into console
-            #print(f"\rVolatile stocks count: {len(volatileStocks)}.")
-                  #f" Active stocks remaining: {len(activeStocks) - i}", end='', flush=True)
+            for screenedStock in screenedStocks[screen]: # loop through every item in the screen's list
 
-        except: # if unable to get active stocks data...
+                screenedStocksList.write(f"{screenedStock}\n") # save name of stock to the screen's file
 
-            failedStockDownloads.append(activeStocks[i]) # add failed download to failed downloads list
+    volatileStocks = screenedStocks.get('volatile', []) # take the volatile screen's list
 
     ##### add volatile stocks to list #####
 
@@ -270,38 +626,136 @@ def find_volatile_stocks(alphaVantageKey, startDate, endDate):
 
         print("Successfully updated volatile stocks list.\n") # print update success statement
 
-    ##### add failed downloads to list #####
+    ##### add failed downloads to store #####
 
-    if (len(failedStockDownloads) >= 1 and failedStockDownloads[0] != None): # if failed downloads list not empty...
-
-        # if null value error persists, remove null values
-        failedStockDownloads = [failedDownload for failedDownload in failedStockDownloads if failedDownload is not None]
+    if (len(failedStockDownloads) >= 1): # if failed downloads are not empty...
 
         # print volatile stocks failed downloads statement
         print(f"Unsuccessfully calculated {len(failedStockDownloads)} volatile stocks.")
 
-        print(failedStockDownloads, "\n") # print all failed downloads
+        print(list(failedStockDownloads), "\n") # print all failed downloads
+
+        print("Updating failed downloads store...\n") # print update failed downloads statement
 
-        print("Updating failed downloads list...\n") # print update failed downloads statement
+        for reason in set(failedStockDownloads.values()): # loop through every kind of failure
 
-        # add all current failed downloads list to previous failed downloads list
-        failedStockDownloads = list(prevFailedStockDownloads) + failedStockDownloads
+            # record the failed downloads so they are skipped until their retry time
+            record_failed_tickers([x for x, y in failedStockDownloads.items() if y == reason], reason)
 
-        with open( # save failed downloads list to failed stock downloads file
+        print("Successfully updated failed downloads store.\n") # print update success statement
 
-            './financialInstrument_data/stock_data/stock_data-failed_tickers.txt',
-            'w'
-        ) as failedStockDownloadsFile:
+    else: # if failed downloads are empty...
 
-            for activeStock in failedStockDownloads: # loop through every item in failed downloads list
+        print("No new failed downloads to update.\n") # print empty failed downloads statement
 
-                # save the name of the failed download to failed stock downloads file
-                failedStockDownloadsFile.write(f"{activeStock}\n")
+    os.remove(checkpointPath) # remove the checkpoint now that every result has been saved
 
-        print("Successfully updated failed downloads list.\n") # print update success statement
+    print("Completed finding new volatile stocks.\n") # print final completion statement
 
-    else: # if length of failed downloads list is empty...
 
-        print("No new failed downloads to update.\n") # print empty failed downloads statement
+########## SAVE SHARD RESULTS ##########
+
+# function to save one shard's screened and failed stocks to its own files for the merge step
+def save_shard_results(screenedStocks, failedStockDownloads, shardIndex, shardCount):
+
+    for screen, screenStocks in screenedStocks.items(): # loop through every screen's list
+
+        # save screen's list to the shard's copy of its file, even when empty so the merge step knows it finished
+        with open(find_shard_path(screenedTickersPath.format(screen), shardIndex, shardCount), 'w') as shardList:
+
+            for screenedStock in screenStocks: # loop through every item in the screen's list
+
+                shardList.write(f"{screenedStock}\n") # save name of stock to the shard's file
+
+    shardPath = find_shard_path(shardFailedPath, shardIndex, shardCount) # find the shard's failed downloads file
+
+    # save failed downloads last, since the merge step treats this file as the sign that the shard finished
+    with open(shardPath + '.tmp', 'w') as shardFailedFile:
+
+        for ticker, reason in failedStockDownloads.items(): # loop through every failed download
+
+            shardFailedFile.write(f"{ticker},{reason}\n") # save ticker and why it failed
+
+    os.replace(shardPath + '.tmp', shardPath) # swap in the finished file so a half-written shard never merges
+
+
+########## MERGE SCREENED SHARDS ##########
+
+def merge_screened_shards(shardCount, screens=('volatile',)): # function to combine every shard's screen results
+
+    ##### check shards #####
+
+    shardPaths = [find_shard_path(shardFailedPath, x, shardCount) for x in range(shardCount)] # find every shard
+
+    unfinishedShards = [x for x in range(shardCount) if not os.path.exists(shardPaths[x])] # find missing shards
+
+    if unfinishedShards: # if some shards have not finished...
+
+        print(f"Error: shards {unfinishedShards} of {shardCount} have not finished screening.\n") # print error
+
+        return 0 # return with 0 for failure
+
+    print(f"Merging screen results of {shardCount} shards...\n") # print merging statement
+
+    ##### set variables #####
+
+    # map every ticker with its place in the listing so merged lists come out in the same order as one process
+    listingOrder = {ticker: i for i, ticker in enumerate(read_active_stocks())}
+
+    screenedStocks = {screen: [] for screen in screens} # create an empty array per screen to store passing stocks
+    failedStockDownloads = {} # create an empty dictionary to map failed downloads with why
+
+    ##### read shards #####
+
+    for shardIndex in range(shardCount): # loop through every shard
+
+        for screen in screens: # loop through every screen
+
+            # open and read the shard's copy of the screen's list
+            with open(find_shard_path(screenedTickersPath.format(screen), shardIndex, shardCount), 'r') as shardList:
+
+                screenedStocks[screen].extend(line.strip() for line in shardList if line.strip()) # add its stocks
+
+        with open(shardPaths[shardIndex], 'r') as shardFailedFile: # open and read the shard's failed downloads
+
+            for line in shardFailedFile: # loop through every failed download
+
+                ticker, reason = line.strip().rsplit(',', 1) # split row into ticker and reason
+
+                failedStockDownloads[ticker] = reason # add ticker to failed downloads
+
+    ##### save merged lists #####
+
+    for screen in screens: # loop through every screen
+
+        # put the screen's stocks back into listing order (delisted stocks go last)
+        screenedStocks[screen].sort(key=lambda x: listingOrder.get(x, len(listingOrder)))
+
+        print(f"Screen {screen} found {len(screenedStocks[screen])} stocks.\n") # print screen success statement
+
+        with open(screenedTickersPath.format(screen), 'w') as screenedStocksList: # save merged list to its file
+
+            for screenedStock in screenedStocks[screen]: # loop through every item in the screen's list
+
+                screenedStocksList.write(f"{screenedStock}\n") # save name of stock to the screen's file
+
+    ##### add failed downloads to store #####
+
+    for reason in set(failedStockDownloads.values()): # loop through every kind of failure
+
+        # record the failed downloads once for every shard, so they are skipped until their retry time
+        record_failed_tickers([x for x, y in failedStockDownloads.items() if y == reason], reason)
+
+    print(f"Recorded {len(failedStockDownloads)} failed downloads from every shard.\n") # print failures statement
+
+    ##### remove shard files #####
+
+    for shardIndex in range(shardCount): # loop through every shard
+
+        for screen in screens: # loop through every screen
+
+            os.remove(find_shard_path(screenedTickersPath.format(screen), shardIndex, shardCount)) # remove its list
+
+        os.remove(shardPaths[shardIndex]) # remove its failed downloads last
 
-    print("Completed finding new volatile stocks.\n") # print final completion statement
\ No newline at end of file
+    print("Completed merging screen results.\n") # print merge completion statement
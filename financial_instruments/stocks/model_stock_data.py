@@ -16,15 +16,33 @@
 
 ########## IMPORT DEPENDENCIES ##########
 
-##### aws uploading #####
+##### model training #####
 
-from helper_functions.upload_to_aws import upload_to_s3 # import upload to s3 function
-from helper_functions.upload_to_aws import invoke_sagemaker # import invoke sagemaker function
+# used to train every model locally in a process pool or on sagemaker
+from helper_functions.train_models import train_models
+from helper_functions.train_models import TRAINING_BACKEND
+from helper_functions.train_models import TRAINING_WORKERS
+from helper_functions.train_models import start_worker_pool
+
+# used to share one training time budget between every stock's worker
+from helper_functions.train_models import schedule_training_budget
+from helper_functions.train_models import TRAINING_TIME_BUDGET
 
 ##### machine learning functions #####
 
 # used to prepare data for machine learning
 from helper_functions.create_tensorflow_model import prepare_financial_data
+from helper_functions.create_tensorflow_model import prepare_multi_horizon_data
+from helper_functions.create_tensorflow_model import NUMBER_STEPS
+
+# used to predict every stock with one call per model
+from helper_functions.create_tensorflow_model import predict_grouped
+
+# used to normalize every stock at once and save each model's scaling next to it
+from helper_functions.create_tensorflow_model import fit_min_max_scaling
+from helper_functions.create_tensorflow_model import apply_scaling
+from helper_functions.create_tensorflow_model import invert_scaling
+from helper_functions.create_tensorflow_model import save_model_scaling
 
 # used to create recursive neural network LSTM
 #from helper_functions.tensorflow_functions.tensorflowFunctions_createModel import createTrainedModel
@@ -32,31 +50,50 @@ from helper_functions.create_tensorflow_model import prepare_financial_data
 ##### data collection libraries #####
 
 import pandas as pd # used to create final dataframe
-import yfinance as yf # used to collect stock data
+
+# used to download only missing days into the local price store and read every ticker back as one panel
+from financial_instruments.stocks.store_stock_prices import update_price_store
+from financial_instruments.stocks.store_stock_prices import read_price_panel
+
+# used to split the modeled tickers into shards that run as independent processes
+from financial_instruments.stocks.shard_stock_data import select_shard_tickers
+from financial_instruments.stocks.shard_stock_data import find_shard_path
+
+# used to find the model settings with the lowest validation error
+from helper_functions.sweep_hyperparameters import sweep_hyperparameters
+
+# used to measure how the saved predictions would have performed over time
+from helper_functions.backtest_predictions import backtest_predictions
+from helper_functions.backtest_predictions import PREDICTED_DAYS
+
+# used to keep every ticker's back fit predictions between runs so only new dates are predicted
+from financial_instruments.stocks.store_backfit_predictions import read_backfit_predictions
+from financial_instruments.stocks.store_backfit_predictions import write_backfit_predictions
 
 ##### data modeling libraries #####
 
-from sklearn.preprocessing import MinMaxScaler # used to normalize data in between 0 and 1
 import numpy as np # import numpy for data modeling
 
 ##### miscellaneous libraries #####
 
-from datetime import datetime # used to convert str to date format
-
-##### machine learning libraries #####
-
-import tensorflow as tf # used to use h5 from path
+from datetime import datetime, timedelta # used to convert str to date format and find the lookback window
+import os # used to check for and remove shard prediction files and append to the predictions csv
+import time # used to find the deadline of the training budget
 
 
 ########## CREATE DEPENDENCIES ##########
 
 ##### machine learning constants #####
 
-NUMBER_STEPS = 7 # set size of sequence to 1 week
-
 FUTURE_STEPS = [1, 2, 3] # number of days in week to be examined
 
-scaler = MinMaxScaler() # set scaler for normalizing data
+MULTI_HORIZON = True # train one model predicting every future step at once instead of one model per step
+
+PARALLEL_TICKERS = True # prepare, train and predict every ticker in its own worker process
+
+HISTORY_LOOKBACK_DAYS = None # number of days of history before endDate to train on (None = full history)
+
+SWEEP_TICKERS = 20 # number of tickers hyperparameter sweeps train and validate on
 
 ##### miscellaneous constants #####
 
@@ -66,6 +103,13 @@ dateFormat = '%Y-%m-%d' # set date format to be month day year
 
 s3BucketName = 'machine-learning-portfolio' # set s3 bucket name 'machine-learning-portfolio-fractal-labs'
 
+##### model file variables #####
+
+trainingDataDirectory = './financialInstrument_data/stock_data/training_data' # directory holding a folder per pack
+trainingDataS3Prefix = 'financialInstrument_data/stock_data/training_data' # s3 prefix holding a prefix per pack
+modelPath = 'financialInstrument_data/stock_data/stock_data-model-{}-{}.h5' # s3 model object (ticker, future step)
+localModelDirectory = './financialInstrument_data/stock_data/models' # directory of the local model registry
+
 
 
 
@@ -75,20 +119,9 @@ s3BucketName = 'machine-learning-portfolio' # set s3 bucket name 'machine-learni
 ####################################################
 
 
-########## ORGANIZE AND MODEL DATA ##########
-
-def create_stocks_model(startDate, endDate, customTickers): # function to collect data from current quarter
-
-    ##### calculate date interval #####
-
-    print("Calculating date interval...\n") # print finding interval statement
-
-    # find the total amount of days to be displayed
-    intervalLength = (datetime.strptime(endDate, dateFormat) - datetime.strptime(startDate, dateFormat)).days
-
-    print(f"Interval length: {intervalLength}.\n") # print desired time interval
+########## FIND MODEL TICKERS ##########
 
-    ##### get names of all stocks #####
+def find_model_tickers(customTickers): # function to find the tickers to model and the csv to save predictions to
 
     print("Retrieving ticker names...\n") # print fetching ticker names statement
 
@@ -111,46 +144,32 @@ def create_stocks_model(startDate, endDate, customTickers): # function to collec
 
     print("Successfully retrieved ticker names.\n") # print ticker name success statement
 
-    ##### set variables #####
+    return tickerNames, predictionOutput # return tickers and output csv
 
-    stocksActual = pd.DataFrame() # create a dataframe to record all findings for all stocks
-    stocksPredicted = 0 # initialize predicted dataframe
-    i = 0 # initialize counter to 0 for number of stocks
 
-    ##### collect data for all stocks #####
+########## PREPARE STOCK MODELS ##########
 
-    print("Using ticker names to model price movement data...\n") # print fetching data statement
+# function to create the training data and training job of every model of a stock (one model predicting every future
+# step when multiHorizon is True, otherwise one model per future step)
+def prepare_stock_models(ticker, stockData, multiHorizon):
 
-    for ticker in tickerNames: # loop through every ticker name
-
-        ##### set variables #####
-
-        # get daily historical data of closing prices for a share
-        stockData = yf.download(ticker, end=endDate, interval='1d', progress=False)
+    modelData = {} # dictionary to map every model's step with its last sequence and training data
+    trainingJobs = [] # create an empty list of models to train
 
-        # remove unnecessary columns which neural network will not use
-        stockData = stockData.drop(['Open', 'High', 'Low', 'Adj Close', 'Volume'], axis=1)
-        stockData['Date'] = stockData.index # index data to its date(s)
+    for step in (['multi'] if multiHorizon else FUTURE_STEPS): # loop through every model of the stock
 
-        # normalize data for tensorflow
-        stockData['Close'] = scaler.fit_transform(np.expand_dims(stockData['Close'].values, axis=1))
-        model, trainX, trainY = 0, 0, 0 # initialize variables to be used in model
-        stockPredictions = [] # create an empty list to store price predictions
+        ##### create training data #####
 
-        ##### create predictions for a stock #####
+        if step == 'multi': # if one model should predict every future step...
 
-        for step in FUTURE_STEPS: # create a price prediction for stocks up to 3 days
+            # create windows with one target column per future step
+            lastSequence, trainX, trainY = prepare_multi_horizon_data(stockData, FUTURE_STEPS)
 
-            ##### set variables #####
+        else: # if the model predicts a single future step...
 
             # call prepareStockData to get necessary sequences, filtered data, target data, etc.
             prepStockData, lastSequence, trainX, trainY = prepare_financial_data(stockData, step)
             trainX = trainX[:, :, :len(['Close'])].astype(np.float32) # set to 32-int float for processing
-            stocksTrainXDataPath = './financialInstrument_data/stock_data/stock_data-trainX_data.npy' # set path
-            stocksTrainYDataPath = './financialInstrument_data/stock_data/stock_data-trainY_data.npy' # set path
-            stocksTrainXS3DataObject = 'financialInstrument_data/stock_data/stock_data-trainX_data.npy' # set object
-            stocksTrainYS3DataObject = 'financialInstrument_data/stock_data/stock_data-trainY_data.npy' # set object
-            stocksModelPath = 'financialInstrument_data/stock_data/stock_data-model.h5' # set path
 
             # extract the last NUMBER_STEPS (7) from the last sequence array to consider only the most recent
             # observations
@@ -159,37 +178,409 @@ def create_stocks_model(startDate, endDate, customTickers): # function to collec
             # ensure the last sequence array has the correct shape before using it for predictions
             lastSequence = np.expand_dims(lastSequence, axis=0)
 
-            ##### convert and send data to s3 for sagemaker #####
+        modelData[step] = (lastSequence, trainX, trainY) # store the step's data
+
+        ##### create training job #####
+
+        modelName = (ticker.replace('/', '_'), step) # name every file after the ticker and future step
+
+        trainingJobs.append({ # add the step's model to the models to train
+
+            'trainX': trainX,
+            'trainY': trainY,
+            'modelDirectory': localModelDirectory, # directory the model registry keeps models in
+            'modelName': '-'.join(map(str, modelName)), # name the model is registered under
+            'trainingDataDirectory': trainingDataDirectory, # where the sagemaker backend packs and uploads data
+            'trainingDataS3Prefix': trainingDataS3Prefix,
+            's3ModelObject': modelPath.format(*modelName),
+            's3BucketName': s3BucketName
+        })
+
+    return modelData, trainingJobs # return every model's data and training job
+
+
+########## CREATE PREDICTION REQUESTS ##########
+
+# function to create the (model path, inputs) requests of every trained model of a stock and save its scaling next to
+# every model (only back fitting the windows of rows from backfitStart on)
+def create_prediction_requests(modelData, modelPaths, stockScaling, backfitStart=0):
+
+    predictionRequests = [] # create an empty list of (model path, inputs) to predict
+    modelSteps = list(modelData) # list the steps of the stock's models
+
+    # find the first window without a stored prediction (the first NUMBER_STEPS - 1 rows are not predicted)
+    firstWindow = max(0, backfitStart - (NUMBER_STEPS - 1))
+
+    for step, stepModelPath in zip(modelSteps, modelPaths): # loop through every model of the stock
+
+        lastSequence, trainX, trainY = modelData[step] # get the step's data
+
+        save_model_scaling(stepModelPath, *stockScaling) # save scaling so any process can unscale its predictions
+
+        if step == modelSteps[-1]: # if the model also back fits the stock's prices (the furthest step)...
+
+            # predict the last sequence and every new training window in the same call
+            predictionRequests.append((stepModelPath, np.concatenate([lastSequence, trainX[firstWindow:]])))
+
+        else: # if the model only predicts the upcoming days...
+
+            predictionRequests.append((stepModelPath, lastSequence)) # predict the last sequence
+
+    return predictionRequests # return requests in model order
+
+
+########## FIND BACKFIT START ##########
+
+# function to find how many of a stock's back fit rows can be kept from its stored predictions (0 regenerates them all)
+def find_backfit_start(storedBackfit, stockData, trainingMode):
+
+    backfitDates = stockData.index[:-max(FUTURE_STEPS)] # find the dates of every back fit row
+
+    # if the back fitting model was trained from scratch since the stored rows (fine tuned models keep the rows
+    # predicted by their earlier weights, since they only drift slightly and regenerating them rewrites the whole csv
+    # on every daily run)...
+    if trainingMode == 'train':
+
+        return 0 # regenerate every prediction so every row comes from the same model
+
+    if len(storedBackfit) < NUMBER_STEPS - 1 or len(storedBackfit) > len(backfitDates): # if stored rows do not fit...
+
+        return 0 # regenerate every prediction
+
+    if not storedBackfit.index.equals(backfitDates[:len(storedBackfit)]): # if the stored dates no longer line up...
+
+        return 0 # regenerate every prediction
+
+    return len(storedBackfit) # keep every stored row and only predict the dates after it
+
+
+########## MODEL STOCK ##########
+
+# function to prepare and train one stock inside a worker process, returning its first new back fit row and its
+# prediction requests so the parent can predict every stock's requests together
+def model_stock(stockJob):
+
+    # unpack the stock's job
+    ticker, stockData, stockScaling, storedBackfit, multiHorizon, trainingBackend, trainingSchedule = stockJob
+
+    modelData, trainingJobs = prepare_stock_models(ticker, stockData, multiHorizon) # create training data and jobs
+
+    if trainingSchedule is not None: # if the run has a training budget...
+
+        trainingDeadline, workerCount, stockWeight, laterWeight = trainingSchedule # unpack the stock's share
+
+        # split the stock's weight between its models so they claim their share of the shared budget
+        modelWeights = [stockWeight / len(trainingJobs)] * len(trainingJobs)
+        schedule_training_budget(trainingJobs, workerCount, trainingDeadline, modelWeights, laterWeight)
+
+    modelPaths = train_models(trainingJobs, trainingBackend) # train the stock's models (or reuse cached ones)
+
+    # find the back fit rows the furthest step's model does not need to predict again
+    backfitStart = find_backfit_start(storedBackfit, stockData, trainingJobs[-1]['trainingMode'])
+
+    # return the first new back fit row and the requests predicting the last sequence and new back fit windows
+    return backfitStart, create_prediction_requests(modelData, modelPaths, stockScaling, backfitStart)
+
+
+########## FIND REWRITE OFFSET ##########
+
+# function to find the byte offset of the first csv row dated after lastKeptDate by reading the file backwards (None
+# when every row would have to be rewritten)
+def find_rewrite_offset(csvPath, lastKeptDate):
+
+    lastKeptDate = str(lastKeptDate.date()).encode('utf-8') # compare dates the way the csv stores them
+
+    with open(csvPath, 'rb') as csvFile: # open the csv as bytes to find exact offsets
+
+        blockEnd = csvFile.seek(0, os.SEEK_END) # start reading from the end of the file
+        tailData = b'' # create an empty buffer for the end of the file
+
+        while blockEnd > 0: # loop until the start of the file is reached
+
+            blockStart = max(0, blockEnd - 65536) # read the file in 64 KB blocks from the end
+
+            csvFile.seek(blockStart) # move to the block
+            tailData = csvFile.read(blockEnd - blockStart) + tailData # add the block in front of the buffer
+            blockEnd = blockStart # move the next block in front of this one
+
+            tailLines = tailData.split(b'\n') # split buffer into lines (the first may be cut unless at the start)
+            lineOffset = blockStart + len(tailData) # find the offset right after the buffer
+
+            for tailLine in reversed(tailLines[1:]): # loop backwards through every whole line but the first
+
+                lineOffset -= len(tailLine) # find the offset the line starts at
+
+                if tailLine and tailLine.split(b',', 1)[0] <= lastKeptDate: # if the row is kept...
+
+                    return lineOffset + len(tailLine) + 1 # return the offset of the row after it
+
+                lineOffset -= 1 # step back over the newline ending the line before
+
+    return None # return None since every row is dated after lastKeptDate
+
+
+########## FIND LAST FINAL DATE ##########
+
+# function to find the date of the last row of a saved csv whose predicted price is a back fit prediction, reading only
+# the end of the file (None when no row is final yet)
+def find_last_final_date(csvPath):
+
+    # find how many rows end every csv without a back fit prediction (the last actual days and the predicted days)
+    openRows = max(FUTURE_STEPS) + PREDICTED_DAYS
+
+    with open(csvPath, 'rb') as csvFile: # open the csv as bytes to read its end
+
+        blockEnd = csvFile.seek(0, os.SEEK_END) # start reading from the end of the file
+        tailData = b'' # create an empty buffer for the end of the file
+
+        while blockEnd > 0 and tailData.count(b'\n') <= openRows + 1: # loop until the final row is whole
+
+            blockStart = max(0, blockEnd - 65536) # read the file in 64 KB blocks from the end
+
+            csvFile.seek(blockStart) # move to the block
+            tailData = csvFile.read(blockEnd - blockStart) + tailData # add the block in front of the buffer
+            blockEnd = blockStart # move the next block in front of this one
+
+    tailLines = tailData.rstrip(b'\n').split(b'\n') # split buffer into lines
+
+    if len(tailLines) < openRows + 2: # if the csv has no row besides its header and open rows...
+
+        return None # return None since every row has to be rewritten
+
+    return pd.Timestamp(tailLines[-openRows - 1].split(b',', 1)[0].decode('utf-8')) # return the final row's date
+
+
+########## SAVE PREDICTION TABLE ##########
+
+# function to save the actual and predicted prices, only rewriting the rows after lastKeptDate when the saved csv has
+# the same columns (None rewrites every row)
+def save_prediction_table(stocksActualAndPredictions, predictionOutput, lastKeptDate):
+
+    rewriteOffset = None # offset to append rows from (None = write whole csv)
+
+    if lastKeptDate is not None and os.path.exists(predictionOutput): # if older rows may be kept...
+
+        # only keep rows when the saved csv has the same columns in the same order
+        if list(pd.read_csv(predictionOutput, index_col=0, nrows=0).columns) == list(stocksActualAndPredictions):
+
+            lastFinalDate = find_last_final_date(predictionOutput) # find the saved csv's last back fit row
+
+            if lastFinalDate is not None: # if the saved csv has back fit rows...
+
+                # never keep rows the saved csv itself has not finalized, since the back fit store is shared
+                lastKeptDate = min(lastKeptDate, lastFinalDate)
+
+                rewriteOffset = find_rewrite_offset(predictionOutput, lastKeptDate) # find where changed rows start
+
+    if rewriteOffset is None: # if every row has to be written...
+
+        stocksActualAndPredictions.to_csv(predictionOutput, header=True) # save actual data and predictions to csv
+
+        return # return since the csv is complete
+
+    with open(predictionOutput, 'r+b') as predictionFile: # open the saved csv
+
+        predictionFile.truncate(rewriteOffset) # remove the rows that changed and the old predicted days
+
+    # append the rows after lastKeptDate, including the new predicted days
+    stocksActualAndPredictions[stocksActualAndPredictions.index > lastKeptDate].to_csv(
+        predictionOutput, mode='a', header=False
+    )
+
+    print(f"Appended predictions after {lastKeptDate.date()} to {predictionOutput}.\n") # print append statement
+
 
-            print("Attempting to upload data to s3...\n")  # print uploading data statement
+########## ORGANIZE AND MODEL DATA ##########
+
+# function to collect data from current quarter (only for the shard's tickers when shardIndex is given), training
+# every model with trainingBackend ('local', 'inline', 'sagemaker' or 'ridge'), one model per ticker when multiHorizon
+# is True and every ticker's whole pipeline in its own worker process when parallelTickers is True
+def create_stocks_model(
+
+    startDate,
+    endDate,
+    customTickers,
+    shardIndex=None,
+    shardCount=1,
+    trainingBackend=TRAINING_BACKEND,
+    multiHorizon=MULTI_HORIZON,
+    parallelTickers=PARALLEL_TICKERS
+):
+
+    ##### calculate date interval #####
+
+    print("Calculating date interval...\n") # print finding interval statement
+
+    # find the total amount of days to be displayed
+    intervalLength = (datetime.strptime(endDate, dateFormat) - datetime.strptime(startDate, dateFormat)).days
+
+    print(f"Interval length: {intervalLength}.\n") # print desired time interval
+
+    ##### get names of all stocks #####
+
+    tickerNames, predictionOutput = find_model_tickers(customTickers) # find tickers to model and output csv
+
+    if shardIndex is not None: # if running as one shard of the tickers...
+
+        tickerNames = select_shard_tickers(tickerNames, shardIndex, shardCount) # only model the shard's tickers
+        predictionOutput = find_shard_path(predictionOutput, shardIndex, shardCount) # save to the shard's csv
+
+        # print shard statement
+        print(f"Modeling shard {shardIndex + 1} of {shardCount} with {len(tickerNames)} tickers.\n")
+
+        if not tickerNames: # if no ticker hashed into the shard...
+
+            pd.DataFrame(index=pd.DatetimeIndex([], name='Date')).to_csv(predictionOutput) # leave an empty csv
+
+            return # return so the merge step still finds the shard's csv
+
+    ##### set variables #####
+
+    predictionColumns = [x + y for x in tickerNames for y in [' Close', ' Predicted Close']] # name every column
+    predictionValues = None # array holding every actual and predicted price, allocated once the dates are known
+    i = 0 # initialize counter to 0 for number of stocks
+
+    ##### collect data for all stocks #####
+
+    print("Using ticker names to model price movement data...\n") # print fetching data statement
+
+    if HISTORY_LOOKBACK_DAYS is None: # if models train on every ticker's full history...
+
+        historyStart = None # request each ticker's full history
+
+    else: # if models train on a window of recent history...
+
+        # only request the lookback window before endDate
+        historyStart = str((datetime.strptime(endDate, dateFormat) - timedelta(days=HISTORY_LOOKBACK_DAYS)).date())
 
-            np.save(stocksTrainXDataPath, trainX) # save training data to path as numpy binary
-            np.save(stocksTrainYDataPath, trainY) # save target data to path as numpy binary
-            upload_to_s3(stocksTrainXDataPath, s3BucketName, stocksTrainXS3DataObject) # upload training data to s3
-            upload_to_s3(stocksTrainYDataPath, s3BucketName, stocksTrainYS3DataObject) # upload target data to s3
+    # bring every ticker's stored window up to date before modeling (endDate itself is excluded, as before)
+    update_price_store(tickerNames, historyStart, endDate)
 
-            print("Successfully uploaded data to s3.\n")  # print upload success statement
+    ##### normalize data for all stocks #####
 
-            ##### invoke sagemaker to train model #####
+    tickerData = {} # dictionary to map ticker with its normalized data, scaling and stored back fit predictions
 
-            print("Attempting to create model...\n") # print creating model statement
+    # get daily historical data of closing prices for every share from the price store as one date-by-ticker panel
+    closePanel = read_price_panel(tickerNames, historyStart)
+    closePanel = closePanel[closePanel.index < endDate] # restrict data to days before endDate
 
-            # call createTrainedModel with testing and target variables to train model TODO
-            #model = createTrainedModel(trainX, trainY) # original, home made method
-            #model = invokeSageMaker(stocksTrainXS3DataObject, stocksTrainYS3DataObject, s3BucketName, stocksModelPath)
-            model = tf.keras.models.load_model(
+    # find every stock's minimum and scale at once and normalize the whole panel for tensorflow
+    closeMins, closeScales = fit_min_max_scaling(closePanel)
+    scaledPanel = apply_scaling(closePanel, closeMins, closeScales)
 
-                invoke_sagemaker(stocksTrainXS3DataObject, stocksTrainYS3DataObject, s3BucketName, stocksModelPath)
+    for ticker in tickerNames: # loop through every ticker name
+
+        # take the stock's normalized closing prices, keeping only the days it traded
+        stockData = scaledPanel[[ticker]].dropna().rename(columns={ticker: 'Close'})
+        stockData['Date'] = stockData.index # index data to its date(s)
+
+        tickerData[ticker] = { # store the stock's data, scaling and stored back fit predictions
+
+            'stockData': stockData,
+            'scaling': (closeMins[ticker], closeScales[ticker]),
+            'backfit': read_backfit_predictions(ticker)
+        }
+
+    ##### model every stock in parallel #####
+
+    # if every stock should run its whole pipeline in its own worker (ridge models are fit for every stock at once)...
+    if parallelTickers and trainingBackend != 'ridge':
+
+        # run each stock's training inside its worker unless the models are trained remotely
+        workerBackend = 'inline' if trainingBackend == 'local' else trainingBackend
+
+        workerCount = min(TRAINING_WORKERS, len(tickerNames)) # never start more workers than stocks
+
+        trainingSchedules = [None] * len(tickerNames) # create a list of every stock's share of the training budget
+
+        if TRAINING_TIME_BUDGET is not None: # if the run has a training budget...
+
+            trainingDeadline = time.time() + TRAINING_TIME_BUDGET # find when every stock has to finish training
+            stockWeights = [len(tickerData[x]['stockData']) for x in tickerNames] # weigh stocks by their days
+            laterWeights = np.cumsum(stockWeights[::-1])[::-1] - stockWeights # find weight of the stocks after each
+
+            # give every stock the deadline, worker count, its weight and the weight of the stocks after it
+            trainingSchedules = [(trainingDeadline, workerCount, x, y) for x, y in zip(stockWeights, laterWeights)]
+
+        stockJobs = [ # create one job per stock with everything its worker needs
+
+            (
+                ticker, *[tickerData[ticker][x] for x in ['stockData', 'scaling', 'backfit']],
+                multiHorizon, workerBackend, trainingSchedule
             )
+            for ticker, trainingSchedule in zip(tickerNames, trainingSchedules)
+        ]
+
+        print(f"Attempting to model {len(stockJobs)} stocks in parallel...\n") # print parallel modeling statement
+
+        # prepare and train every stock in worker processes, collecting results in ticker order
+        with start_worker_pool(workerCount) as executor:
+
+            backfitStarts, stockRequests = zip(*executor.map(model_stock, stockJobs))
+
+    ##### model every stock in stages #####
+
+    else: # if every stage should finish for all stocks before the next one starts...
+
+        # prepare the training data and training jobs of every stock
+        preparedStocks = [prepare_stock_models(x, tickerData[x]['stockData'], multiHorizon) for x in tickerNames]
+
+        print("Attempting to create models...\n") # print creating model statement
+
+        # train every ticker and future step at once with the chosen backend instead of one job at a time
+        modelPaths = iter(train_models([y for x in preparedStocks for y in x[1]], trainingBackend))
+
+        print("Successfully created models.\n") # print model success statement
+
+        backfitStarts = [ # find the back fit rows every stock's furthest step model does not need to predict again
+
+            find_backfit_start(tickerData[ticker]['backfit'], tickerData[ticker]['stockData'], x[1][-1]['trainingMode'])
+            for ticker, x in zip(tickerNames, preparedStocks)
+        ]
+
+        stockRequests = [ # create every stock's prediction requests with its trained models
+
+            create_prediction_requests(
+                modelData, [next(modelPaths) for x in modelData], tickerData[ticker]['scaling'], backfitStart
+            )
+            for ticker, (modelData, trainingJobs), backfitStart in zip(tickerNames, preparedStocks, backfitStarts)
+        ]
+
+    ##### predict every stock at once #####
+
+    print("Attempting to predict every stock...\n") # print predicting statement
 
-            print("Successfully created model.\n") # print model success statement
+    # stack every request of a model into one batch and every model of an architecture into one forward pass
+    predictionResults = iter(predict_grouped([y for x in stockRequests for y in x]))
 
-            prediction = model.predict(lastSequence) # use last sequence to make predictions
+    stockResults = [ # give every stock back its first new back fit row and outputs
 
-            # reverse normalization of the first element from the batch dimension in order to create accurate prices
-            predictedPrice = scaler.inverse_transform(prediction)[0][0]
+        (backfitStart, [next(predictionResults) for x in predictionRequests])
+        for predictionRequests, backfitStart in zip(stockRequests, backfitStarts)
+    ]
 
-            stockPredictions.append(predictedPrice) # round the predicted price to 2 decimal places
+    ##### create predictions for all stocks #####
+
+    lastKeptDate = closePanel.index.max() # latest date whose csv row is unchanged since the last run (None = rewrite)
+    newBackfits = {} # dictionary to map ticker with its back fit predictions, stored once the csv is saved
+
+    # loop through every stock's results
+    for tickerIndex, (ticker, (backfitStart, modelOutputs)) in enumerate(zip(tickerNames, stockResults)):
+
+        ##### set variables #####
+
+        tickerMin, tickerScale = tickerData[ticker]['scaling'] # get the stock's minimum and scale
+        stockPredictions = [] # create an empty list to store price predictions
+
+        ##### create predictions for a stock #####
+
+        for prediction in modelOutputs: # loop through every model's outputs (a multi horizon model predicts every day)
+
+            # reverse normalization of the last sequence's predictions in order to create accurate prices
+            stockPredictions.extend(invert_scaling(prediction[0], tickerMin, tickerScale))
+
+        # take the new back fit predictions of the furthest future step
+        predictY = prediction[1:, -1]
 
         ##### print predictions #####
 
@@ -207,71 +598,198 @@ def create_stocks_model(startDate, endDate, customTickers): # function to collec
             # print stock predictions statement
             print(f'\n{i}\{len(tickerNames)}: {ticker} predictions for the upcoming 3 days: {threePredictions}.\n')
 
-        ##### create dataframe to save #####
+        ##### extend back fit predictions #####
 
-        # create a shell copy of stock data with new variables that point to old variables
-        stockDataCopy = stockData.copy()
+        stockCloses = closePanel[ticker].dropna() # get the stock's actual closing prices on the days it traded
+        backfitDates = stockCloses.index[:-max(FUTURE_STEPS)] # find the dates of every back fit row
 
-        # create a prediction with trained input variables
-        predictY = model.predict(trainX)
+        # reverse normalization of the new back fit predictions
+        newBackfit = invert_scaling(predictY, tickerMin, tickerScale)
 
-        # transform prediction values by reversing normalization and then remove any unnecessary single dimensions
-        # previously necessary for inverse_transform()
-        predictYTransformed = np.squeeze(scaler.inverse_transform(predictY))
+        if backfitStart == 0: # if every back fit row is regenerated...
 
-        # find first sequence by expanding the dimension of first 6 elements in trainY for inverse_transform() and then
-        # reverse normalization
-        firstSequence = scaler.inverse_transform(np.expand_dims(trainY[:6], axis=1))
+            # fill the first NUMBER_STEPS - 1 rows, which have no window to predict them, with the first targets
+            firstTargets = stockCloses.values[NUMBER_STEPS - 1 + max(FUTURE_STEPS):][:NUMBER_STEPS - 1]
+            newBackfit = np.append(firstTargets, newBackfit)
 
-        # find first sequence by expanding the dimension of first 6 elements in trainY for inverse_transform() and then
-        # reverse normalization
-        lastSequence = scaler.inverse_transform(np.expand_dims(trainY[-3:], axis=1))
+            lastKeptDate = None # rewrite the whole csv since older rows changed
 
-        # add transformed y predictions to the end of first sequence
-        predictYTransformed = np.append(firstSequence, predictYTransformed)
+        elif backfitStart < len(backfitDates) and lastKeptDate is not None: # if new rows were predicted...
 
-        # add last sequence to the end of transformed y predictions
-        predictYTransformed = np.append(predictYTransformed, lastSequence)
+            lastKeptDate = min(lastKeptDate, backfitDates[backfitStart - 1]) # rewrite the csv from the new rows on
 
-        # add transformed y predictions to the copied dataframe
-        stockDataCopy['Predicted Close'] = predictYTransformed
+        # keep the stored rows and add the new ones after them
+        backfitPredictions = pd.concat([
 
-        # reverse normalization for close column
-        stockDataCopy['Close'] = scaler.inverse_transform(np.expand_dims(stockData['Close'], axis=1))
+            tickerData[ticker]['backfit'].iloc[:backfitStart],
+            pd.Series(newBackfit, index=backfitDates[backfitStart:], dtype=np.float64)
+        ])
 
-        stocksActual[ticker + ' Close'] = stockDataCopy['Close'] # fill dataframe with closing prices
+        if backfitStart < len(backfitDates): # if any row is new...
 
-        # fill dataframe with predicted prices
-        stocksActual[ticker + ' Predicted Close'] = stockDataCopy['Predicted Close']
+            newBackfits[ticker] = backfitPredictions # keep the stock's back fit to store for the next run
 
         ##### record predictions #####
 
-        if (i == 1): # if first stock prediction...
+        if predictionValues is None: # if first stock prediction...
 
-            latestBusinessDay = stocksActual.index[-1] # get the latest business day
+            # use the first stock's days as the actual days of every stock (every day of the shard's stocks when
+            # sharded, so the merge step can line every shard up with the first ticker's days)
+            actualDates = stockCloses.index if shardIndex is None else closePanel.index
 
             # get the next 3 business days
-            nextThreeBusinessDays = pd.bdate_range(start=latestBusinessDay + pd.Timedelta(days=1), periods=3)
+            nextThreeBusinessDays = pd.bdate_range(start=actualDates[-1] + pd.Timedelta(days=1), periods=3)
+
+            # allocate one contiguous array for every stock's actual days and 3 predicted days
+            predictionValues = np.full((len(actualDates) + 3, len(predictionColumns)), np.nan)
 
-            stocksPredicted = pd.DataFrame(index=nextThreeBusinessDays) # create a dataframe with next 3 business days
+        closeColumn, predictedColumn = 2 * tickerIndex, 2 * tickerIndex + 1 # find the stock's two columns
 
-            stocksPredicted.index.name = 'Date' # set index name to 'Date'
+        # fill close column with closing prices on the actual days
+        predictionValues[:len(actualDates), closeColumn] = stockCloses.reindex(actualDates).to_numpy()
 
-        # fill close column with 3 predictions
-        stocksPredicted[ticker + ' Close'] = stockPredictions
+        # fill prediction column with back fit prices, ending with the last actual prices which have no back fit yet
+        predictionValues[:len(actualDates), predictedColumn] = pd.concat(
 
-        # fill prediction column with 3 predictions
-        stocksPredicted[ticker + ' Predicted Close'] = stockPredictions
+            [backfitPredictions, stockCloses.iloc[len(backfitDates):]]
+        ).reindex(actualDates).to_numpy()
+
+        predictionValues[len(actualDates):, closeColumn] = stockPredictions # fill close column with 3 predictions
+        predictionValues[len(actualDates):, predictedColumn] = stockPredictions # fill prediction column as well
 
     print("Finalized all stock predictions.\n") # print prediction completion statement
 
     ##### prepare and save data to csv #####
 
-    # combine the actual and prediction dataframes
-    stocksActualAndPredictions = pd.concat([stocksActual, stocksPredicted])
+    # wrap the filled array in a dataframe once instead of inserting every column into a growing dataframe
+    stocksActualAndPredictions = pd.DataFrame(
+
+        predictionValues,
+        index=actualDates.append(nextThreeBusinessDays).rename('Date'),
+        columns=predictionColumns
+    )
+
+    # save actual data and predictions to csv file, only rewriting the rows after lastKeptDate when possible
+    save_prediction_table(stocksActualAndPredictions, predictionOutput, lastKeptDate)
+
+    ##### store back fit predictions #####
 
-    stocksActualAndPredictions.to_csv(predictionOutput, header=True) # save actual data and predictions to csv file
+    for ticker, backfitPredictions in newBackfits.items(): # loop through every stock with new back fit rows
+
+        # save the stock's back fit only now, so the store never runs ahead of a csv that failed to save
+        write_backfit_predictions(ticker, backfitPredictions)
 
     ##### upload json data to s3 bucket #####
 
-    #uploadToS3(outputPathData, s3BucketName, s3DataObject) # upload data to s3 bucket
\ No newline at end of file
+    #uploadToS3(outputPathData, s3BucketName, s3DataObject) # upload data to s3 bucket
+
+
+########## SWEEP STOCKS MODEL ##########
+
+# function to sweep model settings on the first sweepTickerCount tickers' data before endDate, saving every trial's
+# validation error and training time to csv
+def sweep_stocks_model(endDate, customTickers, sweepTickerCount=SWEEP_TICKERS):
+
+    ##### collect data for sweep stocks #####
+
+    tickerNames, predictionOutput = find_model_tickers(customTickers) # find tickers to model
+    tickerNames = tickerNames[:sweepTickerCount] # only sweep on the first tickers
+
+    update_price_store(tickerNames, None, endDate) # bring every ticker's stored history up to date
+
+    closePanel = read_price_panel(tickerNames) # get every ticker's closing prices as one date-by-ticker panel
+    closePanel = closePanel[closePanel.index < endDate] # restrict data to days before endDate
+
+    # normalize the whole panel like create_stocks_model does
+    scaledPanel = apply_scaling(closePanel, *fit_min_max_scaling(closePanel))
+
+    ##### sweep model settings #####
+
+    return sweep_hyperparameters( # run every trial on the stocks' normalized closing prices
+
+        [scaledPanel[[x]].dropna().rename(columns={x: 'Close'}) for x in tickerNames],
+        FUTURE_STEPS,
+        './financialInstrument_data/stock_data/stock_data-hyperparameter_sweep.csv'
+    )
+
+
+########## BACKTEST STOCKS MODEL ##########
+
+# function to walk forward through the saved predictions of the tickers, scoring the stored back fit predictions (or
+# models retrained before every fold when retrain is True) fold by fold, saving every ticker and fold's results to csv
+def backtest_stocks_model(customTickers, retrain=False):
+
+    tickerNames, predictionOutput = find_model_tickers(customTickers) # find the csv the tickers' predictions are in
+
+    return backtest_predictions( # score the furthest future step's back fit predictions
+
+        predictionOutput,
+        f"./financialInstrument_data/stock_data/stock_data-backtest-{'retrain' if retrain else 'replay'}.csv",
+        horizon=max(FUTURE_STEPS),
+        retrain=retrain
+    )
+
+
+########## MERGE PREDICTION SHARDS ##########
+
+def merge_prediction_shards(customTickers, shardCount): # function to combine every shard's predictions into one csv
+
+    ##### check shards #####
+
+    tickerNames, predictionOutput = find_model_tickers(customTickers) # find tickers modeled and output csv
+
+    shardPaths = [find_shard_path(predictionOutput, x, shardCount) for x in range(shardCount)] # find every shard
+
+    unfinishedShards = [x for x in range(shardCount) if not os.path.exists(shardPaths[x])] # find missing shards
+
+    if unfinishedShards: # if some shards have not finished...
+
+        print(f"Error: shards {unfinishedShards} of {shardCount} have not finished modeling.\n") # print error
+
+        return 0 # return with 0 for failure
+
+    print(f"Merging predictions of {shardCount} shards...\n") # print merging statement
+
+    ##### combine shards #####
+
+    # read every shard's actual and predicted prices, indexed by date
+    shardPredictions = [pd.read_csv(shardPath, index_col='Date', parse_dates=True) for shardPath in shardPaths]
+
+    shardPredictions = [x for x in shardPredictions if len(x.columns)] # leave out shards without tickers
+
+    if shardPredictions: # if any shard modeled a ticker...
+
+        # line the actual days of every shard up by date
+        actualPredictions = pd.concat([x.iloc[:-PREDICTED_DAYS] for x in shardPredictions], axis=1).sort_index()
+
+        # keep only the first ticker's days, which are the actual days of a single process run
+        actualPredictions = actualPredictions[actualPredictions[f'{tickerNames[0]} Close'].notna()]
+
+        # get the next 3 business days after them like a single process run
+        nextThreeBusinessDays = pd.bdate_range(start=actualPredictions.index[-1] + pd.Timedelta(days=1), periods=3)
+
+        stocksActualAndPredictions = pd.concat([ # add the predicted days after the actual days
+
+            actualPredictions,
+
+            # line the predicted days up by position, since every ticker predicts the first ticker's next days
+            pd.concat(
+                [x.iloc[-PREDICTED_DAYS:].set_axis(nextThreeBusinessDays) for x in shardPredictions], axis=1
+            )
+        ]).rename_axis('Date')
+
+    else: # if no shard modeled a ticker...
+
+        stocksActualAndPredictions = pd.DataFrame(index=pd.DatetimeIndex([], name='Date')) # save an empty csv
+
+    # put columns back into ticker order so the csv matches a single process run
+    predictionColumns = [x + y for x in tickerNames for y in [' Close', ' Predicted Close']]
+    predictionColumns = [x for x in predictionColumns if x in stocksActualAndPredictions.columns]
+
+    stocksActualAndPredictions[predictionColumns].to_csv(predictionOutput, header=True) # save merged predictions
+
+    for shardPath in shardPaths: # loop through every shard's csv
+
+        os.remove(shardPath) # remove the merged shard
+
+    print("Completed merging predictions.\n") # print merge completion statement
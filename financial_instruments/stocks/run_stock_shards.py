@@ -0,0 +1,210 @@
+##################################################################################
+# Copyright (c) 2025 Matthew Thomas Beck                                         #
+#                                                                                #
+# Licensed under the Creative Commons Attribution-NonCommercial 4.0              #
+# International (CC BY-NC 4.0). Personal and educational use is permitted.       #
+# Commercial use by companies or for-profit entities is prohibited.              #
+##################################################################################
+
+
+
+
+
+############################################################
+############### IMPORT / CREATE DEPENDENCIES ###############
+############################################################
+
+
+########## IMPORT DEPENDENCIES ##########
+
+##### data collection functions #####
+
+# used to screen one shard of the active stocks and merge every shard's results
+from financial_instruments.stocks.collect_stock_data import find_volatile_stocks
+from financial_instruments.stocks.collect_stock_data import update_stocks_listing_status
+from financial_instruments.stocks.collect_stock_data import merge_screened_shards
+
+# used to model one shard of the tickers and merge every shard's predictions
+from financial_instruments.stocks.model_stock_data import create_stocks_model
+from financial_instruments.stocks.model_stock_data import merge_prediction_shards
+
+##### miscellaneous libraries #####
+
+import subprocess # used to run every shard as an independent worker process
+import argparse # used to read a shard worker's options from the command line
+import json # used to read the alpha vantage key from config.json
+import sys # used to start shard workers with the same python interpreter
+import os # used to hand the alpha vantage key to shard workers
+
+
+########## CREATE DEPENDENCIES ##########
+
+##### shard worker variables #####
+
+shardStages = ['screen', 'model', 'merge_screen', 'merge_model'] # stages a shard worker can be started with
+
+
+
+
+
+#####################################################
+############### SHARD WORKER FUNCTIONS ##############
+#####################################################
+
+
+########## RUN STOCK SHARD ##########
+
+# function to run one stage of the stock pipeline (a shard's screen or model, or the merge of every shard)
+def run_stock_shard(stage, alphaVantageKey, startDate, endDate, customTickers, shardIndex, shardCount):
+
+    if stage == 'screen': # if the shard's stocks should be screened...
+
+        return find_volatile_stocks(alphaVantageKey, startDate, endDate, shardIndex=shardIndex, shardCount=shardCount)
+
+    if stage == 'model': # if the shard's tickers should be modeled...
+
+        return create_stocks_model(startDate, endDate, customTickers, shardIndex, shardCount)
+
+    if stage == 'merge_screen': # if every shard's screen results should be combined...
+
+        return merge_screened_shards(shardCount)
+
+    if stage == 'merge_model': # if every shard's predictions should be combined...
+
+        return merge_prediction_shards(customTickers, shardCount)
+
+    raise ValueError(f'Invalid shard stage "{stage}".') # refuse to guess a stage
+
+
+########## LAUNCH SHARD STAGE ##########
+
+# function to run one stage for every shard as independent worker processes on this machine and wait for them
+def launch_shard_stage(stage, alphaVantageKey, startDate, endDate, customTickers, shardCount):
+
+    print(f"Launching {shardCount} {stage} shard workers...\n") # print launching statement
+
+    workerEnvironment = dict(os.environ, ALPHA_VANTAGE_KEY=alphaVantageKey or '') # pass key without showing it in ps
+
+    shardWorkers = [ # start every shard with the same command another machine would run
+
+        subprocess.Popen(
+            [
+                sys.executable, '-m', 'financial_instruments.stocks.run_stock_shards',
+                '--stage', stage,
+                '--start-date', startDate,
+                '--end-date', endDate,
+                '--shard-index', str(shardIndex),
+                '--shard-count', str(shardCount),
+                '--tickers', *customTickers
+            ],
+            env=workerEnvironment
+        )
+        for shardIndex in range(shardCount)
+    ]
+
+    # wait for every worker and find the shards that failed
+    failedShards = [x for x, shardWorker in enumerate(shardWorkers) if shardWorker.wait() != 0]
+
+    if failedShards: # if any shard failed...
+
+        print(f"Error: {stage} shards {failedShards} of {shardCount} failed.\n") # print error statement
+
+        return 0 # return with 0 for failure
+
+    print(f"Successfully ran {shardCount} {stage} shard workers.\n") # print shard success statement
+
+    return 1 # return with 1 for success
+
+
+########## RUN STOCK SHARDS ##########
+
+# function to screen and model stocks as shardCount worker processes, merging their results after each stage
+def run_stock_shards(
+
+    alphaVantageKey,
+    startDate,
+    endDate,
+    updateVolatileStocks,
+    machineLearnStocks,
+    customTickers,
+    shardCount
+):
+
+    if updateVolatileStocks == True: # if user wants to update list of volatile stocks...
+
+        update_stocks_listing_status(alphaVantageKey) # refresh the listing once instead of once per shard
+
+        # screen every shard, stopping if any shard failed
+        if not launch_shard_stage('screen', alphaVantageKey, startDate, endDate, [], shardCount):
+
+            return 0 # return with 0 for failure
+
+        if merge_screened_shards(shardCount) == 0: # combine every shard's lists and failed downloads...
+
+            return 0 # return with 0 for failure if unable to
+
+    if machineLearnStocks == True: # if user wants to machine learn stocks...
+
+        # model every shard after the merged volatile list exists, stopping if any shard failed
+        if not launch_shard_stage('model', alphaVantageKey, startDate, endDate, customTickers, shardCount):
+
+            return 0 # return with 0 for failure
+
+        if merge_prediction_shards(customTickers, shardCount) == 0: # combine every shard's predictions...
+
+            return 0 # return with 0 for failure if unable to
+
+    return 1 # return with 1 for success
+
+
+
+
+
+#########################################################
+############### SHARD WORKER COMMAND LINE ###############
+#########################################################
+
+
+########## RUN SHARD WORKER ##########
+
+# run as: python -m financial_instruments.stocks.run_stock_shards --stage screen --start-date 2025-01-01
+#   --end-date 2025-03-31 --shard-index 0 --shard-count 4 (from the project root, on this or any other machine)
+if __name__ == '__main__':
+
+    ##### read options #####
+
+    shardParser = argparse.ArgumentParser(description='Run one shard of the stock pipeline.') # create parser
+
+    shardParser.add_argument('--stage', choices=shardStages, required=True) # stage to run
+    shardParser.add_argument('--start-date', required=True) # start of the window
+    shardParser.add_argument('--end-date', required=True) # end of the window
+    shardParser.add_argument('--shard-index', type=int, default=None) # shard to run (unused when merging)
+    shardParser.add_argument('--shard-count', type=int, required=True) # number of shards
+    shardParser.add_argument('--tickers', nargs='*', default=[]) # custom tickers to model instead of volatile list
+
+    shardOptions = shardParser.parse_args() # read options
+
+    ##### find api key #####
+
+    alphaVantageKey = os.environ.get('ALPHA_VANTAGE_KEY') # use the key handed over by the launcher
+
+    if not alphaVantageKey and os.path.exists('config.json'): # if worker was started by hand...
+
+        with open('config.json') as f: # set the json above as a file-like object f and open it
+
+            alphaVantageKey = json.load(f).get('alpha_vantage', {}).get('api_key', None) # grab alpha vantage key
+
+    ##### run stage #####
+
+    shardResult = run_stock_shard( # run the requested stage
+
+        shardOptions.stage,
+        alphaVantageKey,
+        shardOptions.start_date,
+        shardOptions.end_date,
+        shardOptions.tickers,
+        shardOptions.shard_index,
+        shardOptions.shard_count
+    )
+
+    sys.exit(1 if shardResult == 0 else 0) # exit with 1 when the stage returned 0 for failure
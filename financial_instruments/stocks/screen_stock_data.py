@@ -0,0 +1,241 @@
+##################################################################################
+# Copyright (c) 2025 Matthew Thomas Beck                                         #
+#                                                                                #
+# Licensed under the Creative Commons Attribution-NonCommercial 4.0              #
+# International (CC BY-NC 4.0). Personal and educational use is permitted.       #
+# Commercial use by companies or for-profit entities is prohibited.              #
+##################################################################################
+
+
+
+
+
+############################################################
+############### IMPORT / CREATE DEPENDENCIES ###############
+############################################################
+
+
+########## IMPORT DEPENDENCIES ##########
+
+##### data modeling libraries #####
+
+import pandas as pd # used to label screening results by ticker
+import numpy as np # import numpy for vectorized screening
+
+
+########## CREATE DEPENDENCIES ##########
+
+##### screening constants #####
+
+ANNUALIZATION_FACTOR = 252 ** .05 # factor applied to the standard deviation of daily returns
+
+##### screening rules #####
+
+screeningRules = { # dictionary to map screen name with its rules (every rule must hold for a ticker to pass)
+
+    'volatile': { # stocks with volatility > 5.5% and price > $90
+
+        'minVolatility': 5.5,
+        'minPrice': 90
+    },
+    'liquid_large_cap': { # calm, expensive, heavily traded stocks on the major exchanges
+
+        'maxVolatility': 3,
+        'minPrice': 50,
+        'minAverageVolume': 2000000,
+        'exchanges': ['NYSE', 'NASDAQ']
+    },
+    'new_listings': { # stocks listed within the last year that already trade above $5
+
+        'maxListingAgeDays': 365,
+        'minPrice': 5
+    }
+}
+
+ruleConditions = { # dictionary to map rule name with the statistic it checks and how
+
+    'minVolatility': ('volatility', '>'),
+    'maxVolatility': ('volatility', '<='),
+    'minPrice': ('lastPrice', '>'),
+    'maxPrice': ('lastPrice', '<='),
+    'minAverageVolume': ('averageVolume', '>='),
+    'minListingAgeDays': ('listingAgeDays', '>='),
+    'maxListingAgeDays': ('listingAgeDays', '<='),
+    'exchanges': ('exchange', 'in'),
+    'sectors': ('sector', 'in') # only usable when the listing provides a sector column
+}
+
+
+
+
+
+########################################################
+############### STOCK SCREENING FUNCTIONS ##############
+########################################################
+
+
+########## PREPARE PRICE PANEL ##########
+
+# function to restrict a price panel to a float32 window, keeping the warm-up days before it since the first return of
+# the window is measured from them
+def prepare_price_panel(pricePanel, endDate):
+
+    # restrict data to desired time frame (younger stocks simply have no data before their listing)
+    pricePanel = pricePanel[pricePanel.index <= endDate]
+
+    return pricePanel.astype(np.float32) # return date-by-ticker panel as 32-bit floats
+
+
+########## CALCULATE PANEL STATISTICS ##########
+
+# function to calculate returns, volatility, last price and average volume for every column at once, only counting
+# dates from windowStart on (earlier warm-up dates only give the window's first return a previous price)
+def calculate_panel_statistics(
+
+    pricePanel,
+    volumePanel=None,
+    annualizationFactor=ANNUALIZATION_FACTOR,
+    windowStart=None
+):
+
+    ##### set variables #####
+
+    prices = pricePanel.to_numpy(dtype=np.float32) # take the panel as a date-by-ticker array
+    hasPrice = ~np.isnan(prices) # find every date a ticker actually traded
+
+    # carry each ticker's last known price forward so gaps between trading days are skipped like dropna()
+    carriedPrices = pricePanel.ffill().to_numpy(dtype=np.float32)
+
+    ##### calculate daily returns #####
+
+    returns = np.full(prices.shape, np.nan, dtype=np.float32) # create an empty array of returns
+
+    # divide every traded price by the previous traded price of the same ticker
+    returns[1:] = prices[1:] / carriedPrices[:-1] - 1
+
+    returns[~hasPrice] = np.nan # never count a return on a day the ticker did not trade
+
+    ##### drop warm-up days #####
+
+    if windowStart is not None: # if the panel starts with warm-up days...
+
+        windowRows = pricePanel.index >= windowStart # find every date inside the window
+
+        # keep only the window's dates now that its first return has been measured from the warm-up days
+        prices, hasPrice, carriedPrices, returns = (x[windowRows] for x in (prices, hasPrice, carriedPrices, returns))
+        pricePanel = pricePanel[windowRows]
+
+    ##### calculate volatility #####
+
+    returnCounts = np.sum(~np.isnan(returns), axis=0) # count returns per ticker
+
+    with np.errstate(invalid='ignore', divide='ignore'): # tickers with fewer than 2 returns have no volatility
+
+        # find the mean and sample standard deviation of every column at once (same as pandas std)
+        returnMeans = np.nansum(returns, axis=0, dtype=np.float64) / returnCounts
+        returnVariances = np.nansum((returns - returnMeans) ** 2, axis=0, dtype=np.float64) / (returnCounts - 1)
+
+    returnVariances[returnCounts < 2] = np.nan # pandas returns no standard deviation for under 2 returns
+
+    volatility = np.sqrt(returnVariances) * annualizationFactor * 100 # calculate volatility in percent
+
+    ##### find last prices #####
+
+    # take the latest known price of every ticker (empty if the ticker never traded in the window)
+    lastPrice = carriedPrices[-1] if len(carriedPrices) else np.full(prices.shape[1], np.nan, dtype=np.float32)
+
+    ##### calculate average volume #####
+
+    averageVolume = np.full(prices.shape[1], np.nan) # tickers without volume data have no average volume
+
+    if volumePanel is not None: # if volume data was given...
+
+        # line volumes up with the price panel and only count days the ticker traded
+        volumes = volumePanel.reindex(index=pricePanel.index, columns=pricePanel.columns)
+        volumes = volumes.to_numpy(dtype=np.float64, copy=True)
+        volumes[~hasPrice] = np.nan
+
+        volumeCounts = np.sum(~np.isnan(volumes), axis=0) # count volume days per ticker
+
+        with np.errstate(invalid='ignore', divide='ignore'): # tickers without volume days have no average
+
+            averageVolume = np.nansum(volumes, axis=0) / volumeCounts # find every column's average volume at once
+
+    return pd.DataFrame( # return one row of statistics per ticker
+
+        {
+            'volatility': volatility,
+            'lastPrice': lastPrice,
+            'averageVolume': averageVolume,
+            'hasData': hasPrice.any(axis=0)
+        },
+        index=pricePanel.columns
+    )
+
+
+########## ADD LISTING STATISTICS ##########
+
+def add_listing_statistics(panelStatistics, listingDetails, endDate): # function to add listing age and exchange
+
+    # line listing details up with the screened tickers (tickers missing from the listing get empty details)
+    listingDetails = listingDetails.reindex(panelStatistics.index)
+
+    # find how many days every ticker had been listed by the end of the window
+    panelStatistics['listingAgeDays'] = (pd.Timestamp(endDate) - listingDetails['ipoDate']).dt.days.to_numpy()
+
+    for column in listingDetails.columns.drop('ipoDate'): # loop through every other listing detail
+
+        panelStatistics[column] = listingDetails[column].to_numpy() # add detail, such as exchange, to statistics
+
+    return panelStatistics # return statistics with listing details
+
+
+########## COMPILE SCREENING RULES ##########
+
+def compile_screening_rules(rules): # function to compile a screen's rules into one vectorized expression
+
+    conditions = [] # create an empty list of conditions
+
+    for ruleName, ruleValue in rules.items(): # loop through every rule of the screen
+
+        if ruleName not in ruleConditions: # if rule is invalid...
+
+            raise ValueError(f'Invalid screening rule "{ruleName}".') # refuse to silently skip a rule
+
+        statistic, comparison = ruleConditions[ruleName] # find the statistic the rule checks and how
+
+        conditions.append(f'({statistic} {comparison} {ruleValue!r})') # add condition, e.g. (lastPrice > 90)
+
+    return ' & '.join(conditions) if conditions else 'hasData' # return expression that must hold for a pass
+
+
+########## SCREEN PRICE PANELS ##########
+
+# function to run every requested screen over one set of statistics in a single pass
+def screen_price_panels(closePanel, startDate, endDate, screens, volumePanel=None, listingDetails=None):
+
+    ##### calculate statistics once #####
+
+    closePanel = prepare_price_panel(closePanel, endDate) # restrict close panel to the window and its warm-up
+
+    if volumePanel is not None: # if volume data was given...
+
+        volumePanel = volumePanel[(volumePanel.index >= startDate) & (volumePanel.index <= endDate)] # restrict it
+
+    # calculate statistics for every ticker in the window at once
+    screenResults = calculate_panel_statistics(closePanel, volumePanel, windowStart=startDate)
+
+    if listingDetails is not None: # if listing details were given...
+
+        screenResults = add_listing_statistics(screenResults, listingDetails, endDate) # add listing statistics
+
+    ##### evaluate every screen #####
+
+    for screen in screens: # loop through every requested screen
+
+        # evaluate the screen's compiled expression over every ticker at once (tickers without data never pass)
+        screenResults[screen] = screenResults.eval(compile_screening_rules(screeningRules[screen])).fillna(False)
+        screenResults[screen] = screenResults[screen].astype(bool) & screenResults['hasData']
+
+    return screenResults # return statistics and one pass/fail column per screen
+
@@ -0,0 +1,71 @@
+##################################################################################
+# Copyright (c) 2025 Matthew Thomas Beck                                         #
+#                                                                                #
+# Licensed under the Creative Commons Attribution-NonCommercial 4.0              #
+# International (CC BY-NC 4.0). Personal and educational use is permitted.       #
+# Commercial use by companies or for-profit entities is prohibited.              #
+##################################################################################
+
+
+
+
+
+############################################################
+############### IMPORT / CREATE DEPENDENCIES ###############
+############################################################
+
+
+########## IMPORT DEPENDENCIES ##########
+
+##### miscellaneous libraries #####
+
+import zlib # used to hash tickers the same way in every process and on every machine
+import os # used to build shard file paths
+
+
+########## CREATE DEPENDENCIES ##########
+
+##### shard constants #####
+
+SHARD_COUNT = 1 # number of shards the stock universe is split into (1 = run as a single process)
+
+
+
+
+
+###############################################
+############### SHARD FUNCTIONS ###############
+###############################################
+
+
+########## FIND TICKER SHARD ##########
+
+def find_ticker_shard(ticker, shardCount): # function to find which shard a ticker belongs to
+
+    # use crc32 rather than hash(), which is salted differently in every python process
+    return zlib.crc32(ticker.encode('utf-8')) % shardCount
+
+
+########## SELECT SHARD TICKERS ##########
+
+def select_shard_tickers(tickers, shardIndex, shardCount): # function to keep only the tickers of one shard
+
+    if shardIndex is None: # if not running as a shard...
+
+        return list(tickers) # keep every ticker
+
+    # keep the shard's tickers in their original order
+    return [ticker for ticker in tickers if find_ticker_shard(ticker, shardCount) == shardIndex]
+
+
+########## FIND SHARD PATH ##########
+
+def find_shard_path(path, shardIndex, shardCount): # function to find a shard's copy of an output file
+
+    if shardIndex is None: # if not running as a shard...
+
+        return path # use the regular output file
+
+    pathRoot, pathExtension = os.path.splitext(path) # split path into name and extension
+
+    return f"{pathRoot}-shard_{shardIndex}_of_{shardCount}{pathExtension}" # return e.g. name-shard_0_of_4.txt
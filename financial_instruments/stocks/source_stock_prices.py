@@ -0,0 +1,208 @@
+##################################################################################
+# Copyright (c) 2025 Matthew Thomas Beck                                         #
+#                                                                                #
+# Licensed under the Creative Commons Attribution-NonCommercial 4.0              #
+# International (CC BY-NC 4.0). Personal and educational use is permitted.       #
+# Commercial use by companies or for-profit entities is prohibited.              #
+##################################################################################
+
+
+
+
+
+############################################################
+############### IMPORT / CREATE DEPENDENCIES ###############
+############################################################
+
+
+########## IMPORT DEPENDENCIES ##########
+
+##### data collection libraries #####
+
+import yfinance as yf # used to track stock values
+
+# used to make rate-limited requests through a pooled session
+from helper_functions.fetch_from_apis import fetch_url
+from helper_functions.fetch_from_apis import REQUEST_TIMEOUT
+
+##### data modeling libraries #####
+
+import pandas as pd # used to build wide price panels
+
+##### miscellaneous libraries #####
+
+from io import StringIO # used to parse csv text returned by the stub server
+
+
+########## CREATE DEPENDENCIES ##########
+
+##### price source constants #####
+
+PRICE_FIELDS = ['Close', 'Volume'] # price fields kept from every source
+
+STOCK_BATCH_SIZE = 100 # number of tickers requested from a price source at once
+
+##### fixture variables #####
+
+fixturePaths = { # dictionary to map price field with its local fixture file (one column per ticker)
+
+    'Close': './financialInstrument_data/stock_data/stock_data-fixture_close.csv',
+    'Volume': './financialInstrument_data/stock_data/stock_data-fixture_volume.csv'
+}
+
+fixturePanels = {} # cache of loaded fixture panels so repeated chunks do not reread the csv files
+
+
+
+
+
+#####################################################
+############### PRICE PANEL FUNCTIONS ###############
+#####################################################
+
+
+########## CHUNK TICKERS ##########
+
+def chunk_tickers(tickers, batchSize): # function to split a ticker list into batches of batchSize
+
+    batchSize = max(1, int(batchSize)) # never allow an empty or negative batch
+
+    # slice the ticker list into consecutive batches, keeping the original ticker order
+    return [tickers[i:i + batchSize] for i in range(0, len(tickers), batchSize)]
+
+
+########## SHAPE PRICE PANEL ##########
+
+def shape_price_panel(pricePanel, tickers): # function to give every price panel the same date-by-ticker layout
+
+    pricePanel.index = pd.to_datetime(pricePanel.index) # make sure dates are real timestamps
+    pricePanel = pricePanel[~pricePanel.index.duplicated(keep='last')].sort_index() # sort and drop repeated dates
+    pricePanel.index.name = 'Date' # set index name to 'Date'
+
+    # keep only the requested tickers, in order, with missing tickers as empty columns
+    return pricePanel.reindex(columns=tickers)
+
+
+########## DOWNLOAD FROM YFINANCE ##########
+
+# function to download one wide panel per price field for a batch of tickers from yfinance, one ticker at a time
+# through yf.Ticker, which unlike yf.download keeps no module-level results, so fetch workers can download at once
+def download_yfinance_prices(tickers, startDate=None, endDate=None):
+
+    ##### download every ticker #####
+
+    tickerHistories = {} # dictionary to map ticker with its downloaded daily history
+
+    for ticker in tickers: # loop through every ticker in the batch
+
+        tickerHistory = yf.Ticker(ticker).history( # request the ticker's daily history
+
+            **({'period': 'max'} if startDate is None else {'start': startDate}), # full history when no start
+            end=endDate,
+            interval='1d',
+            auto_adjust=True, # adjust closes for splits and dividends like yf.download does by default
+            timeout=REQUEST_TIMEOUT
+        )
+
+        if isinstance(tickerHistory.index, pd.DatetimeIndex) and tickerHistory.index.tz is not None: # if dated...
+
+            tickerHistory.index = tickerHistory.index.tz_localize(None) # drop the exchange's timezone like yf.download
+
+        tickerHistories[ticker] = tickerHistory # store the ticker's history (empty when it returned nothing)
+
+    ##### split batch into fields #####
+
+    pricePanels = {} # dictionary to store one panel per price field
+
+    for field in PRICE_FIELDS: # loop through every kept price field
+
+        pricePanel = pd.DataFrame({ # take the field of every ticker that returned it as one column per ticker
+
+            ticker: tickerHistory[field] for ticker, tickerHistory in tickerHistories.items()
+            if field in tickerHistory.columns
+        })
+
+        pricePanels[field] = shape_price_panel(pricePanel, tickers) # store the shaped panel
+
+    return pricePanels # return panels for every field
+
+
+########## LOAD FROM FIXTURE ##########
+
+# function to load one wide panel per price field for a batch of tickers from local fixture files
+def load_fixture_prices(tickers, startDate=None, endDate=None):
+
+    pricePanels = {} # dictionary to store one panel per price field
+
+    for field in PRICE_FIELDS: # loop through every kept price field
+
+        if field not in fixturePanels: # if fixture has not been loaded yet...
+
+            try: # attempt to read the fixture file...
+
+                fixturePanels[field] = pd.read_csv(fixturePaths[field], index_col=0, parse_dates=True)
+
+            except FileNotFoundError: # if there is no fixture for this field...
+
+                fixturePanels[field] = pd.DataFrame() # use an empty panel
+
+        pricePanel = shape_price_panel(fixturePanels[field].copy(), tickers) # select the requested tickers
+
+        if startDate is not None: # if a start date was requested...
+
+            pricePanel = pricePanel[pricePanel.index >= startDate] # drop dates before the start date
+
+        if endDate is not None: # if an end date was requested...
+
+            pricePanel = pricePanel[pricePanel.index < endDate] # drop dates from the end date on, like yfinance
+
+        pricePanels[field] = pricePanel # store the panel
+
+    return pricePanels # return panels for every field
+
+
+########## DOWNLOAD FROM STUB SERVER ##########
+
+# function to download one wide panel per price field for a batch of tickers from a local stub server
+def download_stub_prices(tickers, startDate=None, endDate=None):
+
+    pricePanels = {} # dictionary to store one panel per price field
+
+    for field in PRICE_FIELDS: # loop through every kept price field
+
+        stubPage = fetch_url( # request the field's wide csv through the pooled, rate-limited session
+
+            'stub',
+            params={'tickers': ','.join(tickers), 'field': field, 'start': startDate, 'end': endDate},
+            path='/prices'
+        )
+
+        stubPage.raise_for_status() # fail the batch if the stub server returned an error
+
+        pricePanel = pd.read_csv(StringIO(stubPage.text), index_col=0) # parse the wide csv
+
+        pricePanels[field] = shape_price_panel(pricePanel, tickers) # store the shaped panel
+
+    return pricePanels # return panels for every field
+
+
+########## PRICE SOURCES ##########
+
+priceSources = { # dictionary to map price source name with its download function
+
+    'yfinance': download_yfinance_prices,
+    'fixture': load_fixture_prices,
+    'stub': download_stub_prices
+}
+
+
+########## DOWNLOAD PRICE PANELS ##########
+
+# function to download price panels for a batch of tickers from the chosen price source
+def download_price_panels(tickers, startDate=None, endDate=None, priceSource='yfinance'):
+
+    if priceSource not in priceSources: # if price source is invalid...
+
+        raise ValueError(f'Invalid price source "{priceSource}".') # refuse to guess a source
+
+    return priceSources[priceSource](list(tickers), startDate, endDate) # return panels from the price source
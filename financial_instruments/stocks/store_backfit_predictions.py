@@ -0,0 +1,90 @@
+##################################################################################
+# Copyright (c) 2025 Matthew Thomas Beck                                         #
+#                                                                                #
+# Licensed under the Creative Commons Attribution-NonCommercial 4.0              #
+# International (CC BY-NC 4.0). Personal and educational use is permitted.       #
+# Commercial use by companies or for-profit entities is prohibited.              #
+##################################################################################
+
+
+
+
+
+############################################################
+############### IMPORT / CREATE DEPENDENCIES ###############
+############################################################
+
+
+########## IMPORT DEPENDENCIES ##########
+
+##### data modeling libraries #####
+
+import pandas as pd # used to rebuild each ticker's back fit predictions indexed by date
+import numpy as np # used to save each ticker's back fit predictions as numpy arrays
+
+##### miscellaneous libraries #####
+
+import os # used to build store paths and swap files atomically
+
+
+########## CREATE DEPENDENCIES ##########
+
+##### back fit store variables #####
+
+backfitStorePath = './financialInstrument_data/stock_data/backfit_store' # directory holding one file per ticker
+
+
+
+
+
+########################################################
+############### BACK FIT STORE FUNCTIONS ###############
+########################################################
+
+
+########## FIND BACKFIT PATH ##########
+
+def find_backfit_path(ticker): # function to find the back fit file of a ticker
+
+    return f"{backfitStorePath}/{ticker.replace('/', '_')}.npz" # return path with unsafe characters replaced
+
+
+########## READ BACKFIT PREDICTIONS ##########
+
+def read_backfit_predictions(ticker): # function to read every stored back fit prediction of a ticker
+
+    try: # attempt to read the ticker's back fit file...
+
+        with np.load(find_backfit_path(ticker)) as storedBackfit: # open the ticker's back fit file
+
+            # rebuild the ticker's predicted closing prices indexed by date
+            return pd.Series(
+
+                storedBackfit['Predicted Close'],
+                index=pd.DatetimeIndex(storedBackfit['Date'], name='Date'),
+                dtype=np.float64
+            )
+
+    except FileNotFoundError: # if ticker has never been back fit...
+
+        return pd.Series(index=pd.DatetimeIndex([], name='Date'), dtype=np.float64) # return empty predictions
+
+
+########## WRITE BACKFIT PREDICTIONS ##########
+
+def write_backfit_predictions(ticker, backfitPredictions): # function to write every back fit prediction of a ticker
+
+    os.makedirs(backfitStorePath, exist_ok=True) # make sure the store directory exists
+
+    backfitPath = find_backfit_path(ticker) # find the ticker's back fit file
+
+    with open(backfitPath + '.tmp', 'wb') as backfitFile: # write to a temporary file first
+
+        np.savez( # save dates and predictions as column arrays
+
+            backfitFile,
+            Date=backfitPredictions.index.values.astype('datetime64[D]'),
+            **{'Predicted Close': backfitPredictions.to_numpy(dtype=np.float64)}
+        )
+
+    os.replace(backfitPath + '.tmp', backfitPath) # swap in the new file so a crash never corrupts it
@@ -0,0 +1,414 @@
+##################################################################################
+# Copyright (c) 2025 Matthew Thomas Beck                                         #
+#                                                                                #
+# Licensed under the Creative Commons Attribution-NonCommercial 4.0              #
+# International (CC BY-NC 4.0). Personal and educational use is permitted.       #
+# Commercial use by companies or for-profit entities is prohibited.              #
+##################################################################################
+
+
+
+
+
+############################################################
+############### IMPORT / CREATE DEPENDENCIES ###############
+############################################################
+
+
+########## IMPORT DEPENDENCIES ##########
+
+##### data collection functions #####
+
+# used to download wide price panels for batches of tickers
+from financial_instruments.stocks.source_stock_prices import download_price_panels
+from financial_instruments.stocks.source_stock_prices import chunk_tickers
+from financial_instruments.stocks.source_stock_prices import PRICE_FIELDS
+from financial_instruments.stocks.source_stock_prices import STOCK_BATCH_SIZE
+
+# used to download batches with a bounded pool of workers under the provider's rate limit
+from helper_functions.fetch_from_apis import fetch_concurrently
+
+##### data modeling libraries #####
+
+import pandas as pd # used to rebuild price frames and panels from the store
+import numpy as np # used to save each ticker's columns as numpy arrays
+
+##### miscellaneous libraries #####
+
+import json # used to save the watermark of every ticker
+import os # used to build store paths and swap files atomically
+import fcntl # used to lock the watermarks file while shard processes save their own tickers
+
+
+########## CREATE DEPENDENCIES ##########
+
+##### price store variables #####
+
+priceStorePath = './financialInstrument_data/stock_data/price_store' # directory holding one file per ticker
+watermarksPath = priceStorePath + '/watermarks.json' # file holding the first and last stored date of every ticker
+watermarksLockPath = priceStorePath + '/watermarks.lock' # file locked while watermarks are being saved
+
+##### price store constants #####
+
+ADJUSTMENT_TOLERANCE = 1e-4 # relative change of a stored close that counts as an adjustment (splits and dividends)
+
+
+
+
+
+##########################################################
+############### PRICE STORE FILE FUNCTIONS ###############
+##########################################################
+
+
+########## FIND TICKER PATH ##########
+
+def find_ticker_path(ticker): # function to find the store file of a ticker
+
+    return f"{priceStorePath}/{ticker.replace('/', '_')}.npz" # return path with unsafe characters replaced
+
+
+########## LOAD WATERMARKS ##########
+
+def load_watermarks(): # function to load the first and last stored date of every ticker
+
+    try: # attempt to read the watermarks file...
+
+        with open(watermarksPath, 'r') as watermarksFile: # open watermarks file
+
+            watermarks = json.load(watermarksFile) # load dictionary of ticker to stored dates
+
+    except FileNotFoundError: # if the store is empty...
+
+        return {} # return no watermarks
+
+    for ticker, watermark in watermarks.items(): # loop through every ticker's watermark
+
+        if isinstance(watermark, str): # if watermark only holds a last date (full history was stored)...
+
+            watermarks[ticker] = {'first': None, 'last': watermark} # mark the ticker's full history as stored
+
+    return watermarks # return dictionary of ticker to first and last stored date
+
+
+########## SAVE WATERMARKS ##########
+
+# function to save the first and last stored date of tickers (every ticker in watermarks when tickers is None)
+def save_watermarks(watermarks, tickers=None):
+
+    os.makedirs(priceStorePath, exist_ok=True) # make sure the store directory exists
+
+    with open(watermarksLockPath, 'w') as watermarksLock: # open the lock shared by every process using the store
+
+        fcntl.flock(watermarksLock, fcntl.LOCK_EX) # wait until no other process is saving watermarks
+
+        if tickers is not None: # if only some tickers changed...
+
+            # reread the file so watermarks saved by other shard processes in the meantime are kept
+            savedWatermarks = load_watermarks()
+            savedWatermarks.update({ticker: watermarks[ticker] for ticker in tickers if ticker in watermarks})
+            watermarks = savedWatermarks
+
+        with open(watermarksPath + '.tmp', 'w') as watermarksFile: # write to a temporary file first
+
+            json.dump(watermarks, watermarksFile, sort_keys=True) # save dictionary of watermarks
+
+        os.replace(watermarksPath + '.tmp', watermarksPath) # swap in the new file so a crash never corrupts it
+
+
+########## READ STORED PRICES ##########
+
+def read_stored_prices(ticker): # function to read every stored price field of a ticker
+
+    try: # attempt to read the ticker's store file...
+
+        with np.load(find_ticker_path(ticker)) as storedPrices: # open the ticker's columnar file
+
+            # rebuild a dataframe with one column per price field, indexed by date
+            return pd.DataFrame(
+
+                {field: storedPrices[field] for field in PRICE_FIELDS if field in storedPrices.files},
+                index=pd.DatetimeIndex(storedPrices['Date'], name='Date')
+            )
+
+    except FileNotFoundError: # if ticker has never been stored...
+
+        return pd.DataFrame(columns=PRICE_FIELDS, index=pd.DatetimeIndex([], name='Date')) # return empty frame
+
+
+########## WRITE STORED PRICES ##########
+
+def write_stored_prices(ticker, storedPrices): # function to write every price field of a ticker
+
+    os.makedirs(priceStorePath, exist_ok=True) # make sure the store directory exists
+
+    tickerPath = find_ticker_path(ticker) # find the ticker's store file
+
+    with open(tickerPath + '.tmp', 'wb') as tickerFile: # write to a temporary file first
+
+        np.savez( # save every price field as its own column array
+
+            tickerFile,
+            Date=storedPrices.index.values.astype('datetime64[D]'),
+            **{field: storedPrices[field].to_numpy(dtype=np.float64) for field in storedPrices.columns}
+        )
+
+    os.replace(tickerPath + '.tmp', tickerPath) # swap in the new file so a crash never corrupts it
+
+
+
+
+
+#####################################################
+############### PRICE STORE FUNCTIONS ###############
+#####################################################
+
+
+########## DOWNLOAD TICKER GROUPS ##########
+
+# function to download every (start date, end date, ticker batch) job, returning (start date, end date, ticker batch,
+# price panels or the exception it raised) per job
+def download_price_jobs(downloadJobs, priceSource):
+
+    downloadResults = fetch_concurrently( # download every batch with a bounded pool of rate-limited workers
+
+        priceSource,
+        lambda downloadJob: download_price_panels(downloadJob[2], downloadJob[0], downloadJob[1], priceSource),
+        downloadJobs,
+        tokenCounts=[len(downloadJob[2]) for downloadJob in downloadJobs] # one token per ticker
+    )
+
+    return [(*downloadJob, pricePanels) for downloadJob, pricePanels in zip(downloadJobs, downloadResults)]
+
+
+########## DOWNLOAD TICKER GROUPS ##########
+
+# function to download every group of tickers missing the same days (a dictionary of (start date, end date) to tickers)
+# in batches, downloading the tickers of a failed batch one by one so one bad ticker never fails the others, returning
+# (start date, end date, ticker batch, price panels or the exception it raised) per batch
+def download_ticker_groups(tickerGroups, priceSource, batchSize):
+
+    downloadJobs = [] # create an empty list of (start date, end date, ticker batch) downloads
+
+    for (groupStart, groupEnd), tickerGroup in tickerGroups.items(): # loop through every group of tickers
+
+        for tickerBatch in chunk_tickers(tickerGroup, batchSize): # download each group in batches
+
+            downloadJobs.append((groupStart, groupEnd, tickerBatch)) # add the batch to the downloads
+
+    priceDownloads = download_price_jobs(downloadJobs, priceSource) # download every batch
+
+    ##### download failed batches by ticker #####
+
+    retryJobs = [ # create one download per ticker of every failed batch of more than one ticker
+
+        (groupStart, groupEnd, [ticker])
+        for groupStart, groupEnd, tickerBatch, pricePanels in priceDownloads
+        if isinstance(pricePanels, Exception) and len(tickerBatch) > 1 for ticker in tickerBatch
+    ]
+
+    if retryJobs: # if any batch failed...
+
+        print(f"Downloading {len(retryJobs)} tickers of failed batches one by one...\n") # print retrying statement
+
+        priceDownloads = [ # keep every batch that did not fail and add every ticker downloaded on its own
+
+            x for x in priceDownloads if not (isinstance(x[3], Exception) and len(x[2]) > 1)
+        ] + download_price_jobs(retryJobs, priceSource)
+
+    return priceDownloads # return every batch's prices or error
+
+
+########## MERGE PRICE DOWNLOADS ##########
+
+# function to merge every downloaded batch into the store (replacing each ticker's stored days when replaceHistory is
+# True), returning a dictionary of (first stored date, end date) to the tickers whose overlap day no longer matches
+def merge_price_downloads(priceDownloads, watermarks, failedTickers, replaceHistory=False):
+
+    rewriteGroups = {} # dictionary to group tickers whose stored history has to be downloaded again
+
+    for groupStart, groupEnd, tickerBatch, pricePanels in priceDownloads: # loop through every batch
+
+        if isinstance(pricePanels, Exception): # if unable to download the batch...
+
+            print(f'Error downloading price data: "{pricePanels}"\n') # print failure error with exception
+
+            # count the batch as failed only for tickers that have nothing stored
+            failedTickers.update({ticker: 'download_error' for ticker in tickerBatch if ticker not in watermarks})
+
+            continue # move on to the next batch
+
+        for ticker in tickerBatch: # loop through every ticker in the batch
+
+            # take the ticker's new rows for every field, keeping only days with a closing price
+            newPrices = pd.DataFrame(
+
+                {field: pricePanels[field][ticker] for field in PRICE_FIELDS if field in pricePanels}
+            ).dropna(subset=['Close'])
+
+            if newPrices.empty and ticker not in watermarks: # if ticker still has no data at all...
+
+                failedTickers[ticker] = 'no_data' # add ticker to failed tickers
+
+                continue # move on to the next ticker
+
+            ##### move watermarks #####
+
+            # find the date the ticker's stored days now start from (None = the ticker's full history)
+            firstDate = watermarks[ticker]['first'] if ticker in watermarks else groupStart
+            firstDate = None if None in (firstDate, groupStart) else min(firstDate, groupStart)
+
+            if newPrices.empty: # if the window had no trading days for the ticker...
+
+                watermarks[ticker]['first'] = firstDate # only record that the earlier days were checked
+
+                continue # move on to the next ticker
+
+            storedPrices = read_stored_prices(ticker) # read the ticker's stored days
+
+            ##### check overlap day #####
+
+            overlapDate = pd.Timestamp(groupStart) # the last stored day, downloaded again with the later days
+
+            # if the batch downloaded the ticker's last stored day again...
+            if not replaceHistory and ticker in watermarks and watermarks[ticker]['last'] == groupStart and (
+                overlapDate in newPrices.index and overlapDate in storedPrices.index
+            ):
+
+                # if the provider adjusted the ticker's closes since they were stored, such as after a split...
+                if not np.isclose(
+
+                    newPrices.loc[overlapDate, 'Close'],
+                    storedPrices.loc[overlapDate, 'Close'],
+                    rtol=ADJUSTMENT_TOLERANCE,
+                    atol=0
+                ):
+
+                    # download every stored day again instead of mixing two scales of prices
+                    rewriteGroups.setdefault((watermarks[ticker]['first'], groupEnd), []).append(ticker)
+
+                    continue # move on to the next ticker
+
+            ##### save prices #####
+
+            if replaceHistory: # if the ticker's whole stored history was downloaded again...
+
+                storedPrices = newPrices # replace every stored day
+
+            else: # if only missing days were downloaded...
+
+                storedPrices = pd.concat([storedPrices[~storedPrices.index.isin(newPrices.index)], newPrices])
+
+            write_stored_prices(ticker, storedPrices.sort_index()) # save the merged days
+
+            # move the ticker's watermarks
+            watermarks[ticker] = {'first': firstDate, 'last': str(storedPrices.index.max().date())}
+
+        save_watermarks(watermarks, tickerBatch) # save the batch's watermarks so progress is never lost
+
+    return rewriteGroups # return tickers whose stored history has to be downloaded again
+
+
+########## UPDATE PRICE STORE ##########
+
+# function to download only the days of the window [startDate, endDate) each ticker is missing from the store (a
+# startDate of None asks for the ticker's full history), never storing a day whose session has not closed yet
+def update_price_store(
+
+    tickers,
+    startDate=None,
+    endDate=None,
+    priceSource='yfinance',
+    batchSize=STOCK_BATCH_SIZE
+):
+
+    ##### set variables #####
+
+    watermarks = load_watermarks() # load the first and last stored date of every ticker
+
+    todayDate = str(pd.Timestamp.today().date()) # find today's date, whose session may still be trading
+
+    if endDate is None or endDate > todayDate: # if no end date was given or it includes today...
+
+        endDate = todayDate # only fetch completed sessions, so a partial bar never moves the watermark past its day
+
+    tickerGroups = {} # dictionary to group tickers that are missing the same days
+    failedTickers = {} # dictionary to map tickers that still have no data with why they failed
+
+    ##### group tickers by missing days #####
+
+    for ticker in tickers: # loop through every requested ticker
+
+        if ticker not in watermarks: # if ticker has never been stored...
+
+            tickerGroups.setdefault((startDate, endDate), []).append(ticker) # request the whole window
+
+            continue # move on to the next ticker
+
+        firstDate = watermarks[ticker]['first'] # get the date the ticker's stored days start from (None = listing)
+
+        if firstDate is not None and (startDate is None or startDate < firstDate): # if window starts earlier...
+
+            tickerGroups.setdefault((startDate, firstDate), []).append(ticker) # only request the earlier days
+
+        lastDate = watermarks[ticker]['last'] # get the last stored date
+
+        if lastDate < endDate: # if the window ends after the last stored date...
+
+            # request the days after the last stored date plus the last stored date itself, so closes adjusted
+            # since they were stored are noticed
+            tickerGroups.setdefault((lastDate, endDate), []).append(ticker)
+
+    ##### download missing days #####
+
+    # download every group and merge it into the store, finding tickers whose closes were adjusted
+    rewriteGroups = merge_price_downloads(
+
+        download_ticker_groups(tickerGroups, priceSource, batchSize), watermarks, failedTickers
+    )
+
+    ##### download adjusted histories again #####
+
+    if rewriteGroups: # if any ticker's stored closes no longer match the provider's...
+
+        # print rewriting statement
+        print(f"Downloading the adjusted history of {sum(map(len, rewriteGroups.values()))} tickers again...\n")
+
+        # download every stored day of the adjusted tickers and replace their stored history
+        merge_price_downloads(
+
+            download_ticker_groups(rewriteGroups, priceSource, batchSize), watermarks, failedTickers, True
+        )
+
+    return failedTickers # return tickers that have no stored data and why
+
+
+########## READ PRICE PANEL ##########
+
+# function to read one wide date-by-ticker panel of a price field from the store
+def read_price_panel(tickers, startDate=None, endDate=None, field='Close'):
+
+    priceColumns = {} # dictionary to store one column per ticker
+
+    for ticker in tickers: # loop through every requested ticker
+
+        storedPrices = read_stored_prices(ticker) # read the ticker's stored days
+
+        if field in storedPrices.columns: # if field is stored for the ticker...
+
+            priceColumns[ticker] = storedPrices[field] # add the ticker's column
+
+    # combine every ticker's column at once, keeping missing tickers as empty columns
+    pricePanel = pd.concat(priceColumns, axis=1) if priceColumns else pd.DataFrame()
+    pricePanel = pricePanel.reindex(columns=list(tickers)).astype(np.float64)
+    pricePanel.index.name = 'Date' # set index name to 'Date'
+
+    if startDate is not None: # if a start date was requested...
+
+        pricePanel = pricePanel[pricePanel.index >= startDate] # drop dates before the start date
+
+    if endDate is not None: # if an end date was requested...
+
+        pricePanel = pricePanel[pricePanel.index <= endDate] # drop dates after the end date
+
+    return pricePanel # return date-by-ticker panel
@@ -0,0 +1,196 @@
+##################################################################################
+# Copyright (c) 2025 Matthew Thomas Beck                                         #
+#                                                                                #
+# Licensed under the Creative Commons Attribution-NonCommercial 4.0              #
+# International (CC BY-NC 4.0). Personal and educational use is permitted.       #
+# Commercial use by companies or for-profit entities is prohibited.              #
+##################################################################################
+
+
+
+
+
+############################################################
+############### IMPORT / CREATE DEPENDENCIES ###############
+############################################################
+
+
+########## IMPORT DEPENDENCIES ##########
+
+##### failure store libraries #####
+
+import sqlite3 # used to keep an indexed store of failed tickers
+
+##### miscellaneous libraries #####
+
+import time # used to timestamp attempts and schedule retries
+import os # used to check for the store and the legacy failed tickers list
+
+
+########## CREATE DEPENDENCIES ##########
+
+##### retry constants #####
+
+MAX_RETRY_ATTEMPTS = 8 # number of failed attempts before a ticker is never retried again
+MAX_RETRY_DELAY = 30 * 24 * 3600 # longest wait (in seconds) between two retries of a ticker
+
+retryDelays = { # dictionary to map failure reason with its first retry delay in seconds (None = never retry)
+
+    'download_error': 3600, # network or provider errors usually clear up within the hour
+    'no_data': 24 * 3600, # tickers that returned nothing are checked again the next day
+    'delisted': None # delisted tickers will never return data
+}
+
+##### failure store variables #####
+
+failedStorePath = './financialInstrument_data/stock_data/stock_data-failed_tickers.db' # path of failure store
+legacyFailedPath = './financialInstrument_data/stock_data/stock_data-failed_tickers.txt' # path of old flat list
+
+
+
+
+
+######################################################
+############### FAILURE STORE FUNCTIONS ##############
+######################################################
+
+
+########## CONNECT TO FAILURE STORE ##########
+
+def connect_failed_store(): # function to open the failure store, creating it from the legacy list if needed
+
+    ##### open store #####
+
+    storeExists = os.path.exists(failedStorePath) # check whether the store has been created before
+
+    failedStore = sqlite3.connect(failedStorePath, timeout=30) # open the store, waiting on other writers
+
+    failedStore.execute( # create the failed tickers table if it does not exist yet
+
+        'CREATE TABLE IF NOT EXISTS failed_tickers ('
+        'ticker TEXT PRIMARY KEY, '
+        'reason TEXT NOT NULL, '
+        'attempts INTEGER NOT NULL, '
+        'last_attempt REAL NOT NULL, '
+        'next_retry REAL)' # empty when the ticker is never retried again
+    )
+
+    # index retry times so only due tickers are read
+    failedStore.execute('CREATE INDEX IF NOT EXISTS failed_tickers_next_retry ON failed_tickers (next_retry)')
+
+    ##### import legacy list #####
+
+    if not storeExists and os.path.exists(legacyFailedPath): # if store is new and an old flat list exists...
+
+        with open(legacyFailedPath, 'r') as failedStockDownloadsFile: # open and read the old flat list
+
+            # store failed downloads list into array, skipping blank lines
+            legacyFailedTickers = [str(line.strip()) for line in failedStockDownloadsFile if line.strip()]
+
+        # import every old failure as due now so the first retry decides what happens to it
+        failedStore.executemany(
+
+            'INSERT OR IGNORE INTO failed_tickers VALUES (?, ?, ?, ?, ?)',
+            [(ticker, 'no_data', 1, time.time(), time.time()) for ticker in legacyFailedTickers]
+        )
+
+        print(f"Imported {len(legacyFailedTickers)} failed downloads into the failure store.\n")
+
+    failedStore.commit() # save table, index and imported failures
+
+    return failedStore # return open store
+
+
+########## RECORD FAILED TICKERS ##########
+
+def record_failed_tickers(tickers, reason): # function to record a failed attempt and schedule the next retry
+
+    ##### set variables #####
+
+    now = time.time() # get current time
+    tickers = list(dict.fromkeys(tickers)) # drop repeated tickers, keeping order
+
+    if not tickers: # if there is nothing to record...
+
+        return # return without opening the store
+
+    failedStore = connect_failed_store() # open the failure store
+
+    ##### find attempts so far #####
+
+    priorAttempts = {} # dictionary to map ticker with its earlier failed attempts
+
+    for tickerBatch in [tickers[i:i + 500] for i in range(0, len(tickers), 500)]: # stay under sqlite's variable limit
+
+        priorAttempts.update(failedStore.execute( # read earlier attempts of the batch with one indexed query
+
+            f"SELECT ticker, attempts FROM failed_tickers WHERE ticker IN ({','.join('?' * len(tickerBatch))})",
+            tickerBatch
+        ).fetchall())
+
+    ##### schedule retries #####
+
+    failedRows = [] # create an empty list of rows to write
+
+    for ticker in tickers: # loop through every failed ticker
+
+        attempts = priorAttempts.get(ticker, 0) + 1 # count this attempt
+
+        if retryDelays[reason] is None or attempts >= MAX_RETRY_ATTEMPTS: # if ticker should never be retried...
+
+            nextRetry = None # stop retrying ticker
+
+        else: # if ticker may recover...
+
+            # double the wait after every failed attempt, up to the longest allowed wait
+            nextRetry = now + min(retryDelays[reason] * (2 ** (attempts - 1)), MAX_RETRY_DELAY)
+
+        failedRows.append((ticker, reason, attempts, now, nextRetry)) # add row to write
+
+    failedStore.executemany('INSERT OR REPLACE INTO failed_tickers VALUES (?, ?, ?, ?, ?)', failedRows)
+
+    failedStore.commit() # save failures
+    failedStore.close() # close store
+
+
+########## CLEAR FAILED TICKERS ##########
+
+def clear_failed_tickers(tickers): # function to remove tickers that downloaded successfully from the store
+
+    failedStore = connect_failed_store() # open the failure store
+
+    # delete every recovered ticker
+    failedStore.executemany('DELETE FROM failed_tickers WHERE ticker = ?', [(ticker,) for ticker in tickers])
+
+    failedStore.commit() # save removals
+    failedStore.close() # close store
+
+
+########## FIND FAILED TICKERS ##########
+
+def find_failed_tickers(): # function to find every ticker in the failure store
+
+    failedStore = connect_failed_store() # open the failure store
+
+    failedTickers = {row[0] for row in failedStore.execute('SELECT ticker FROM failed_tickers')} # read tickers
+
+    failedStore.close() # close store
+
+    return failedTickers # return set of failed tickers
+
+
+########## FIND DUE TICKERS ##########
+
+def find_due_tickers(): # function to find failed tickers whose next retry time has passed
+
+    failedStore = connect_failed_store() # open the failure store
+
+    dueTickers = [row[0] for row in failedStore.execute( # read only due tickers through the retry index
+
+        'SELECT ticker FROM failed_tickers WHERE next_retry <= ? ORDER BY ticker',
+        (time.time(),)
+    )]
+
+    failedStore.close() # close store
+
+    return dueTickers # return list of due tickers
@@ -0,0 +1,268 @@
+##################################################################################
+# Copyright (c) 2025 Matthew Thomas Beck                                         #
+#                                                                                #
+# Licensed under the Creative Commons Attribution-NonCommercial 4.0              #
+# International (CC BY-NC 4.0). Personal and educational use is permitted.       #
+# Commercial use by companies or for-profit entities is prohibited.              #
+##################################################################################
+
+
+
+
+
+############################################################
+############### IMPORT / CREATE DEPENDENCIES ###############
+############################################################
+
+
+########## IMPORT DEPENDENCIES ##########
+
+##### machine learning functions #####
+
+# used to create the training windows of every retrained fold
+from helper_functions.create_tensorflow_model import prepare_multi_horizon_data
+from helper_functions.create_tensorflow_model import NUMBER_STEPS
+
+# used to retrain every ticker and fold in a pool of fresh processes that split the cores between them
+from helper_functions.train_models import start_worker_pool
+from helper_functions.train_models import TRAINING_WORKERS
+
+##### data modeling libraries #####
+
+import pandas as pd # used to read the predictions csv and record every fold's results
+import numpy as np # used to score every ticker and fold at once
+
+
+########## CREATE DEPENDENCIES ##########
+
+##### backtest constants #####
+
+BACKTEST_FOLDS = 5 # number of consecutive test periods the history is split into
+BACKTEST_HORIZON = 3 # number of rows ahead every back fit prediction targets (the furthest future step)
+PREDICTED_DAYS = 3 # number of upcoming days at the end of every predictions csv, which have no actual price yet
+
+##### backtest variables #####
+
+backtestStatistics = ['Count', 'MAE', 'RMSE', 'MAPE', 'Hit Rate', 'R Squared'] # statistics of every ticker and fold
+
+
+
+
+
+##################################################
+############### BACKTEST FUNCTIONS ###############
+##################################################
+
+
+########## READ PREDICTION TABLE ##########
+
+# function to read a predictions csv as (tickers, dates, actual prices, predicted prices), leaving out the upcoming days
+# so every row has an actual price (prices are shaped (dates, tickers))
+def read_prediction_table(predictionPath):
+
+    predictionTable = pd.read_csv(predictionPath, index_col='Date', parse_dates=True) # read actual and predicted prices
+    predictionTable = predictionTable.iloc[:-PREDICTED_DAYS] # remove the upcoming days
+
+    # find every ticker with a prediction column
+    tickerNames = [x[:-len(' Predicted Close')] for x in predictionTable.columns if x.endswith(' Predicted Close')]
+
+    return ( # take every ticker's actual and predicted prices as one array each
+
+        tickerNames,
+        predictionTable.index,
+        predictionTable[[x + ' Close' for x in tickerNames]].to_numpy(dtype=np.float64),
+        predictionTable[[x + ' Predicted Close' for x in tickerNames]].to_numpy(dtype=np.float64)
+    )
+
+
+########## FIND FOLD BOUNDS ##########
+
+def find_fold_bounds(firstRow, stopRow, foldCount): # function to split rows into foldCount consecutive test periods
+
+    if stopRow - firstRow < foldCount: # if there are fewer rows than folds...
+
+        raise ValueError(f"Need at least {foldCount} rows to create {foldCount} folds.")
+
+    return np.linspace(firstRow, stopRow, foldCount + 1).astype(int) # return the first row of every fold and the stop
+
+
+########## SCORE BACKTEST FOLDS ##########
+
+# function to score the predictions made on every row of every fold, where the prediction on a row targets the actual
+# price horizon rows later, returning a dictionary of statistic name with a (folds, tickers) array
+def score_backtest_folds(actualCloses, predictedCloses, horizon, foldBounds):
+
+    ##### line predictions up with targets #####
+
+    testRows = slice(foldBounds[0], foldBounds[-1]) # every row tested by a fold
+    baseCloses = actualCloses[:-horizon][testRows] # actual prices on the days predictions were made
+    targetCloses = actualCloses[horizon:][testRows] # actual prices the predictions target
+    testPredictions = predictedCloses[:-horizon][testRows] # predictions of every tested row
+
+    # only score rows with a prediction, a target and a price to measure direction from (tickers miss some days)
+    validRows = np.isfinite(baseCloses) & np.isfinite(targetCloses) & np.isfinite(testPredictions)
+
+    # leave out rows before a ticker listed (stored as 0) and rows without a genuine back fit, whose prediction is
+    # only a copy of the actual price of the day
+    validRows &= (baseCloses != 0) & (targetCloses != 0) & (testPredictions != baseCloses)
+
+    movedRows = validRows & (targetCloses != baseCloses) # only rows whose price moved have a direction to predict
+
+    ##### sum every statistic over every fold at once #####
+
+    with np.errstate(divide='ignore', invalid='ignore'): # ignore the missing rows, which are masked below
+
+        predictionErrors = testPredictions - targetCloses # find the error of every prediction
+
+        rowStatistics = np.where(validRows, np.stack([ # stack what every statistic sums over the rows
+
+            np.ones_like(predictionErrors),
+            np.abs(predictionErrors),
+            predictionErrors ** 2,
+            np.abs(predictionErrors / targetCloses),
+            movedRows,
+            movedRows & (np.sign(testPredictions - baseCloses) == np.sign(targetCloses - baseCloses)), # right way
+            targetCloses,
+            targetCloses ** 2
+        ]), 0)
+
+    # sum every statistic over the rows of every fold, since folds are consecutive rows
+    foldSums = np.add.reduceat(rowStatistics, foldBounds[:-1] - foldBounds[0], axis=1)
+
+    rowCount, absoluteSum, squaredSum, percentSum, movedCount, hitSum, targetSum, targetSquaredSum = foldSums # sums
+
+    ##### find statistics #####
+
+    with np.errstate(divide='ignore', invalid='ignore'): # leave tickers without a scored row as nan
+
+        totalSquares = targetSquaredSum - targetSum ** 2 / rowCount # find variance of the targets like r squared does
+
+        return { # return every statistic of every fold and ticker
+
+            'Count': rowCount,
+            'MAE': absoluteSum / rowCount,
+            'RMSE': np.sqrt(squaredSum / rowCount),
+            'MAPE': percentSum / rowCount * 100,
+            'Hit Rate': hitSum / movedCount * 100,
+            'R Squared': (1 - squaredSum / totalSquares) * 100
+        }
+
+
+########## RETRAIN BACKTEST FOLD ##########
+
+# function to train a model on every window whose target comes before the fold and predict every row of the fold in a
+# worker, returning the fold's predicted prices
+def retrain_backtest_fold(foldJob):
+
+    # import model creation inside the worker, since keras models cannot be sent between processes
+    from helper_functions.create_tensorflow_model import create_trained_model
+
+    ##### set variables #####
+
+    tickerCloses = pd.Series(foldJob['closes']).ffill().to_numpy() # carry prices over the days the ticker missed
+    foldStart, foldStop, horizon = foldJob['foldStart'], foldJob['foldStop'], foldJob['horizon'] # get fold rows
+    firstValid = np.argmax(np.isfinite(tickerCloses)) # find the first day the ticker traded
+
+    foldPredictions = np.full(foldStop - foldStart, np.nan) # create the fold's predictions, nan when untrained
+
+    # if the ticker has no window before the fold or not enough history to train on...
+    if foldStart - firstValid < NUMBER_STEPS + horizon or not np.isfinite(tickerCloses[firstValid]):
+
+        return foldPredictions # return the fold without predictions
+
+    ##### train on the days before the fold #####
+
+    trainingCloses = tickerCloses[firstValid:foldStart] # only train on prices known before the fold starts
+    closeMin = trainingCloses.min() # find the minimum without looking into the fold
+    closeScale = 1 / ((trainingCloses.max() - closeMin) or 1) # find the scale, leaving flat prices unscaled
+
+    # create every window whose target is known before the fold starts
+    lastSequence, trainX, trainY = prepare_multi_horizon_data(
+        pd.DataFrame({'Close': (trainingCloses - closeMin) * closeScale}), [horizon]
+    )
+
+    model = create_trained_model(trainX, trainY) # train the fold's model from scratch
+
+    ##### predict every row of the fold #####
+
+    # create the window ending on every row of the fold
+    foldCloses = (tickerCloses[foldStart - NUMBER_STEPS + 1:foldStop] - closeMin) * closeScale
+    foldX = np.lib.stride_tricks.sliding_window_view(foldCloses, NUMBER_STEPS)[:, :, np.newaxis].astype(np.float32)
+
+    foldPredictions[:] = model.predict(foldX, verbose=0)[:, 0] / closeScale + closeMin # unscale the predictions
+
+    return foldPredictions # return the fold's predicted prices
+
+
+########## BACKTEST PREDICTIONS ##########
+
+# function to walk forward through the history of a predictions csv in foldCount consecutive test periods, scoring its
+# stored back fit predictions (or, when retrain is True, models retrained on every day before each fold in parallel),
+# saving every ticker and fold's statistics to csv
+def backtest_predictions(
+
+    predictionPath,
+    backtestOutput,
+    foldCount=BACKTEST_FOLDS,
+    horizon=BACKTEST_HORIZON,
+    retrain=False,
+    maxWorkers=TRAINING_WORKERS
+):
+
+    ##### set variables #####
+
+    tickerNames, tableDates, actualCloses, predictedCloses = read_prediction_table(predictionPath) # read csv
+
+    # test every row whose target is known, skipping the first rows that have no window to predict them
+    foldBounds = find_fold_bounds(NUMBER_STEPS - 1, len(tableDates) - horizon, foldCount + retrain)
+
+    ##### retrain every ticker and fold #####
+
+    if retrain: # if models should be retrained on expanding windows instead of replaying stored predictions...
+
+        foldBounds = foldBounds[1:] # keep the first period for training only, so the first fold has days to train on
+
+        foldJobs = [ # create one job per ticker and fold with the ticker's prices
+
+            {'closes': actualCloses[:, x], 'foldStart': y, 'foldStop': z, 'horizon': horizon}
+            for x in range(len(tickerNames)) for y, z in zip(foldBounds[:-1], foldBounds[1:])
+        ]
+
+        # print retraining statement
+        print(f"Retraining {len(tickerNames)} tickers over {foldCount} folds with {maxWorkers} workers...\n")
+
+        # retrain every ticker and fold in parallel, collecting predictions in job order
+        with start_worker_pool(min(maxWorkers, len(foldJobs))) as executor:
+
+            foldResults = list(executor.map(retrain_backtest_fold, foldJobs))
+
+        predictedCloses = np.full_like(actualCloses, np.nan) # create predictions of every row, nan outside folds
+
+        # loop through every fold's predictions (jobs are ordered ticker by ticker)
+        for jobIndex, (foldJob, foldPredictions) in enumerate(zip(foldJobs, foldResults)):
+
+            # fill the ticker's rows of the fold
+            predictedCloses[foldJob['foldStart']:foldJob['foldStop'], jobIndex // foldCount] = foldPredictions
+
+    ##### score every ticker and fold #####
+
+    print(f"Scoring {len(tickerNames)} tickers over {foldCount} folds...\n") # print scoring statement
+
+    foldStatistics = score_backtest_folds(actualCloses, predictedCloses, horizon, foldBounds) # score every fold
+
+    backtestResults = pd.DataFrame({ # create one row per fold and ticker, fold by fold
+
+        'Ticker': np.tile(tickerNames, foldCount),
+        'Fold': np.repeat(np.arange(foldCount), len(tickerNames)),
+        'Start': np.repeat(tableDates[foldBounds[:-1]], len(tickerNames)),
+        'End': np.repeat(tableDates[foldBounds[1:] - 1], len(tickerNames)),
+        **{x: foldStatistics[x].ravel() for x in backtestStatistics}
+    })
+
+    backtestResults.to_csv(backtestOutput, index=False) # save every fold's results to csv
+
+    # print backtest statement with the average of every ticker's folds
+    print(f"Backtest MAPE {np.nanmean(foldStatistics['MAPE']):.2f}%, hit rate "
+          f"{np.nanmean(foldStatistics['Hit Rate']):.2f}% over {foldCount} folds.\n")
+
+    return backtestResults # return every fold's results
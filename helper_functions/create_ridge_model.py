@@ -0,0 +1,103 @@
+##################################################################################
+# Copyright (c) 2025 Matthew Thomas Beck                                         #
+#                                                                                #
+# Licensed under the Creative Commons Attribution-NonCommercial 4.0              #
+# International (CC BY-NC 4.0). Personal and educational use is permitted.       #
+# Commercial use by companies or for-profit entities is prohibited.              #
+##################################################################################
+
+
+
+
+
+############################################################
+############### IMPORT / CREATE DEPENDENCIES ###############
+############################################################
+
+
+########## IMPORT DEPENDENCIES ##########
+
+##### machine learning functions #####
+
+from helper_functions.create_tensorflow_model import NUMBER_STEPS # number of days in every window
+
+# used to save every fitted model in the format the numpy runtime predicts with
+from helper_functions.run_numpy_model import save_model_weights
+
+##### data modeling libraries #####
+
+import numpy as np # used to fit every model with one batched least squares solve
+
+
+########## CREATE DEPENDENCIES ##########
+
+##### ridge constants #####
+
+RIDGE_PENALTY = 0.1 # amount added to the diagonal of every model's normal equations (the bias is not penalized)
+RIDGE_BATCH_MODELS = 256 # number of models whose padded windows are held in memory at once
+
+RIDGE_ARCHITECTURE = f'ridge-steps{NUMBER_STEPS}-penalty{RIDGE_PENALTY}' # what every ridge model is built with
+
+
+
+
+
+###############################################
+############### RIDGE FUNCTIONS ###############
+###############################################
+
+
+########## PAD MODEL WINDOWS ##########
+
+def pad_model_windows(trainArrays): # function to stack every model's windows into one zero padded array
+
+    # create one (windows, values) array per model, so both trainX and trainY are flat rows
+    flatArrays = [np.asarray(x, dtype=np.float64).reshape(len(x), -1) for x in trainArrays]
+
+    # create an array of zeros as long as the model with the most windows (zero rows add nothing to the solve)
+    paddedArrays = np.zeros((len(flatArrays), max(len(x) for x in flatArrays), flatArrays[0].shape[1]))
+
+    for modelIndex, flatArray in enumerate(flatArrays): # loop through every model
+
+        paddedArrays[modelIndex, :len(flatArray)] = flatArray # fill the model's windows
+
+    return paddedArrays # return windows shaped (models, windows, values)
+
+
+########## CREATE RIDGE MODELS ##########
+
+# function to fit one ridge regression per model on the same windows the LSTM trains on, solving every model's normal
+# equations in one batched call, returning a (kernel, bias) pair per model in order
+def create_ridge_models(trainXs, trainYs, ridgePenalty=RIDGE_PENALTY):
+
+    ##### create normal equations #####
+
+    modelInputs = pad_model_windows(trainXs) # stack every model's windows
+    modelTargets = pad_model_windows(trainYs) # stack every model's targets
+
+    # add a bias column that is 1 on every real window and 0 on padding
+    windowCounts = np.array([len(x) for x in trainXs]) # find the number of windows of every model
+    biasColumn = np.arange(modelInputs.shape[1])[np.newaxis, :, np.newaxis] < windowCounts[:, np.newaxis, np.newaxis]
+    modelInputs = np.concatenate([modelInputs, biasColumn], axis=2)
+
+    inputsTransposed = modelInputs.transpose(0, 2, 1) # turn every model's windows into columns
+    gramMatrices = inputsTransposed @ modelInputs # find every model's inputs times themselves at once
+    crossProducts = inputsTransposed @ modelTargets # find every model's inputs times its targets at once
+
+    ##### solve every model at once #####
+
+    penaltyDiagonal = np.full(modelInputs.shape[2], ridgePenalty) # penalize every window weight...
+    penaltyDiagonal[-1] = 0 # ...but not the bias
+
+    # solve every model's penalized normal equations in one batched call
+    modelWeights = np.linalg.solve(gramMatrices + np.diag(penaltyDiagonal), crossProducts)
+
+    return [(x[:-1], x[-1]) for x in modelWeights.astype(np.float32)] # return every model's kernel and bias
+
+
+########## SAVE RIDGE MODEL ##########
+
+def save_ridge_model(modelPath, kernel, bias): # function to save a ridge model as a flatten and a dense layer
+
+    # save the model like an exported keras model, so predictions run through the same numpy runtime
+    save_model_weights(modelPath, ['Flatten', 'Dense'], {'1-0': kernel, '1-1': bias})
@@ -19,14 +19,24 @@
 
 ##### data modeling libraries #####
 
-from sklearn.preprocessing import MinMaxScaler # used to normalize data in between 0 and 1
 import numpy as np # import numpy for data modeling
-from collections import deque # used to store sequences in deque
 
-##### machine learning libraries #####
+##### machine learning functions #####
 
-from keras.models import Sequential # used to create an easy-to-make model with layers
-from keras.layers import Dense, LSTM, Dropout # used to make different layer types to go with sequential
+# used to export trained models and predict with them without importing tensorflow
+from helper_functions.run_numpy_model import export_model_weights
+from helper_functions.run_numpy_model import load_model_weights
+from helper_functions.run_numpy_model import find_weights_path
+from helper_functions.run_numpy_model import run_numpy_model
+from helper_functions.run_numpy_model import find_model_architecture
+from helper_functions.run_numpy_model import stack_model_layers
+from helper_functions.run_numpy_model import stack_model_inputs
+
+##### miscellaneous libraries #####
+
+import json # used to save scaling parameters next to a model
+import time # used to stop training once a model's time limit is used up
+import os # used to find the scaling file of a model
 
 
 ########## CREATE DEPENDENCIES ##########
@@ -36,7 +46,75 @@ from keras.layers import Dense, LSTM, Dropout # used to make different layer typ
 NUMBER_STEPS = 7 # set size of sequence to 1 week
 BATCH_SIZE = 8 # set number of training instances to 8
 EPOCHS = 80 # set number of data passes through machine learning algorithm to 80
-scaler = MinMaxScaler() # set scaler for normalizing data
+FINE_TUNE_EPOCHS = 5 # set number of data passes when warm-starting from a previously trained model
+LAYER_SIZES = (60, 120, 20) # set number of neurons of the first LSTM, second LSTM and dense layers
+DROPOUT_RATE = 0.3 # set share of neurons turned off after every LSTM layer while training
+VALIDATION_FRACTION = 0.1 # set share of latest windows held out to decide when training stops improving
+EARLY_STOPPING_PATIENCE = 5 # set number of epochs without a better validation loss before training stops
+PREDICTION_BATCH_ROWS = 32768 # set number of padded windows predicted by one stacked forward pass
+
+# name of the layers and training settings above (change it whenever create_trained_model changes so old models
+# are never reused)
+MODEL_ARCHITECTURE = (
+    f'lstm{LAYER_SIZES[0]}-dropout{DROPOUT_RATE}-lstm{LAYER_SIZES[1]}-dropout{DROPOUT_RATE}-dense{LAYER_SIZES[2]}'
+    f'-steps{NUMBER_STEPS}-batch{BATCH_SIZE}-validation{VALIDATION_FRACTION}-patience{EARLY_STOPPING_PATIENCE}'
+)
+
+
+
+
+
+#################################################
+############### SCALING FUNCTIONS ###############
+#################################################
+
+
+########## FIT MIN MAX SCALING ##########
+
+def fit_min_max_scaling(pricePanel): # function to find every column's minimum and scale to normalize it between 0 and 1
+
+    columnMins = pricePanel.min() # find every column's minimum at once, skipping missing days
+    columnRanges = pricePanel.max() - columnMins # find every column's range at once
+
+    # divide by the range, leaving flat columns unscaled (like MinMaxScaler)
+    columnScales = 1 / columnRanges.where(columnRanges != 0, 1)
+
+    return columnMins, columnScales # return per-column minimums and scales labeled by column
+
+
+########## APPLY SCALING ##########
+
+def apply_scaling(prices, columnMins, columnScales): # function to normalize prices between 0 and 1
+
+    return (prices - columnMins) * columnScales # return prices shifted and scaled column by column
+
+
+########## INVERT SCALING ##########
+
+def invert_scaling(scaledPrices, columnMins, columnScales): # function to turn normalized prices back into prices
+
+    return scaledPrices / columnScales + columnMins # return prices unscaled and shifted column by column
+
+
+########## SAVE MODEL SCALING ##########
+
+def save_model_scaling(modelPath, columnMin, columnScale): # function to save a model's scaling next to the model
+
+    # write the scaling to a file named after the model so any process can unscale the model's predictions
+    with open(os.path.splitext(modelPath)[0] + '-scaling.json', 'w') as scalingFile:
+
+        json.dump({'min': float(columnMin), 'scale': float(columnScale)}, scalingFile) # save minimum and scale
+
+
+########## LOAD MODEL SCALING ##########
+
+def load_model_scaling(modelPath): # function to load the scaling saved next to a model
+
+    with open(os.path.splitext(modelPath)[0] + '-scaling.json', 'r') as scalingFile: # open the model's scaling
+
+        modelScaling = json.load(scalingFile) # load minimum and scale
+
+    return modelScaling['min'], modelScaling['scale'] # return minimum and scale
 
 
 
@@ -65,31 +143,26 @@ def prepare_financial_data(financialInstrumentData, days): # function to take da
     # remove all days rows with missing values whilst returning the same dataframe
     prepFinancialInstrumentData.dropna(inplace=True)
 
-    sequenceData = [] # declare an empty array to store sequences for model training
+    # take the close and date columns in the stock data as one array
+    sequenceValues = prepFinancialInstrumentData[['Close'] + ['Date']].values
 
-    sequences = deque(maxlen=NUMBER_STEPS) # create a deque of length n steps (1 week) to store sequences
+    if len(sequenceValues) >= NUMBER_STEPS: # if there is at least one full n steps (1 week) sequence...
 
-    for entry, target in zip( # loop through all datapoints in close and future columns at the same type with zip
+        # cut every n steps sequence straight from the array as a view instead of appending them to lists one by
+        # one, shaped (sequences, steps, columns)
+        x = np.lib.stride_tricks.sliding_window_view(sequenceValues, NUMBER_STEPS, axis=0).transpose(0, 2, 1)
 
-        # loop through the close and date columns in the stock data
-        prepFinancialInstrumentData[['Close'] + ['Date']].values, prepFinancialInstrumentData['Future'].values
-    ):
+    else: # if there is not enough data for a single sequence...
 
-        sequences.append(entry) # add entry to the deque
+        x = np.empty((0, NUMBER_STEPS, sequenceValues.shape[1])) # leave no sequence
 
-        if len(sequences) == NUMBER_STEPS: # if the length of sequence is equal to number of steps...
-
-            # add sequence and target value to sequence grouping for machine learning
-            sequenceData.append([np.array(sequences), target])
+    # take the target value of every sequence, which is the future value of its last day
+    y = prepFinancialInstrumentData['Future'].values[NUMBER_STEPS - 1:]
 
     ##### create last sequence #####
 
-    modifiedLastSequence = [] # create an empty list to store list of lists storing close column values
-
-    for s in sequences: # loop through sequences to extract closing values
-
-        # take the first value in the size 1 sequence (equivalent to s[0]) and store it in modified last sequence list
-        modifiedLastSequence.append(s[:len(['Close'])])
+    # take the first value of each of the last n steps (or fewer) entries as the start of the last sequence
+    modifiedLastSequence = list(sequenceValues[-NUMBER_STEPS:, :len(['Close'])])
 
     # combine modified list and original last sequence list of 32-bit floats
     lastSequence = list(modifiedLastSequence) + list(lastSequence)
@@ -97,26 +170,73 @@ def prepare_financial_data(financialInstrumentData, days): # function to take da
     # convert last sequence into an array of 32-bit floats to lower numerical precision for faster computation
     lastSequence = np.array(lastSequence).astype(np.float32)
 
-    ##### create lists of testing variables #####
+    return prepFinancialInstrumentData, lastSequence, x, y # return prepared data to be inserted into tensorflow
 
-    x, y = [], [] # create 2 lists x and y to store input variables and target variables
 
-    for sequence, target in sequenceData: # loop through the length of sequence data to fill x and y lists
+########## PREP MULTI HORIZON DATA ##########
 
-        x.append(sequence) # store the input variables in sequence data as x to use as a basis for the model
+# function to take data and make it tensorflow-friendly for one model predicting every future step at once from
+# windows of numberSteps days
+def prepare_multi_horizon_data(financialInstrumentData, futureSteps, numberSteps=NUMBER_STEPS):
 
-        y.append(target) # store the testing variables to use as testing material
+    ##### create sequences #####
 
-    x = np.array(x) # convert sequence list into array for easier processing
+    closes = financialInstrumentData['Close'].to_numpy(dtype=np.float32) # take the close column as an array
 
-    y = np.array(y) # convert target list into array for easier processing
+    # only keep windows whose every future step is known, so the windows match the furthest step's prepared data
+    windowCount = len(closes) - max(futureSteps) - numberSteps + 1
 
-    return prepFinancialInstrumentData, lastSequence, x, y # return prepared data to be inserted into tensorflow
+    if windowCount < 1: # if there is not enough data for a single window...
+
+        raise ValueError(f"Need more than {numberSteps + max(futureSteps) - 1} days of data to create sequences.")
+
+    # create every window of numberSteps closing prices at once, shaped (windows, numberSteps, 1) like trainX
+    x = np.lib.stride_tricks.sliding_window_view(closes, numberSteps)[:windowCount, :, np.newaxis]
+
+    # find the target of every future step for every window, one column per step
+    y = np.stack([closes[numberSteps - 1 + step:][:windowCount] for step in futureSteps], axis=1)
+
+    ##### create last sequence #####
+
+    # take the most recent numberSteps closing prices to predict the upcoming days
+    lastSequence = closes[-numberSteps:].reshape(1, numberSteps, 1)
+
+    # return prepared data to be inserted into tensorflow, keeping windows as a view of the prices instead of a copy
+    return lastSequence, x.astype(np.float32, copy=False), y
 
 
 ########## CREATE MACHINE LEARNING MODEL ##########
 
-def create_trained_model(trainX, trainY): # function to create a trained machine learning model
+# function to create a trained machine learning model (fine-tuning the model at initialModelPath when given) with
+# layerSizes neurons in its LSTM, LSTM and dense layers, training for at most epochs passes or timeLimit seconds
+def create_trained_model(
+    trainX,
+    trainY,
+    initialModelPath=None,
+    epochs=EPOCHS,
+    layerSizes=LAYER_SIZES,
+    batchSize=BATCH_SIZE,
+    validationFraction=VALIDATION_FRACTION,
+    timeLimit=None
+):
+
+    # import keras only when training, so runs that only predict never load tensorflow
+    from keras.models import Sequential # used to create an easy-to-make model with layers
+    from keras.models import load_model # used to warm-start training from a previously trained model
+    from keras.layers import Dense, LSTM, Dropout # used to make different layer types to go with sequential
+
+    ##### warm-start model #####
+
+    if initialModelPath is not None: # if a model trained on older data should be fine-tuned...
+
+        print("Fine-tuning model...\n") # print fine-tuning model update
+
+        model = load_model(initialModelPath) # load previous weights, layers and optimizer state
+
+        # take input data and continue training for a few passes so the model learns the newest days
+        fit_model(model, trainX, trainY, epochs, batchSize, validationFraction, timeLimit)
+
+        return model # return fine-tuned model
 
     ##### create model layers #####
 
@@ -125,28 +245,260 @@ def create_trained_model(trainX, trainY): # function to create a trained machine
     model = Sequential() # create an instance of sequential to add layers to
 
     # add long short term memory layer to sequential model of 60 neurons in the shape of len close column and
-    # NUMBER_STEPS time steps and then return an output for each input to stack next LSTM layer
-    model.add(LSTM(60, return_sequences=True, input_shape=(NUMBER_STEPS, len(['Close']))))
+    # trainX's time steps and then return an output for each input to stack next LSTM layer
+    model.add(LSTM(layerSizes[0], return_sequences=True, input_shape=(trainX.shape[1], len(['Close']))))
 
     # add a dropout layer to sequential model to prevent over fitting by setting 30% (0.3) of neuron input units to 0
     # during each update during training (prevents line from hugging literally every point of data, allowing for
     # generalization)
-    model.add(Dropout(0.3))
+    model.add(Dropout(DROPOUT_RATE))
 
     # add another LSTM layer to 120 neurons but do not return the full sequence of neurons
-    model.add(LSTM(120, return_sequences=False))
+    model.add(LSTM(layerSizes[1], return_sequences=False))
 
-    model.add(Dropout(0.3)) # add another dropout layer to turn off 30% of neurons for better linear generalization
+    model.add(Dropout(DROPOUT_RATE)) # add another dropout layer to turn off 30% of neurons for better generalization
 
-    model.add(Dense(20)) # add a dense layer of 20 neurons to connect the neurons in the LSTM layers 1 and 3
+    model.add(Dense(layerSizes[2])) # add a dense layer of 20 neurons to connect the neurons in the LSTM layers 1 and 3
 
-    model.add(Dense(1)) # add a dense layer of 1 neuron to predict a continuous price value
+    # add a dense layer of 1 neuron per predicted day (trainY holds one column per future step in multi-horizon mode)
+    model.add(Dense(1 if trainY.ndim == 1 else trainY.shape[1]))
 
     # compile sequential model with adam optimizer and mean squared error loss for regression
     model.compile(loss='mean_squared_error', optimizer='adam')
 
-    # take input data and train model with BATCH_SIZE samples and EPOCHS times, trying to map input data trainX to
-    # target data trainY with minimal progress reports
-    model.fit(trainX, trainY, batch_size=BATCH_SIZE, epochs=EPOCHS, verbose=0)
+    # take input data and train model with batchSize samples for up to epochs times, trying to map input data trainX
+    # to target data trainY with minimal progress reports
+    fit_model(model, trainX, trainY, epochs, batchSize, validationFraction, timeLimit)
 
     return model # return trained model
+
+
+########## FIND WINDOW SERIES ##########
+
+# function to find the prices a model's windows were cut from when every window is the one before it moved a day
+# forward, so training can window the prices itself instead of holding every window (None when they are not, or when
+# compareWindows is False and the windows are not a view of the prices)
+def find_window_series(trainX, compareWindows=True):
+
+    # a view whose windows start a day apart in memory is known to overlap without comparing a single window
+    isWindowView = trainX.ndim == 3 and trainX.strides[0] == trainX.strides[1]
+
+    if len(trainX) > 1 and not isWindowView: # if windows have to be compared to know whether they overlap...
+
+        if not compareWindows or not np.array_equal(trainX[1:, :-1], trainX[:-1, 1:]): # if they do not overlap...
+
+            return None # return None since the windows come from different series, such as a sweep's tickers
+
+    # return the first window followed by the last day of every other window, shaped (days, features)
+    return np.concatenate([trainX[0], trainX[1:, -1]]).astype(np.float32)
+
+
+########## CUT WINDOW VIEW ##########
+
+def cut_window_view(windowSeries, windowCount): # function to cut windowCount windows from prices without copying them
+
+    stepCount = len(windowSeries) - windowCount + 1 # find the number of days in every window
+
+    # return every window as a view of the prices, shaped (windows, days, features) like trainX
+    return np.lib.stride_tricks.sliding_window_view(windowSeries, stepCount, axis=0).transpose(0, 2, 1)
+
+
+########## CREATE WINDOW DATASET ##########
+
+# function to create a tf.data pipeline of the windows from windowStart to windowStop that gathers every batch's
+# windows from windowSeries (or from trainX when windowSeries is None) while the model trains on the batch before it
+def create_window_dataset(windowSeries, trainX, trainY, windowStart, windowStop, batchSize, shuffleWindows=True):
+
+    import tensorflow as tf # import tensorflow only when training, so runs that only predict never load it
+
+    ##### set variables #####
+
+    stepCount = trainX.shape[1] # number of days in every window
+    targetValues = tf.constant(np.asarray(trainY, dtype=np.float32)) # hold every target once
+
+    if windowSeries is None: # if the windows are not cut from one series...
+
+        windowValues = tf.constant(np.asarray(trainX, dtype=np.float32)) # hold every window once
+
+        gather_windows = lambda windowIndexes: tf.gather(windowValues, windowIndexes) # take the batch's windows
+
+    else: # if the windows are cut from one series...
+
+        seriesValues = tf.constant(windowSeries) # hold every price once instead of every window
+        windowOffsets = tf.range(stepCount, dtype=tf.int64) # find the offset of every day of a window
+
+        # cut the batch's windows from the prices, shaped (windows, days, features) like trainX
+        gather_windows = lambda windowIndexes: tf.gather(seriesValues, windowIndexes[:, tf.newaxis] + windowOffsets)
+
+    ##### create pipeline #####
+
+    windowIndexes = tf.data.Dataset.range(windowStart, windowStop) # list the first day of every window
+
+    if shuffleWindows: # if windows should be seen in a new order every epoch like fitting on arrays...
+
+        # shuffle only the window indexes, which take 8 bytes per window
+        windowIndexes = windowIndexes.shuffle(windowStop - windowStart, reshuffle_each_iteration=True)
+
+    return windowIndexes.batch(batchSize).map( # gather every batch's windows and targets on parallel threads
+
+        lambda x: (gather_windows(x), tf.gather(targetValues, x)),
+        num_parallel_calls=tf.data.AUTOTUNE
+
+    ).prefetch(tf.data.AUTOTUNE) # prepare the next batches while the model trains
+
+
+########## FIT MODEL ##########
+
+# function to train a model until its held out tail stops improving, epochs passes are done or timeLimit seconds are
+# used up (validationFraction of 0 trains for every pass on every window)
+def fit_model(model, trainX, trainY, epochs, batchSize, validationFraction=VALIDATION_FRACTION, timeLimit=None):
+
+    # import keras only when training, so runs that only predict never load tensorflow
+    from keras.callbacks import EarlyStopping # used to stop training once the validation loss stops improving
+    from keras.callbacks import LambdaCallback # used to stop training once the time limit is used up
+
+    ##### set variables #####
+
+    trainingStart = time.perf_counter() # start timing the model's training
+    trainingCallbacks = [] # create an empty list of callbacks run after every epoch
+
+    if timeLimit is not None: # if the model only has some of the training budget...
+
+        trainingCallbacks.append(LambdaCallback( # stop after the epoch that uses up the time limit (never resume)
+
+            on_epoch_end=lambda epoch, logs: (
+                time.perf_counter() - trainingStart >= timeLimit and setattr(model, 'stop_training', True)
+            )
+        ))
+
+    windowSeries = find_window_series(trainX) # find the prices the windows were cut from
+    windowCount = len(trainX) # number of windows of the model
+    validationCount = int(windowCount * validationFraction) # number of latest windows to hold out
+
+    ##### train without validation #####
+
+    if validationCount < 1 or validationCount >= windowCount: # if there is no tail to hold out...
+
+        trainingHistory = model.fit( # train on every window
+
+            create_window_dataset(windowSeries, trainX, trainY, 0, windowCount, batchSize),
+            epochs=epochs,
+            verbose=0,
+            callbacks=trainingCallbacks
+        )
+
+        # print training update
+        print(f"Trained for {len(trainingHistory.history['loss'])} of {epochs} epochs without validation.\n")
+
+        return # return since the model is trained
+
+    ##### train with validation #####
+
+    # stop once the held out tail has not improved for EARLY_STOPPING_PATIENCE epochs, keeping the best weights
+    trainingCallbacks.append(EarlyStopping(
+
+        monitor='val_loss', patience=EARLY_STOPPING_PATIENCE, restore_best_weights=True
+    ))
+
+    splitIndex = windowCount - validationCount # find the first held out window
+
+    trainingHistory = model.fit( # train on older windows, validating on the latest ones
+
+        create_window_dataset(windowSeries, trainX, trainY, 0, splitIndex, batchSize),
+
+        # cache the held out batches, since they are the same every epoch and only a small share of the windows
+        validation_data=create_window_dataset(
+            windowSeries, trainX, trainY, splitIndex, windowCount, batchSize, shuffleWindows=False
+        ).cache(),
+        epochs=epochs,
+        verbose=0,
+        callbacks=trainingCallbacks
+    )
+
+    # take one more pass over every window so the model still learns the latest days it was validated on
+    model.fit(create_window_dataset(windowSeries, trainX, trainY, 0, windowCount, batchSize), epochs=1, verbose=0)
+
+    # print training update
+    print(f"Trained for {len(trainingHistory.history['loss'])} of {epochs} epochs "
+          f"(best validation loss {min(trainingHistory.history['val_loss']):.6f}).\n")
+
+
+########## PREDICT GROUPED ##########
+
+# function to answer every (model path, inputs) request with as few numpy forward passes as possible, stacking the
+# inputs of every request that shares a model into one batch and the weights of every model that shares an
+# architecture into one stacked model, returning each request's outputs in request order
+def predict_grouped(predictionRequests):
+
+    ##### group requests by model #####
+
+    requestGroups = {} # dictionary to map model path with the requests that use it
+
+    for requestIndex, (modelPath, modelInputs) in enumerate(predictionRequests): # loop through every request
+
+        requestGroups.setdefault(modelPath, []).append(requestIndex) # add request to its model's group
+
+    ##### group models by architecture #####
+
+    architectureGroups = {} # dictionary to map architecture with the (requests, layers, inputs) of its models
+
+    for modelPath, requestIndexes in requestGroups.items(): # loop through every model
+
+        if not os.path.exists(find_weights_path(modelPath)): # if the model was saved before weights were exported...
+
+            from keras.models import load_model # import keras only for models that were never exported
+
+            export_model_weights(load_model(modelPath), modelPath) # export the model's weights once
+
+        modelLayers = load_model_weights(modelPath) # load the model's exported weights
+
+        # stack the inputs of every request using the model into one batch
+        batchInputs = np.concatenate([predictionRequests[x][1] for x in requestIndexes]).astype(np.float32)
+
+        architectureGroups.setdefault( # add the model to every other model with the same layers and window shape
+
+            find_model_architecture(modelLayers, batchInputs.shape[1:]), []
+
+        ).append((requestIndexes, modelLayers, batchInputs))
+
+    ##### predict every architecture at once #####
+
+    predictionResults = [None] * len(predictionRequests) # create a list to store each request's outputs in order
+
+    for architectureModels in architectureGroups.values(): # loop through every architecture
+
+        architectureModels.sort(key=lambda x: len(x[2])) # put models with similar batch sizes next to each other
+
+        modelBatches = [[]] # create a list of model batches, each small enough to predict at once
+
+        for architectureModel in architectureModels: # loop through every model, smallest batch first
+
+            # if padding every model of the batch to this model's rows would exceed the row budget...
+            if modelBatches[-1] and (len(modelBatches[-1]) + 1) * len(architectureModel[2]) > PREDICTION_BATCH_ROWS:
+
+                modelBatches.append([]) # start a new batch of models
+
+            modelBatches[-1].append(architectureModel) # add the model to the batch
+
+        for modelBatch in modelBatches: # loop through every batch of models
+
+            # predict every model of the batch in one forward pass of the stacked weights instead of one per model
+            batchOutputs = run_numpy_model(
+
+                stack_model_layers([x[1] for x in modelBatch]),
+                stack_model_inputs([x[2] for x in modelBatch])
+            )
+
+            for (requestIndexes, modelLayers, batchInputs), modelOutputs in zip(modelBatch, batchOutputs):
+
+                # find where every request's rows end in the model's batch
+                splitPoints = np.cumsum([len(predictionRequests[x][1]) for x in requestIndexes])[:-1]
+
+                # scatter the model's outputs, without its padding, back to the requests
+                for requestIndex, requestOutputs in zip(
+                    requestIndexes, np.split(modelOutputs[:len(batchInputs)], splitPoints)
+                ):
+
+                    predictionResults[requestIndex] = requestOutputs # store the request's outputs
+
+    return predictionResults # return outputs in request order
@@ -0,0 +1,216 @@
+##################################################################################
+# Copyright (c) 2025 Matthew Thomas Beck                                         #
+#                                                                                #
+# Licensed under the Creative Commons Attribution-NonCommercial 4.0              #
+# International (CC BY-NC 4.0). Personal and educational use is permitted.       #
+# Commercial use by companies or for-profit entities is prohibited.              #
+##################################################################################
+
+
+
+
+
+############################################################
+############### IMPORT / CREATE DEPENDENCIES ###############
+############################################################
+
+
+########## IMPORT DEPENDENCIES ##########
+
+##### data collection libraries #####
+
+import requests # used to make pooled HTTP requests
+from requests.adapters import HTTPAdapter # used to size each provider's connection pool
+
+##### concurrency libraries #####
+
+from concurrent.futures import ThreadPoolExecutor, as_completed # used to run a bounded pool of fetch workers
+import threading # used to guard shared limiter and session state
+
+##### miscellaneous libraries #####
+
+import time # used to refill token buckets and wait for tokens
+from datetime import datetime, timedelta # used to widen request windows by a warm-up lookback
+
+
+########## CREATE DEPENDENCIES ##########
+
+##### fetch constants #####
+
+FETCH_WORKERS = 4 # number of fetch workers running at once
+REQUEST_TIMEOUT = 10 # number of seconds a single request may take
+WARMUP_DAYS = 7 # number of days requested before a window's start date
+
+##### provider variables #####
+
+providerURLs = { # dictionary to map provider with its base url (point at a local stub server to measure offline)
+
+    'alpha_vantage': 'https://www.alphavantage.co/query',
+    'stub': 'http://127.0.0.1:8000'
+}
+
+providerLimits = { # dictionary to map provider with its token bucket (tokens refilled per second, bucket size)
+
+    'alpha_vantage': {'rate': 5 / 60, 'capacity': 5}, # free tier allows 5 requests per minute
+    'yfinance': {'rate': 20, 'capacity': 100}, # one token per ticker requested
+    'fixture': {'rate': float('inf'), 'capacity': float('inf')}, # local files are never limited
+    'stub': {'rate': float('inf'), 'capacity': float('inf')} # local stub server is never limited
+}
+
+##### shared state #####
+
+tokenBuckets = {} # dictionary to map provider with its current tokens and last refill time
+providerSessions = {} # dictionary to map provider with its pooled requests session
+fetchLock = threading.Lock() # lock guarding token buckets and sessions across workers
+
+
+
+
+
+###################################################
+############### RATE LIMIT FUNCTIONS ##############
+###################################################
+
+
+########## ACQUIRE TOKENS ##########
+
+def acquire_tokens(provider, tokenCount=1): # function to wait until a provider's token bucket allows a request
+
+    limit = providerLimits.get(provider, {'rate': float('inf'), 'capacity': float('inf')}) # unknown = unlimited
+
+    if limit['rate'] == float('inf'): # if provider is never limited...
+
+        return # return without waiting
+
+    while True: # keep waiting until enough tokens are available
+
+        with fetchLock: # only one worker may touch the bucket at a time
+
+            ##### refill bucket #####
+
+            now = time.monotonic() # get current time
+
+            # start a new provider with a full bucket
+            bucket = tokenBuckets.setdefault(provider, {'tokens': limit['capacity'], 'updated': now})
+
+            # add the tokens earned since the last refill without overflowing the bucket
+            bucket['tokens'] = min(limit['capacity'], bucket['tokens'] + (now - bucket['updated']) * limit['rate'])
+            bucket['updated'] = now
+
+            ##### take tokens #####
+
+            # a request larger than the bucket waits for a full bucket and then runs into debt
+            if bucket['tokens'] >= min(tokenCount, limit['capacity']):
+
+                bucket['tokens'] -= tokenCount # take the tokens
+
+                return # return to make the request
+
+            # find how long until enough tokens have been earned
+            waitTime = (min(tokenCount, limit['capacity']) - bucket['tokens']) / limit['rate']
+
+        time.sleep(waitTime) # wait outside the lock so other workers can check their own buckets
+
+
+########## GET PROVIDER SESSION ##########
+
+def get_provider_session(provider): # function to get a provider's pooled requests session
+
+    with fetchLock: # only one worker may create a session
+
+        if provider not in providerSessions: # if provider has no session yet...
+
+            session = requests.Session() # create a session that keeps connections open between requests
+
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=FETCH_WORKERS) # one pooled connection per worker
+            session.mount('http://', adapter) # pool http connections
+            session.mount('https://', adapter) # pool https connections
+
+            providerSessions[provider] = session # store the session
+
+        return providerSessions[provider] # return the provider's session
+
+
+
+
+
+##############################################
+############### FETCH FUNCTIONS ##############
+##############################################
+
+
+########## FIND FETCH WINDOW ##########
+
+# function to turn an inclusive [startDate, endDate] window into the [start, end) dates to request from a provider
+def find_fetch_window(startDate, endDate, warmupDays=WARMUP_DAYS):
+
+    windowStart, windowEnd = None, None # a missing date leaves that side of the window open
+
+    if startDate is not None: # if window has a start date...
+
+        # request the warm-up days before the start date as well
+        windowStart = str((datetime.strptime(startDate, '%Y-%m-%d') - timedelta(days=warmupDays)).date())
+
+    if endDate is not None: # if window has an end date...
+
+        # request through the end date itself, since providers treat the end date as exclusive
+        windowEnd = str((datetime.strptime(endDate, '%Y-%m-%d') + timedelta(days=1)).date())
+
+    return windowStart, windowEnd # return dates to request
+
+
+########## FETCH URL ##########
+
+# function to make one rate-limited request through a provider's pooled session
+def fetch_url(provider, params=None, path='', headers=None, timeout=REQUEST_TIMEOUT):
+
+    acquire_tokens(provider) # wait for the provider's rate limit
+
+    return get_provider_session(provider).get( # request the provider's url with a per-request timeout
+
+        providerURLs[provider] + path,
+        params=params,
+        headers=headers,
+        timeout=timeout
+    )
+
+
+########## FETCH CONCURRENTLY ##########
+
+# function to run fetchFunction on every job with a bounded pool of workers and a per-provider rate limit
+def fetch_concurrently(provider, fetchFunction, jobs, tokenCounts=None, maxWorkers=FETCH_WORKERS):
+
+    ##### set variables #####
+
+    if tokenCounts is None: # if every job costs a single request...
+
+        tokenCounts = [1] * len(jobs) # charge one token per job
+
+    fetchResults = [None] * len(jobs) # create a list to store each job's result (or error) in job order
+
+    ##### define worker #####
+
+    def run_job(jobIndex): # function to run one job once the provider allows it
+
+        acquire_tokens(provider, tokenCounts[jobIndex]) # wait for the provider's rate limit
+
+        return fetchFunction(jobs[jobIndex]) # run the job
+
+    ##### run jobs #####
+
+    with ThreadPoolExecutor(max_workers=max(1, maxWorkers)) as executor: # create a bounded pool of workers
+
+        # submit every job and remember its position
+        futures = {executor.submit(run_job, jobIndex): jobIndex for jobIndex in range(len(jobs))}
+
+        for future in as_completed(futures): # loop through jobs as they finish
+
+            try: # attempt to collect the job's result...
+
+                fetchResults[futures[future]] = future.result() # store the result in job order
+
+            except Exception as e: # if the job failed...
+
+                fetchResults[futures[future]] = e # store the error so the caller can decide what to do
+
+    return fetchResults # return results in job order
@@ -20,11 +20,17 @@
 ##### data collection functions #####
 
 from financial_instruments.stocks.model_stock_data import create_stocks_model
+from financial_instruments.stocks.model_stock_data import sweep_stocks_model
+from financial_instruments.stocks.model_stock_data import backtest_stocks_model
 
 # used to handle stock data
 from financial_instruments.stocks.collect_stock_data import find_volatile_stocks
 from financial_instruments.stocks.collect_stock_data import retry_failed_downloads
 
+# used to split stock screening and modeling across worker processes
+from financial_instruments.stocks.run_stock_shards import run_stock_shards
+from financial_instruments.stocks.shard_stock_data import SHARD_COUNT
+
 # used to handle agriculture data
 from financial_instruments.agriculture.scrape_agriculture_names_cme import \
     find_cme_agriculture_names
@@ -73,7 +79,10 @@ def handle_stocks( # function to neatly handle stock values
     updateVolatileStocks,
     machineLearnStocks,
     createNewPlot,
-    updateFailedDownloads
+    updateFailedDownloads,
+    shardCount=SHARD_COUNT,
+    sweepStocksModel=False,
+    backtestStocksModel=False
 ):
 
     ##### preset dependencies #####
@@ -83,6 +92,27 @@ def handle_stocks( # function to neatly handle stock values
     #customTickers = ['SQ']
     start = time.time() # start loop timer
 
+    ##### run stocks as shards #####
+
+    if (shardCount > 1): # if user wants to split the stock universe across worker processes...
+
+        try: # try to screen and model every shard...
+
+            # call runStockShards to screen and model each shard in its own process and merge their results
+            shardResult = run_stock_shards(
+                alphaVantageKey, startDate, endDate, updateVolatileStocks, machineLearnStocks, customTickers, shardCount
+            )
+
+            if shardResult == 0: # if a shard or merge failed...
+
+                print("Error: runStockShards returned with 0.\n") # print error statement
+
+        except Exception as e: # if unable to run shards...
+
+            print(f'Error running stock shards: "{e}"\n') # print failure error with exception
+
+        updateVolatileStocks, machineLearnStocks = False, False # shards already screened and modeled
+
     ##### find volatile stocks #####
 
     if (updateVolatileStocks == True): # if user wants to update list of volatile stocks...
@@ -96,6 +126,18 @@ def handle_stocks( # function to neatly handle stock values
 
             print(f'Error updating volatile stocks list: "{e}"') # print failure error with exception
 
+    ##### sweep model settings #####
+
+    if (sweepStocksModel == True): # if user wants to find the best model settings...
+
+        try: # try to sweep model settings...
+
+            sweep_stocks_model(endDate, customTickers) # call sweepStocksModel to save every trial's results
+
+        except Exception as e: # if unable to sweep model settings...
+
+            print(f'Error sweeping stock model settings: "{e}"\n') # print failure error with exception
+
     ##### model data with tensorflow #####
 
     if (machineLearnStocks == True): # if user wants to machine learn stocks...
@@ -108,6 +150,18 @@ def handle_stocks( # function to neatly handle stock values
 
             print(f'Error machine learning stocks: "{e}"\n') # print failure error with exception
 
+    ##### backtest saved predictions #####
+
+    if (backtestStocksModel == True): # if user wants to measure how the saved predictions performed...
+
+        try: # try to backtest the saved predictions...
+
+            backtest_stocks_model(customTickers) # call backtestStocksModel to save every fold's results
+
+        except Exception as e: # if unable to backtest the saved predictions...
+
+            print(f'Error backtesting stock predictions: "{e}"\n') # print failure error with exception
+
     ##### plot data with plotly #####
 
     if (createNewPlot == True): # if user wants to plot new data...
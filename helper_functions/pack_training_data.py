@@ -0,0 +1,172 @@
+##################################################################################
+# Copyright (c) 2025 Matthew Thomas Beck                                         #
+#                                                                                #
+# Licensed under the Creative Commons Attribution-NonCommercial 4.0              #
+# International (CC BY-NC 4.0). Personal and educational use is permitted.       #
+# Commercial use by companies or for-profit entities is prohibited.              #
+##################################################################################
+
+
+
+
+
+############################################################
+############### IMPORT / CREATE DEPENDENCIES ###############
+############################################################
+
+
+########## IMPORT DEPENDENCIES ##########
+
+##### data modeling libraries #####
+
+import numpy as np # used to stack and compress every job's windows
+
+##### miscellaneous libraries #####
+
+import glob # used to find the shards of an older pack
+import json # used to save the index of a pack
+import os # used to build pack paths and swap files atomically
+
+
+########## CREATE DEPENDENCIES ##########
+
+##### pack constants #####
+
+PACK_SHARD_BYTES = 64 * 1024 ** 2 # uncompressed size a shard is closed at (one job is never split between shards)
+
+##### pack variables #####
+
+packIndexName = 'training_data-index.json' # file mapping every model with its shard and rows
+packShardName = 'training_data-shard_{}_of_{}.npz' # file holding the windows of many models, filled in with i and n
+
+
+
+
+
+##############################################
+############### PACK FUNCTIONS ###############
+##############################################
+
+
+########## GROUP PACK SHARDS ##########
+
+def group_pack_shards(trainingJobs, shardBytes=PACK_SHARD_BYTES): # function to split jobs into shards of shardBytes
+
+    packShards = [[]] # create a list of shards holding job indexes, starting with an empty shard
+    packShardBytes = 0 # size of the shard being filled
+
+    for jobIndex, trainingJob in enumerate(trainingJobs): # loop through every training job in order
+
+        jobBytes = trainingJob['trainX'].nbytes + trainingJob['trainY'].nbytes # find the size of the job's windows
+
+        if packShards[-1] and packShardBytes + jobBytes > shardBytes: # if the job does not fit in the shard...
+
+            packShards.append([]) # start a new shard
+            packShardBytes = 0 # reset size of the new shard
+
+        packShards[-1].append(jobIndex) # add the job to the shard
+        packShardBytes += jobBytes # add the job's size to the shard
+
+    return packShards # return job indexes of every shard
+
+
+########## PACK TRAINING DATA ##########
+
+# function to write every job's windows into a few compressed shards plus one index, so a single training job can read
+# many models' data (returns the paths of every written file)
+def pack_training_data(trainingJobs, packDirectory):
+
+    ##### clear older pack #####
+
+    os.makedirs(packDirectory, exist_ok=True) # make sure the pack directory exists
+
+    for olderPath in glob.glob(os.path.join(glob.escape(packDirectory), 'training_data-*')): # loop through old files
+
+        os.remove(olderPath) # remove file so shards of an older pack are never read
+
+    ##### write shards #####
+
+    packShards = group_pack_shards(trainingJobs) # split jobs into shards
+    packIndex = {'shards': [], 'models': {}} # dictionary to map every model with where its windows are
+    packPaths = [] # create an empty list of written files
+
+    for shardIndex, jobIndexes in enumerate(packShards): # loop through every shard
+
+        shardName = packShardName.format(shardIndex, len(packShards)) # name shard e.g. shard_0_of_2
+        shardRows = 0 # number of windows in the shard so far
+
+        for jobIndex in jobIndexes: # loop through every job in the shard
+
+            trainingJob = trainingJobs[jobIndex] # get the job
+
+            packIndex['models'][trainingJob['modelName']] = { # record where the job's windows are
+
+                'shard': shardName,
+                'start': shardRows,
+                'stop': shardRows + len(trainingJob['trainX']),
+                'epochs': trainingJob.get('epochs'),
+                'modelObject': trainingJob.get('s3ModelObject')
+            }
+
+            shardRows += len(trainingJob['trainX']) # move past the job's windows
+
+        shardPath = os.path.join(packDirectory, shardName) # find the shard's path
+
+        with open(shardPath + '.tmp', 'wb') as shardFile: # write to a temporary file first
+
+            np.savez_compressed( # stack every job's windows and targets into one compressed array each
+
+                shardFile,
+                trainX=np.concatenate([trainingJobs[x]['trainX'] for x in jobIndexes]),
+                trainY=np.concatenate([trainingJobs[x]['trainY'] for x in jobIndexes])
+            )
+
+        os.replace(shardPath + '.tmp', shardPath) # swap in the new file so a crash never corrupts it
+
+        packIndex['shards'].append(shardName) # add the shard to the index
+        packPaths.append(shardPath) # add the shard to the written files
+
+    ##### write index #####
+
+    indexPath = os.path.join(packDirectory, packIndexName) # find the index's path
+
+    with open(indexPath + '.tmp', 'w') as indexFile: # write to a temporary file first
+
+        json.dump(packIndex, indexFile, indent=4) # save index
+
+    os.replace(indexPath + '.tmp', indexPath) # swap in the new file so a crash never corrupts it
+
+    return packPaths + [indexPath] # return every written file, index last
+
+
+########## READ PACKED TRAINING DATA ##########
+
+# function to read every model's windows back from a pack (what a training job given the pack directory runs),
+# returning a dictionary of model name to (trainX, trainY, index entry)
+def read_packed_training_data(packDirectory):
+
+    with open(os.path.join(packDirectory, packIndexName), 'r') as indexFile: # open the pack's index
+
+        packIndex = json.load(indexFile) # load index
+
+    packedData = {} # dictionary to map model name with its windows
+
+    for shardName in packIndex['shards']: # loop through every shard
+
+        with np.load(os.path.join(packDirectory, shardName)) as packShard: # open and decompress the shard once
+
+            shardX, shardY = packShard['trainX'], packShard['trainY'] # read every window of the shard
+
+        for modelName, packEntry in packIndex['models'].items(): # loop through every model
+
+            if packEntry['shard'] == shardName: # if the model's windows are in the shard...
+
+                # take the model's rows without copying
+                packedData[modelName] = (
+
+                    shardX[packEntry['start']:packEntry['stop']],
+                    shardY[packEntry['start']:packEntry['stop']],
+                    packEntry
+                )
+
+    return packedData # return every model's windows
@@ -0,0 +1,268 @@
+##################################################################################
+# Copyright (c) 2025 Matthew Thomas Beck                                         #
+#                                                                                #
+# Licensed under the Creative Commons Attribution-NonCommercial 4.0              #
+# International (CC BY-NC 4.0). Personal and educational use is permitted.       #
+# Commercial use by companies or for-profit entities is prohibited.              #
+##################################################################################
+
+
+
+
+
+############################################################
+############### IMPORT / CREATE DEPENDENCIES ###############
+############################################################
+
+
+########## IMPORT DEPENDENCIES ##########
+
+##### data modeling libraries #####
+
+import numpy as np # used to store model weights and run every layer without tensorflow
+
+##### miscellaneous libraries #####
+
+import os # used to find the weights file of a model and swap files atomically
+
+
+########## CREATE DEPENDENCIES ##########
+
+##### layer variables #####
+
+# activations the numpy runtime supports for every layer type (keras defaults used by create_trained_model)
+supportedActivations = {
+
+    'LSTM': {'activation': 'tanh', 'recurrent_activation': 'sigmoid'},
+    'Dense': {'activation': 'linear'},
+    'Flatten': {}
+}
+
+layerArrayCounts = {'LSTM': 3, 'Dense': 2, 'Flatten': 0} # number of weight arrays every layer type stores
+
+
+
+
+
+################################################
+############### EXPORT FUNCTIONS ###############
+################################################
+
+
+########## FIND WEIGHTS PATH ##########
+
+def find_weights_path(modelPath): # function to find the numpy weights file of a model
+
+    if modelPath.endswith('.npz'): # if the model was only ever saved as numpy weights...
+
+        return modelPath # return the model itself as its weights file
+
+    return os.path.splitext(modelPath)[0] + '-weights.npz' # return path named after the model
+
+
+########## EXPORT MODEL WEIGHTS ##########
+
+def export_model_weights(model, modelPath): # function to save a keras model's weights as plain numpy arrays
+
+    layerTypes = [] # create an empty list of every layer's type
+    layerArrays = {} # dictionary to map array name with the arrays of every layer
+
+    for layer in model.layers: # loop through every layer of the model
+
+        layerType = layer.__class__.__name__ # find the layer's type
+
+        if layerType == 'Dropout': # if the layer only drops units while training...
+
+            continue # skip layer since dropout does nothing at inference
+
+        if layerType not in supportedActivations: # if the numpy runtime cannot run the layer...
+
+            raise ValueError(f'Unable to export layer type "{layerType}".') # refuse to export an unknown layer
+
+        layerConfig = layer.get_config() # get the layer's settings
+
+        # make sure the layer uses the activations the numpy runtime applies
+        for activationName, activation in supportedActivations[layerType].items():
+
+            if layerConfig.get(activationName) != activation: # if the layer uses another activation...
+
+                # refuse to export a model the numpy runtime would predict wrong
+                raise ValueError(f'Unable to export {layerType} with {activationName} "{layerConfig[activationName]}".')
+
+        layerNumber = len(layerTypes) # number the layer among the exported ones
+        layerTypes.append(layerType) # add the layer's type
+
+        # store the layer's weights (kernel, recurrent kernel and bias for LSTM, kernel and bias for Dense)
+        for arrayIndex, layerArray in enumerate(layer.get_weights()):
+
+            layerArrays[f'{layerNumber}-{arrayIndex}'] = np.asarray(layerArray, dtype=np.float32)
+
+        if layerType == 'LSTM': # if the layer is recurrent...
+
+            layerArrays[f'{layerNumber}-sequences'] = np.array(layerConfig['return_sequences']) # store output shape
+
+    save_model_weights(modelPath, layerTypes, layerArrays) # save every exported layer's arrays
+
+
+########## SAVE MODEL WEIGHTS ##########
+
+# function to save the type of every layer and its arrays (named layer number-array number) as a model's weights file
+def save_model_weights(modelPath, layerTypes, layerArrays):
+
+    weightsPath = find_weights_path(modelPath) # find the model's weights file
+
+    with open(weightsPath + '.tmp', 'wb') as weightsFile: # write to a temporary file first
+
+        np.savez(weightsFile, layerTypes=np.array(layerTypes), **layerArrays) # save every layer's arrays
+
+    os.replace(weightsPath + '.tmp', weightsPath) # swap in the new file so a crash never corrupts it
+
+
+########## LOAD MODEL WEIGHTS ##########
+
+def load_model_weights(modelPath): # function to load a model's exported weights as a list of layers
+
+    modelLayers = [] # create an empty list of (layer type, arrays, returns sequences) layers
+
+    with np.load(find_weights_path(modelPath)) as modelWeights: # open the model's weights file
+
+        for layerNumber, layerType in enumerate(modelWeights['layerTypes']): # loop through every exported layer
+
+            arrayCount = layerArrayCounts[str(layerType)] # find how many arrays the layer stores
+
+            modelLayers.append(( # add the layer with its arrays
+
+                str(layerType),
+                [modelWeights[f'{layerNumber}-{x}'] for x in range(arrayCount)],
+                bool(modelWeights[f'{layerNumber}-sequences']) if layerType == 'LSTM' else False
+            ))
+
+    return modelLayers # return layers in model order
+
+
+
+
+
+###################################################
+############### INFERENCE FUNCTIONS ###############
+###################################################
+
+
+########## SIGMOID ##########
+
+def sigmoid(values): # function to squash values between 0 and 1 like keras' sigmoid
+
+    return 0.5 * (1 + np.tanh(values / 2)) # return logistic of every value without overflowing
+
+
+########## RUN LSTM LAYER ##########
+
+# function to run an LSTM layer over every window at once, with an optional leading axis of stacked models (keras
+# stores gates in the order input, forget, cell, output)
+def run_lstm_layer(layerInputs, kernel, recurrentKernel, bias, returnSequences):
+
+    stepCount = layerInputs.shape[-2] # find the number of time steps
+    unitCount = recurrentKernel.shape[-2] # find the number of units of the layer
+
+    # project every time step's inputs into the 4 gates at once, since they do not depend on the hidden state
+    gateInputs = layerInputs @ kernel + bias
+
+    # start every window with an empty state and memory, shaped (windows, units) or (models, windows, units)
+    hiddenState = np.zeros((*gateInputs.shape[:-2], unitCount), dtype=np.float32)
+    cellState = np.zeros((*gateInputs.shape[:-2], unitCount), dtype=np.float32)
+    hiddenStates = [] # create an empty list to store the hidden state of every time step
+
+    for step in range(stepCount): # loop through every time step
+
+        gates = gateInputs[..., step, :] + hiddenState @ recurrentKernel # add the hidden state's share of every gate
+
+        inputGate, forgetGate, cellGate, outputGate = np.split(gates, 4, axis=-1) # split gates in keras order
+
+        # forget part of the memory and add the new candidate memory
+        cellState = sigmoid(forgetGate) * cellState + sigmoid(inputGate) * np.tanh(cellGate)
+
+        hiddenState = sigmoid(outputGate) * np.tanh(cellState) # output part of the memory
+
+        hiddenStates.append(hiddenState) # store the step's hidden state
+
+    return np.stack(hiddenStates, axis=-2) if returnSequences else hiddenState # return every step or only the last
+
+
+########## RUN NUMPY MODEL ##########
+
+# function to predict with exported layers instead of tensorflow (or with stacked layers of several models at once,
+# when modelInputs has a leading axis of models)
+def run_numpy_model(modelLayers, modelInputs):
+
+    layerOutputs = np.asarray(modelInputs, dtype=np.float32) # use 32-bit floats like the keras model
+
+    for layerType, layerArrays, returnSequences in modelLayers: # loop through every layer in order
+
+        if layerType == 'LSTM': # if the layer is recurrent...
+
+            layerOutputs = run_lstm_layer(layerOutputs, *layerArrays, returnSequences) # run the LSTM layer
+
+        elif layerType == 'Flatten': # if the layer joins every window's time steps...
+
+            layerOutputs = layerOutputs.reshape(*layerOutputs.shape[:-2], -1) # flatten every window into one row
+
+        else: # if the layer is dense...
+
+            layerOutputs = layerOutputs @ layerArrays[0] + layerArrays[1] # run the linear dense layer
+
+    return layerOutputs # return the last layer's outputs
+
+
+########## FIND MODEL ARCHITECTURE ##########
+
+def find_model_architecture(modelLayers, inputShape): # function to describe what a model's layers and inputs look like
+
+    # return every layer's type, array shapes and output shape along with the shape of one window
+    return tuple(inputShape), tuple((x, tuple(y.shape for y in z), w) for x, z, w in modelLayers)
+
+
+########## STACK MODEL LAYERS ##########
+
+# function to stack the layers of models with the same architecture into one model whose arrays have a leading axis of
+# models, shaped so every matrix product of run_numpy_model pairs each model's windows with its own weights
+def stack_model_layers(modelLayerLists):
+
+    stackedLayers = [] # create an empty list of stacked layers
+
+    for modelLayers in zip(*modelLayerLists): # loop through the same layer of every model
+
+        layerType, layerArrays, returnSequences = modelLayers[0] # take the layer's type and output shape
+
+        # stack every array of the layer over the models
+        stackedArrays = [np.stack([x[1][y] for x in modelLayers]) for y in range(len(layerArrays))]
+
+        if layerType == 'LSTM': # if the layer is recurrent...
+
+            kernel, recurrentKernel, bias = stackedArrays # unpack the stacked arrays
+
+            # broadcast the kernel over every window and the bias over every window and time step
+            stackedArrays = [kernel[:, np.newaxis], recurrentKernel, bias[:, np.newaxis, np.newaxis]]
+
+        elif layerType == 'Dense': # if the layer is dense...
+
+            stackedArrays = [stackedArrays[0], stackedArrays[1][:, np.newaxis]] # broadcast the bias over every window
+
+        stackedLayers.append((layerType, stackedArrays, returnSequences)) # add the stacked layer
+
+    return stackedLayers # return layers in model order
+
+
+########## STACK MODEL INPUTS ##########
+
+def stack_model_inputs(modelInputs): # function to stack every model's windows into one zero padded array
+
+    # create an array of zeros as long as the model with the most windows (padded rows are never read back)
+    stackedInputs = np.zeros(
+        (len(modelInputs), max(len(x) for x in modelInputs), *modelInputs[0].shape[1:]), dtype=np.float32
+    )
+
+    for modelIndex, windowInputs in enumerate(modelInputs): # loop through every model
+
+        stackedInputs[modelIndex, :len(windowInputs)] = windowInputs # fill the model's windows
+
+    return stackedInputs # return windows shaped (models, windows, ...)
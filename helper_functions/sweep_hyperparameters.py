@@ -0,0 +1,234 @@
+##################################################################################
+# Copyright (c) 2025 Matthew Thomas Beck                                         #
+#                                                                                #
+# Licensed under the Creative Commons Attribution-NonCommercial 4.0              #
+# International (CC BY-NC 4.0). Personal and educational use is permitted.       #
+# Commercial use by companies or for-profit entities is prohibited.              #
+##################################################################################
+
+
+
+
+
+############################################################
+############### IMPORT / CREATE DEPENDENCIES ###############
+############################################################
+
+
+########## IMPORT DEPENDENCIES ##########
+
+##### machine learning functions #####
+
+# used to create the windows of every trial's sequence length
+from helper_functions.create_tensorflow_model import prepare_multi_horizon_data
+from helper_functions.create_tensorflow_model import NUMBER_STEPS
+from helper_functions.create_tensorflow_model import BATCH_SIZE
+from helper_functions.create_tensorflow_model import EPOCHS
+from helper_functions.create_tensorflow_model import LAYER_SIZES
+
+# used to run trials in a pool of fresh processes that split the cores between them
+from helper_functions.train_models import start_worker_pool
+from helper_functions.train_models import TRAINING_WORKERS
+
+##### data modeling libraries #####
+
+import pandas as pd # used to record every trial's results
+import numpy as np # used to stack every ticker's windows and find validation errors
+
+##### miscellaneous libraries #####
+
+import itertools # used to list every combination of the sweep space
+import shutil # used to remove the sweep's trial models once it finishes
+import time # used to time every trial
+import os # used to save trial models between rungs
+
+
+########## CREATE DEPENDENCIES ##########
+
+##### sweep constants #####
+
+SWEEP_SPACE = { # settings every trial picks one value of (the current constants are always one of the trials)
+
+    'numberSteps': [5, NUMBER_STEPS, 14],
+    'batchSize': [BATCH_SIZE, 32],
+    'layerSizes': [(30, 60, 10), LAYER_SIZES]
+}
+
+SWEEP_MIN_EPOCHS = 10 # number of epochs every trial trains before the first pruning
+SWEEP_MAX_EPOCHS = EPOCHS # number of epochs surviving trials train up to
+SWEEP_REDUCTION = 3 # keep the best 1 / SWEEP_REDUCTION trials and train them SWEEP_REDUCTION times longer each rung
+SWEEP_VALIDATION_FRACTION = 0.2 # share of every ticker's latest windows held out to measure validation error
+
+##### sweep variables #####
+
+sweepModelDirectory = './financialInstrument_data/sweep_models' # directory trial models are kept in between rungs
+
+
+
+
+
+###############################################
+############### SWEEP FUNCTIONS ###############
+###############################################
+
+
+########## LIST SWEEP TRIALS ##########
+
+def list_sweep_trials(sweepSpace=SWEEP_SPACE): # function to list every combination of the sweep space as a trial
+
+    settingNames = list(sweepSpace) # list the names of the swept settings
+
+    # create one trial per combination of settings
+    return [dict(zip(settingNames, x)) for x in itertools.product(*[sweepSpace[y] for y in settingNames])]
+
+
+########## PREPARE SWEEP DATA ##########
+
+# function to create every ticker's windows for a sequence length and hold out each ticker's latest windows for
+# validation, returning (trainX, trainY, validationX, validationY) stacked over every ticker
+def prepare_sweep_data(financialInstrumentData, futureSteps, numberSteps):
+
+    trainParts, validationParts = [], [] # create lists of every ticker's training and validation windows
+
+    for tickerData in financialInstrumentData: # loop through every ticker's normalized closing prices
+
+        lastSequence, x, y = prepare_multi_horizon_data(tickerData, futureSteps, numberSteps) # create windows
+
+        splitIndex = len(x) - max(1, int(len(x) * SWEEP_VALIDATION_FRACTION)) # hold out the latest windows
+
+        trainParts.append((x[:splitIndex], y[:splitIndex])) # add older windows to training data
+        validationParts.append((x[splitIndex:], y[splitIndex:])) # add latest windows to validation data
+
+    return ( # stack every ticker's windows
+
+        np.concatenate([x[0] for x in trainParts]),
+        np.concatenate([x[1] for x in trainParts]),
+        np.concatenate([x[0] for x in validationParts]),
+        np.concatenate([x[1] for x in validationParts])
+    )
+
+
+########## RUN SWEEP TRIAL ##########
+
+def run_sweep_trial(trialJob): # function to train one trial up to its rung's epochs in a worker and validate it
+
+    # import model creation inside the worker, since keras models cannot be sent between processes
+    from helper_functions.create_tensorflow_model import create_trained_model
+
+    trialStart = time.perf_counter() # start timing the trial's rung
+
+    model = create_trained_model( # continue the trial's model from its last rung (or start it on the first rung)
+
+        trialJob['trainX'],
+        trialJob['trainY'],
+        trialJob['modelPath'] if os.path.exists(trialJob['modelPath']) else None,
+        trialJob['epochs'],
+        trialJob['layerSizes'],
+        trialJob['batchSize'],
+        0 # train every epoch of the rung, since the sweep holds out its own validation windows
+    )
+
+    model.save(trialJob['modelPath']) # save the trial's model so the next rung continues from it
+
+    validationPredictions = model.predict(trialJob['validationX'], verbose=0) # predict the held out windows
+
+    # return mean squared error over every held out window and future step, and the rung's training time
+    return float(np.mean((validationPredictions - trialJob['validationY']) ** 2)), time.perf_counter() - trialStart
+
+
+########## SWEEP HYPERPARAMETERS ##########
+
+# function to find the settings with the lowest validation error by successive halving: every trial trains for a few
+# epochs, the worst are pruned and the best keep training longer until one is left or SWEEP_MAX_EPOCHS is reached
+def sweep_hyperparameters(financialInstrumentData, futureSteps, sweepOutput, maxWorkers=TRAINING_WORKERS):
+
+    ##### set variables #####
+
+    sweepTrials = list_sweep_trials() # list every trial of the sweep space
+    sweepData = {} # dictionary to map sequence length with its windows
+    sweepRecords = [] # create an empty list to store every trial's results at every rung
+
+    for numberSteps in {x['numberSteps'] for x in sweepTrials}: # loop through every swept sequence length
+
+        # create windows once per sequence length instead of once per trial
+        sweepData[numberSteps] = prepare_sweep_data(financialInstrumentData, futureSteps, numberSteps)
+
+    shutil.rmtree(sweepModelDirectory, ignore_errors=True) # remove models of an unfinished sweep so none is continued
+    os.makedirs(sweepModelDirectory, exist_ok=True) # make sure the trial model directory exists
+
+    for trialIndex, sweepTrial in enumerate(sweepTrials): # loop through every trial
+
+        sweepTrial.update({'trial': trialIndex, 'epochs': 0, 'wallTime': 0.0}) # start trial with no training
+
+    liveTrials = sweepTrials # every trial takes part in the first rung
+    rungEpochs = min(SWEEP_MIN_EPOCHS, SWEEP_MAX_EPOCHS) # number of epochs trials train up to in the first rung
+
+    ##### run rungs #####
+
+    print(f"Sweeping {len(sweepTrials)} trials with {maxWorkers} workers...\n") # print sweeping statement
+
+    while True: # loop until one trial is left or trials trained for SWEEP_MAX_EPOCHS
+
+        trialJobs = [ # create one job per live trial with the windows of its sequence length
+
+            {
+                'trainX': sweepData[x['numberSteps']][0],
+                'trainY': sweepData[x['numberSteps']][1],
+                'validationX': sweepData[x['numberSteps']][2],
+                'validationY': sweepData[x['numberSteps']][3],
+                'epochs': rungEpochs - x['epochs'], # only train the epochs the trial has not trained yet
+                'layerSizes': x['layerSizes'],
+                'batchSize': x['batchSize'],
+                'modelPath': f"{sweepModelDirectory}/trial_{x['trial']}.h5"
+            }
+            for x in liveTrials
+        ]
+
+        # train every live trial in parallel, collecting results in trial order
+        with start_worker_pool(min(maxWorkers, len(trialJobs))) as executor:
+
+            trialResults = list(executor.map(run_sweep_trial, trialJobs))
+
+        for sweepTrial, (validationError, wallTime) in zip(liveTrials, trialResults): # loop through every result
+
+            sweepTrial['epochs'] = rungEpochs # record epochs the trial trained for
+            sweepTrial['wallTime'] += wallTime # add the rung's training time to the trial's total
+            sweepTrial['validationError'] = validationError # record the trial's latest validation error
+
+            sweepRecords.append(dict(sweepTrial)) # record the trial's results at this rung
+
+        print(f"Trained {len(liveTrials)} trials to {rungEpochs} epochs.\n") # print rung statement
+
+        if len(liveTrials) == 1 or rungEpochs >= SWEEP_MAX_EPOCHS: # if the sweep is finished...
+
+            break # stop pruning
+
+        ##### prune trials #####
+
+        # keep the best 1 / SWEEP_REDUCTION trials by validation error
+        liveTrials = sorted(liveTrials, key=lambda x: x['validationError'])[:max(1, len(liveTrials) // SWEEP_REDUCTION)]
+
+        rungEpochs = min(rungEpochs * SWEEP_REDUCTION, SWEEP_MAX_EPOCHS) # train survivors longer
+
+    shutil.rmtree(sweepModelDirectory, ignore_errors=True) # remove the trial models
+
+    ##### save results #####
+
+    # create a dataframe of every trial's results at every rung, trial number first
+    sweepResults = pd.DataFrame(sweepRecords)
+    sweepResults = sweepResults[['trial'] + [x for x in sweepResults.columns if x != 'trial']]
+    sweepResults['layerSizes'] = sweepResults['layerSizes'].map(lambda x: '/'.join(map(str, x))) # e.g. 60/120/20
+
+    # sort so every trial's furthest rung comes first, best validation error first
+    sweepResults = sweepResults.sort_values(['epochs', 'validationError'], ascending=[False, True])
+
+    sweepResults.to_csv(sweepOutput, index=False) # save every trial's results to csv
+
+    bestTrial = sweepResults.iloc[0] # get the best trial of the furthest rung
+
+    # print best trial statement
+    print(f"Best trial: {bestTrial['numberSteps']} steps, batch size {bestTrial['batchSize']}, layers "
+          f"{bestTrial['layerSizes']} with validation error {bestTrial['validationError']:.6f} in "
+          f"{bestTrial['wallTime']:.1f} seconds.\n")
+
+    return sweepResults # return every trial's results
@@ -0,0 +1,542 @@
+##################################################################################
+# Copyright (c) 2025 Matthew Thomas Beck                                         #
+#                                                                                #
+# Licensed under the Creative Commons Attribution-NonCommercial 4.0              #
+# International (CC BY-NC 4.0). Personal and educational use is permitted.       #
+# Commercial use by companies or for-profit entities is prohibited.              #
+##################################################################################
+
+
+
+
+
+############################################################
+############### IMPORT / CREATE DEPENDENCIES ###############
+############################################################
+
+
+########## IMPORT DEPENDENCIES ##########
+
+##### aws uploading #####
+
+from helper_functions.upload_to_aws import upload_to_s3 # import upload to s3 function
+from helper_functions.upload_to_aws import invoke_sagemaker # import invoke sagemaker function
+from helper_functions.upload_to_aws import delete_s3_prefix # import delete s3 prefix function
+
+# used to write every model's training data into a few compressed shards plus an index before uploading
+from helper_functions.pack_training_data import pack_training_data
+
+##### machine learning functions #####
+
+# used to tell models of different layers or training settings apart in the model registry
+from helper_functions.create_tensorflow_model import MODEL_ARCHITECTURE
+from helper_functions.create_tensorflow_model import EPOCHS
+from helper_functions.create_tensorflow_model import FINE_TUNE_EPOCHS
+
+# used to hash and send the prices a model's windows were cut from instead of the windows themselves
+from helper_functions.create_tensorflow_model import find_window_series
+from helper_functions.create_tensorflow_model import cut_window_view
+
+# used to fit every model of a run as a ridge regression in one batched solve instead of training LSTMs
+from helper_functions.create_ridge_model import create_ridge_models
+from helper_functions.create_ridge_model import save_ridge_model
+from helper_functions.create_ridge_model import RIDGE_BATCH_MODELS
+from helper_functions.create_ridge_model import RIDGE_ARCHITECTURE
+
+##### data modeling libraries #####
+
+import numpy as np # used to hash training data
+
+##### concurrency libraries #####
+
+from concurrent.futures import ProcessPoolExecutor # used to train several models at once on local cores
+import multiprocessing # used to start training workers without inheriting the parent's tensorflow state
+
+##### miscellaneous libraries #####
+
+import hashlib # used to address every model by a hash of what it was trained on
+import glob # used to find the files kept next to a replaced model
+import shutil # used to remove a training data pack once it is uploaded
+import json # used to save the model registry
+import fcntl # used to lock the model registry while shard processes save their own models
+import time # used to share one training deadline between every worker
+import os # used to size the training pool and create model directories
+
+
+########## CREATE DEPENDENCIES ##########
+
+##### training constants #####
+
+TRAINING_BACKEND = 'local' # backend models are trained with ('local', 'inline', 'sagemaker' or 'ridge')
+TRAINING_WORKERS = os.cpu_count() or 1 # number of models trained at once by the local backend
+TRAINING_TIME_BUDGET = None # seconds every model of a run may train for in total (None = no budget)
+
+##### model registry variables #####
+
+registryFileName = 'model_registry.json' # file in every model directory mapping model name with its latest model
+registryArchitecture = f'{MODEL_ARCHITECTURE}-epochs{EPOCHS}' # what every registered model is built and trained with
+
+
+
+
+
+########################################################
+############### MODEL REGISTRY FUNCTIONS ###############
+########################################################
+
+
+########## HASH TRAINING DATA ##########
+
+def hash_training_data(trainX, trainY): # function to hash training data so unchanged inputs are recognized
+
+    dataHash = hashlib.sha256() # create a hash to feed every array into
+
+    windowSeries = find_window_series(trainX, compareWindows=False) # find the prices the windows are a view of
+
+    # hash the prices instead of the windows when they are a view, so no window is ever copied
+    for trainingArray, hashedArray in ((trainX, trainX if windowSeries is None else windowSeries), (trainY, trainY)):
+
+        dataHash.update(str(trainingArray.shape).encode('utf-8')) # hash the array's shape
+        dataHash.update(np.ascontiguousarray(hashedArray).tobytes()) # hash the array's values
+
+    return dataHash.hexdigest() # return hash as text
+
+
+########## LOAD MODEL REGISTRY ##########
+
+def load_model_registry(modelDirectory): # function to load the registry of a model directory
+
+    try: # attempt to read the registry...
+
+        with open(os.path.join(modelDirectory, registryFileName), 'r') as registryFile: # open registry file
+
+            return json.load(registryFile) # return dictionary of model name to latest model
+
+    except FileNotFoundError: # if no model has been registered yet...
+
+        return {} # return an empty registry
+
+
+########## SAVE MODEL REGISTRY ##########
+
+def save_model_registry(modelDirectory, modelRegistry, modelNames): # function to save the registry's changed models
+
+    os.makedirs(modelDirectory, exist_ok=True) # make sure the model directory exists
+
+    registryPath = os.path.join(modelDirectory, registryFileName) # find registry file
+
+    with open(registryPath + '.lock', 'w') as registryLock: # open the lock shared by every process using the registry
+
+        fcntl.flock(registryLock, fcntl.LOCK_EX) # wait until no other process is saving the registry
+
+        # reread the registry so models saved by other shard processes in the meantime are kept
+        savedRegistry = load_model_registry(modelDirectory)
+        savedRegistry.update({modelName: modelRegistry[modelName] for modelName in modelNames})
+
+        with open(registryPath + '.tmp', 'w') as registryFile: # write to a temporary file first
+
+            json.dump(savedRegistry, registryFile, indent=4, sort_keys=True) # save dictionary of models
+
+        os.replace(registryPath + '.tmp', registryPath) # swap in the new file so a crash never corrupts it
+
+
+########## FIND CACHED MODELS ##########
+
+# function to reuse, fine-tune or fully train every job based on the registry (models built with modelArchitecture)
+def find_cached_models(trainingJobs, modelArchitecture=registryArchitecture):
+
+    ##### set variables #####
+
+    modelRegistries = {} # dictionary to map model directory with its registry
+
+    for trainingJob in trainingJobs: # loop through every training job
+
+        ##### find job's model address #####
+
+        modelDirectory = trainingJob['modelDirectory'] # find where the job's models are kept
+
+        if modelDirectory not in modelRegistries: # if directory's registry has not been loaded yet...
+
+            modelRegistries[modelDirectory] = load_model_registry(modelDirectory) # load it once
+
+        dataHash = hash_training_data(trainingJob['trainX'], trainingJob['trainY']) # hash what the job trains on
+
+        # address the model by its name (ticker and horizon), architecture and training data
+        modelHash = hashlib.sha256(f"{trainingJob['modelName']}|{modelArchitecture}|{dataHash}".encode('utf-8'))
+
+        trainingJob['dataHash'] = dataHash # store the data hash for the registry
+        trainingJob['modelPath'] = os.path.join(modelDirectory, f"{modelHash.hexdigest()[:32]}.h5") # set path
+
+        ##### compare with latest model #####
+
+        latestModel = modelRegistries[modelDirectory].get(trainingJob['modelName']) # get model trained last time
+
+        # only compare with a latest model that was built the same way and whose file still exists
+        if latestModel is not None and latestModel['architecture'] == modelArchitecture:
+
+            latestModel = latestModel if os.path.exists(latestModel['modelPath']) else None
+
+        else: # if there is no latest model or it was built differently...
+
+            latestModel = None # never reuse or fine-tune it
+
+        if latestModel is None: # if there is no usable latest model...
+
+            trainingJob['trainingMode'] = 'train' # train from random weights
+
+        elif latestModel['dataHash'] == dataHash: # if nothing changed since the latest model...
+
+            trainingJob['trainingMode'] = 'reuse' # reuse the latest model outright
+            trainingJob['modelPath'] = latestModel['modelPath'] # point at the latest model
+
+        # if the latest model's data is still the start of the job's data (only new days were added at the end)...
+        elif latestModel['rows'] < len(trainingJob['trainX']) and latestModel['dataHash'] == hash_training_data(
+
+            trainingJob['trainX'][:latestModel['rows']], trainingJob['trainY'][:latestModel['rows']]
+        ):
+
+            trainingJob['trainingMode'] = 'fine_tune' # warm-start from the latest model for a few passes
+            trainingJob['initialModelPath'] = latestModel['modelPath']
+            trainingJob['epochs'] = FINE_TUNE_EPOCHS
+
+        else: # if older days changed, such as after renormalizing or moving the lookback window...
+
+            trainingJob['trainingMode'] = 'train' # train from random weights
+
+    return modelRegistries # return the loaded registries
+
+
+########## REGISTER TRAINED MODELS ##########
+
+# function to make every newly trained model (built with modelArchitecture) the latest
+def register_trained_models(trainingJobs, modelRegistries, modelArchitecture=registryArchitecture):
+
+    changedModels = {} # dictionary to map model directory with the names of its changed models
+
+    for trainingJob in trainingJobs: # loop through every training job
+
+        if trainingJob['trainingMode'] == 'reuse': # if the job reused its latest model...
+
+            continue # leave its registry entry as is
+
+        modelRegistry = modelRegistries[trainingJob['modelDirectory']] # get the job's registry
+
+        latestModel = modelRegistry.get(trainingJob['modelName']) # get the model being replaced
+
+        modelRegistry[trainingJob['modelName']] = { # make the new model the latest one
+
+            'architecture': modelArchitecture,
+            'dataHash': trainingJob['dataHash'],
+            'rows': len(trainingJob['trainX']),
+            'modelPath': trainingJob['modelPath']
+        }
+
+        changedModels.setdefault(trainingJob['modelDirectory'], []).append(trainingJob['modelName'])
+
+        if latestModel is None or latestModel['modelPath'] == trainingJob['modelPath']: # if nothing was replaced...
+
+            continue # keep every file
+
+        # loop through the replaced model's file and the files kept next to it, such as its scaling
+        for replacedPath in glob.glob(glob.escape(os.path.splitext(latestModel['modelPath'])[0]) + '*'):
+
+            os.remove(replacedPath) # remove it so the directory only keeps the latest models
+
+    for modelDirectory, modelNames in changedModels.items(): # loop through every registry with changes
+
+        save_model_registry(modelDirectory, modelRegistries[modelDirectory], modelNames) # save its changed models
+
+
+
+
+
+##################################################
+############### TRAINING FUNCTIONS ###############
+##################################################
+
+
+########## SET WORKER THREADS ##########
+
+def set_worker_threads(threadCount): # function to keep every training worker to its share of the cores
+
+    # set tensorflow's thread counts through the environment so only workers that actually train import tensorflow
+    os.environ['TF_NUM_INTRAOP_THREADS'] = str(threadCount) # threads used inside one operation
+    os.environ['TF_NUM_INTEROP_THREADS'] = str(threadCount) # threads used across operations
+
+
+########## SCHEDULE TRAINING BUDGET ##########
+
+# function to give every job the run's shared deadline, the number of workers training at once and its weight, so each
+# job can claim its share of the time left when it starts (laterWeight = weight of jobs scheduled after these)
+def schedule_training_budget(trainingJobs, workerCount, trainingDeadline, jobWeights, laterWeight=0):
+
+    remainingWeight = sum(jobWeights) + laterWeight # weight of every job not started yet
+
+    for trainingJob, jobWeight in zip(trainingJobs, jobWeights): # loop through every job in the order it starts
+
+        trainingJob.update({ # store what the job needs to find its time limit
+
+            'trainingDeadline': trainingDeadline,
+            'workerCount': workerCount,
+            'budgetWeight': jobWeight,
+            'remainingWeight': remainingWeight
+        })
+
+        remainingWeight -= jobWeight # remove the job's weight from the jobs after it
+
+
+########## FIND TIME LIMIT ##########
+
+def find_time_limit(trainingJob): # function to find how many seconds a job may train for when it starts (None = any)
+
+    if trainingJob.get('trainingDeadline') is None: # if the run has no training budget...
+
+        return None # let the job train for every epoch
+
+    # split the time left between every worker and give the job its weight's share of it, so time saved by jobs
+    # that stopped early goes to the jobs after them
+    timeLeft = max(0.0, trainingJob['trainingDeadline'] - time.time()) * trainingJob['workerCount']
+
+    return timeLeft * trainingJob['budgetWeight'] / max(trainingJob['remainingWeight'], 1) # return job's share
+
+
+########## TRAIN MODEL TO PATH ##########
+
+def train_model_to_path(trainingJob): # function to train one model in a worker and save it for the parent
+
+    # import model creation inside the worker, since keras models cannot be sent between processes
+    from helper_functions.create_tensorflow_model import create_trained_model
+    from helper_functions.run_numpy_model import export_model_weights
+
+    trainX = trainingJob['trainX'] # get the job's windows
+
+    if trainX is None: # if only the prices the windows were cut from were sent...
+
+        trainX = cut_window_view(trainingJob['windowSeries'], trainingJob['windowCount']) # cut them again as a view
+
+    model = create_trained_model( # train model on the job's data, warm-starting from an older model when given
+
+        trainX,
+        trainingJob['trainY'],
+        trainingJob.get('initialModelPath'),
+        trainingJob.get('epochs', EPOCHS),
+        timeLimit=find_time_limit(trainingJob) # claim the job's share of the training budget left
+    )
+
+    os.makedirs(os.path.dirname(trainingJob['modelPath']), exist_ok=True) # make sure the model directory exists
+
+    model.save(trainingJob['modelPath']) # save trained model so the parent can load it
+    export_model_weights(model, trainingJob['modelPath']) # save its weights for predicting without tensorflow
+
+    return trainingJob['modelPath'] # return path of trained model
+
+
+########## SHIP WINDOW JOB ##########
+
+# function to replace a job's windows with the prices they are a view of before it is sent to a worker, since sending
+# a view copies every window
+def ship_window_job(trainingJob):
+
+    windowSeries = find_window_series(trainingJob['trainX'], compareWindows=False) # find the prices of the windows
+
+    if windowSeries is None: # if the windows are not a view of one series...
+
+        return trainingJob # send the job as it is
+
+    # send the prices and the number of windows instead of the windows
+    return {**trainingJob, 'trainX': None, 'windowSeries': windowSeries, 'windowCount': len(trainingJob['trainX'])}
+
+
+########## START WORKER POOL ##########
+
+def start_worker_pool(workerCount): # function to start a pool of fresh processes that split the cores between them
+
+    workerCount = max(1, workerCount) # never start an empty pool
+
+    return ProcessPoolExecutor( # create a pool of fresh processes
+
+        max_workers=workerCount,
+        mp_context=multiprocessing.get_context('spawn'), # start clean processes instead of forking tensorflow
+        initializer=set_worker_threads,
+        initargs=(max(1, (os.cpu_count() or 1) // workerCount),) # split the cores between workers
+    )
+
+
+########## TRAIN LOCALLY ##########
+
+def train_locally(trainingJobs, maxWorkers=TRAINING_WORKERS): # function to train every job in a local process pool
+
+    workerCount = max(1, min(maxWorkers, len(trainingJobs))) # never start more workers than jobs
+
+    print(f"Training {len(trainingJobs)} models locally with {workerCount} workers...\n") # print training statement
+
+    with start_worker_pool(workerCount) as executor: # create a pool of fresh training processes
+
+        # send every job's prices instead of its windows, returning model paths in job order
+        return list(executor.map(train_model_to_path, map(ship_window_job, trainingJobs)))
+
+
+########## TRAIN INLINE ##########
+
+def train_inline(trainingJobs, maxWorkers=TRAINING_WORKERS): # function to train every job in the current process
+
+    return [train_model_to_path(trainingJob) for trainingJob in trainingJobs] # return model paths in job order
+
+
+########## TRAIN WITH SAGEMAKER ##########
+
+def train_with_sagemaker(trainingJobs, maxWorkers=TRAINING_WORKERS): # function to train every job on sagemaker
+
+    ##### pack and send data to s3 for sagemaker #####
+
+    # name the pack after every model it trains, so shards running at the same time never share a pack
+    packName = hashlib.sha256('|'.join(sorted(
+        f"{trainingJob['modelPath']}|{trainingJob.get('epochs')}" for trainingJob in trainingJobs
+    )).encode('utf-8')).hexdigest()[:16]
+
+    trainingDataDirectory = os.path.join(trainingJobs[0]['trainingDataDirectory'], packName) # get the pack's directory
+    trainingDataS3Prefix = f"{trainingJobs[0]['trainingDataS3Prefix']}/{packName}" # get where the pack is uploaded
+    s3BucketName = trainingJobs[0]['s3BucketName'] # get the bucket of the run
+
+    print("Attempting to upload data to s3...\n")  # print uploading data statement
+
+    # write every job's windows into a few compressed shards plus one index instead of two files per job
+    packPaths = pack_training_data(trainingJobs, trainingDataDirectory)
+
+    delete_s3_prefix(s3BucketName, trainingDataS3Prefix) # remove an older upload so its extra shards are never read
+
+    for packPath in packPaths: # loop through every shard and then the index, so the index is never uploaded early
+
+        upload_to_s3(packPath, s3BucketName, f'{trainingDataS3Prefix}/{os.path.basename(packPath)}') # upload file
+
+    print(f"Successfully uploaded {len(trainingJobs)} models' data in {len(packPaths)} files to s3.\n") # print success
+
+    shutil.rmtree(trainingDataDirectory) # remove the local pack now that it is on s3
+
+    ##### invoke sagemaker to train every model #####
+
+    for trainingJob in trainingJobs: # loop through every training job
+
+        os.makedirs(os.path.dirname(trainingJob['modelPath']), exist_ok=True) # make sure the model directory exists
+
+    return invoke_sagemaker( # train every model in one sagemaker job and download them to their registry paths
+
+        trainingDataS3Prefix,
+        s3BucketName,
+        [(trainingJob['s3ModelObject'], trainingJob['modelPath']) for trainingJob in trainingJobs]
+    )
+
+
+########## TRAIN WITH RIDGE ##########
+
+# function to fit every job as a ridge regression on its windows in the current process, solving every job with the
+# same window and target shape in batches of RIDGE_BATCH_MODELS (fine-tuned jobs are refit, since a solve is exact)
+def train_with_ridge(trainingJobs, maxWorkers=TRAINING_WORKERS):
+
+    # save every model only as numpy weights, which the numpy runtime predicts with directly
+    modelPaths = [os.path.splitext(trainingJob['modelPath'])[0] + '.npz' for trainingJob in trainingJobs]
+
+    shapeGroups = {} # dictionary to map window and target shape with the jobs that have it
+
+    for jobIndex, trainingJob in enumerate(trainingJobs): # loop through every training job
+
+        # group the job with the jobs it can be solved with
+        shapeGroups.setdefault((trainingJob['trainX'].shape[1:], np.shape(trainingJob['trainY'])[1:]), []).append(
+            jobIndex
+        )
+
+    print(f"Fitting {len(trainingJobs)} ridge models...\n") # print fitting statement
+
+    for jobIndexes in shapeGroups.values(): # loop through every group of jobs
+
+        for batchStart in range(0, len(jobIndexes), RIDGE_BATCH_MODELS): # loop through every batch of the group
+
+            batchIndexes = jobIndexes[batchStart:batchStart + RIDGE_BATCH_MODELS] # get the batch's jobs
+
+            ridgeModels = create_ridge_models( # fit every model of the batch at once
+
+                [trainingJobs[x]['trainX'] for x in batchIndexes],
+                [trainingJobs[x]['trainY'] for x in batchIndexes]
+            )
+
+            for jobIndex, (kernel, bias) in zip(batchIndexes, ridgeModels): # loop through every fitted model
+
+                os.makedirs(os.path.dirname(modelPaths[jobIndex]), exist_ok=True) # make sure the directory exists
+
+                save_ridge_model(modelPaths[jobIndex], kernel, bias) # save the model's weights
+
+    return modelPaths # return model paths in job order
+
+
+########## TRAINING BACKENDS ##########
+
+trainingBackends = { # dictionary to map training backend name with its training function
+
+    'local': train_locally,
+    'inline': train_inline, # used by workers that already run in their own process
+    'sagemaker': train_with_sagemaker,
+    'ridge': train_with_ridge # fits every model at once without tensorflow, for large ticker lists
+}
+
+backendArchitectures = { # dictionary to map training backend name with what its models are built with
+
+    'ridge': RIDGE_ARCHITECTURE # every other backend trains the LSTM
+}
+
+
+########## TRAIN MODELS ##########
+
+# function to train one model per job with the chosen backend, returning the path of every trained model in job order
+# (jobs whose training data has not changed reuse their registered model, and jobs that only gained new days are
+# fine-tuned from it), sharing trainingBudget seconds between the trained jobs by their number of windows
+def train_models(
+    trainingJobs,
+    trainingBackend=TRAINING_BACKEND,
+    maxWorkers=TRAINING_WORKERS,
+    trainingBudget=TRAINING_TIME_BUDGET
+):
+
+    if trainingBackend not in trainingBackends: # if training backend is invalid...
+
+        raise ValueError(f'Invalid training backend "{trainingBackend}".') # refuse to guess a backend
+
+    ##### find cached models #####
+
+    modelArchitecture = backendArchitectures.get(trainingBackend, registryArchitecture) # find what models are built as
+
+    # decide whether every job is reused, fine-tuned or trained
+    modelRegistries = find_cached_models(trainingJobs, modelArchitecture)
+
+    trainingModes = [trainingJob['trainingMode'] for trainingJob in trainingJobs] # list every job's mode
+
+    # print cached models statement
+    print(f"Reusing {trainingModes.count('reuse')} cached models, fine-tuning {trainingModes.count('fine_tune')} "
+          f"and training {trainingModes.count('train')} from scratch.\n")
+
+    ##### train changed models #####
+
+    changedJobs = [trainingJob for trainingJob in trainingJobs if trainingJob['trainingMode'] != 'reuse']
+
+    # if the run has a training budget that has not been scheduled by a caller yet...
+    if changedJobs and trainingBudget is not None and 'trainingDeadline' not in changedJobs[0]:
+
+        schedule_training_budget( # share the budget between the jobs by their number of windows
+
+            changedJobs,
+            min(maxWorkers, len(changedJobs)) if trainingBackend == 'local' else 1,
+            time.time() + trainingBudget,
+            [len(trainingJob['trainX']) for trainingJob in changedJobs]
+        )
+
+    if changedJobs: # if any model has to be trained...
+
+        # train changed models with the training backend
+        changedPaths = trainingBackends[trainingBackend](changedJobs, maxWorkers)
+
+        for trainingJob, modelPath in zip(changedJobs, changedPaths): # loop through every trained model
+
+            trainingJob['modelPath'] = modelPath # store where the backend put the model
+
+        register_trained_models(trainingJobs, modelRegistries, modelArchitecture) # make the new models the latest ones
+
+    return [trainingJob['modelPath'] for trainingJob in trainingJobs] # return model paths in job order
@@ -26,14 +26,14 @@ from botocore.exceptions import NoCredentialsError # import NoCredentialsError t
 
 from sagemaker.tensorflow import TensorFlow # import TensorFlow to use sagemaker's tensorflow capabilities
 
+##### machine learning constants #####
 
-########## CREATE DEPENDENCIES ##########
+from helper_functions.create_tensorflow_model import BATCH_SIZE # number of training instances per batch
+from helper_functions.create_tensorflow_model import EPOCHS # number of data passes through the model
 
-##### machine learning constants #####
+##### training data packing #####
 
-NUMBER_STEPS = 7 # set size of sequence to 1 week
-BATCH_SIZE = 8 # set number of training instances to 8
-EPOCHS = 80 # set number of data passes through machine learning algorithm to 80
+from helper_functions.pack_training_data import packIndexName # name of the index every packed training job reads
 
 
 
@@ -97,6 +97,36 @@ def download_from_s3(bucketName, s3Key, localPath): # function to download file
 
 
 
+########## DELETE S3 PREFIX ##########
+
+def delete_s3_prefix(s3BucketName, s3Prefix): # function to delete every s3 object under a prefix
+
+    s3_client = boto3.client( # create s3 client
+
+        's3', # set service name
+        aws_access_key_id = '', # set access key id
+        aws_secret_access_key = '', # set secret access key
+        region_name = 'us-east-2' # set region name
+    )
+
+    deletedCount = 0 # number of objects deleted so far
+
+    # loop through every page of objects under the prefix (a page holds at most 1000, the most one delete accepts)
+    for objectPage in s3_client.get_paginator('list_objects_v2').paginate(Bucket=s3BucketName, Prefix=s3Prefix + '/'):
+
+        s3Objects = [{'Key': x['Key']} for x in objectPage.get('Contents', [])] # list the page's objects
+
+        if s3Objects: # if the page has objects...
+
+            s3_client.delete_objects(Bucket=s3BucketName, Delete={'Objects': s3Objects}) # delete them at once
+
+            deletedCount += len(s3Objects) # count the deleted objects
+
+    if deletedCount: # if an older upload was found...
+
+        print(f"Deleted {deletedCount} objects from {s3BucketName}/{s3Prefix}.\n") # print success message
+
+
 ########## UPLOAD TO AMPLIFY ##########
 
 def upload_to_code_commit(outputPathGraphs, codeCommitRepository, codeCommitBranch, codeCommitGraphObject):
@@ -144,17 +174,15 @@ def upload_to_code_commit(outputPathGraphs, codeCommitRepository, codeCommitBran
 
 ########## INVOKE SAGEMAKER ##########
 
-# function to invoke sagemaker process
-def invoke_sagemaker(trainXS3DataObject, trainYS3DataObject, s3BucketName, modelPath):
+# function to invoke one sagemaker process that trains every model of a packed training data prefix, downloading every
+# (s3 model object, local path) in modelDownloads once training completes
+def invoke_sagemaker(trainingDataS3Prefix, s3BucketName, modelDownloads):
 
     ##### set variables #####
     sagemakerTrainingScript = ''
     sagemakerTrainingURI = ''
     executionRole = ''
-    trainXS3DataPath = f's3://{s3BucketName}/{trainXS3DataObject}'
-    trainYS3DataPath = f's3://{s3BucketName}/{trainYS3DataObject}'
-    modelS3Path = f's3://{s3BucketName}/{modelPath}'
-    modelLocalPath = ''
+    trainingDataS3Path = f's3://{s3BucketName}/{trainingDataS3Prefix}'
 
     ##### create estimator #####
 
@@ -173,7 +201,8 @@ def invoke_sagemaker(trainXS3DataObject, trainYS3DataObject, s3BucketName, model
                 hyperparameters={
 
                     'epochs': EPOCHS,
-                    'batch-size': BATCH_SIZE
+                    'batch-size': BATCH_SIZE,
+                    'index-file': packIndexName # index mapping every model with its shard and rows
                 },
                 image_uri=sagemakerTrainingURI,
                 input_mode='File',
@@ -186,8 +215,7 @@ def invoke_sagemaker(trainXS3DataObject, trainYS3DataObject, s3BucketName, model
 
             trainingData = {
 
-                'train-x': trainXS3DataPath,
-                'train-y': trainYS3DataPath
+                'training': trainingDataS3Path # every shard and the index of the packed training data
             }
 
             estimator.fit(inputs=trainingData, wait=True)  # fit model to training data and wait until completed
@@ -196,14 +224,20 @@ def invoke_sagemaker(trainXS3DataObject, trainYS3DataObject, s3BucketName, model
 
             print(f"Error creating estimator: {e}\n")
 
+            raise # stop, since there are no trained models to download
+
         print("Model training complete.\n") # print success message
 
-        ##### download model from s3 bucket #####
+        ##### download models from s3 bucket #####
+
+        for s3ModelObject, modelLocalPath in modelDownloads: # loop through every trained model
 
-        download_from_s3(s3BucketName, modelPath, modelLocalPath) # download model from s3 bucket
+            download_from_s3(s3BucketName, s3ModelObject, modelLocalPath) # download model from s3 bucket
 
-        return modelLocalPath # Return model object
+        return [x[1] for x in modelDownloads] # return local model paths in order
 
     except Exception as e:
 
-        print(f"Error training model: {e}\n") # print error message
\ No newline at end of file
+        print(f"Error training model: {e}\n") # print error message
+
+        raise # let the caller report the failure instead of handing back no model paths
\ No newline at end of file
@@ -261,4 +261,6 @@ def manual_or_automatic(manualMode): # function to run files and route tensorflo
 
 ##### run files manually #####
 
-manual_or_automatic(True) # if developing, and you want to manually run files, set to true
\ No newline at end of file
+if __name__ == '__main__': # only run when started directly, never when a worker process imports this file
+
+    manual_or_automatic(True) # if developing, and you want to manually run files, set to true
\ No newline at end of file